@@ -15,6 +15,12 @@ python manage.py collectstatic --noinput --clear
 echo "🗄️ Running migrations..."
 python manage.py migrate --noinput
 
+echo "🗃️ Creating cache table..."
+python manage.py createcachetable
+
+echo "📊 Rebuilding report rollups..."
+python manage.py rebuild_rollups
+
 echo "👤 Creating default user..."
 python manage.py create_default_user || echo "User already exists"
 
@@ -0,0 +1,16 @@
+"""Configuração do gunicorn (lida automaticamente de ./gunicorn.conf.py).
+
+Por padrão serve truck.wsgi com workers síncronos. Com SERVIDOR_ASGI=True serve
+truck.asgi com workers do uvicorn: as APIs JSON de relatórios são views
+assíncronas e cada worker atende várias requisições ao mesmo tempo no event
+loop (ver o comando benchmark_concorrencia).
+"""
+import os
+
+SERVIDOR_ASGI = os.environ.get('SERVIDOR_ASGI', 'False').lower() == 'true'
+
+if SERVIDOR_ASGI:
+    wsgi_app = 'truck.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'truck.wsgi:application'
@@ -0,0 +1,63 @@
+"""Busca textual dos custos gerais (oficina/fornecedor, descrição e placa).
+
+Cada custo guarda em `busca_texto` os três campos normalizados (sem acentos,
+em minúsculas, um campo por linha), preenchido pelo pre_save e pelos caminhos
+com bulk_create/bulk_update (preencher_texto). A busca continua sendo por
+trecho do texto, como o icontains que ela substitui, mas com um índice de
+trigramas em vez da varredura com LIKE '%termo%':
+
+- PostgreSQL: índice GIN pg_trgm em busca_texto, usado pelo próprio LIKE;
+- SQLite: tabela FTS5 com tokenizer trigram e conteúdo externo, mantida por
+  triggers na tabela de custos (migração 0011), consultada com MATCH.
+
+Termos com menos de 3 caracteres não formam trigramas e usam o LIKE. Como
+texto e termo passam pela mesma normalização, "manutencao" encontra
+"Manutenção" nos dois bancos. Migrações que recriam a tabela de custos no
+SQLite (alteração de coluna) descartam os triggers: recrie-os como na 0011
+(ou na 0014). BuscaCustosTests confere, no banco migrado, que a tabela e os
+triggers existem e que o índice bate com a tabela de custos.
+"""
+import unicodedata
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+TABELA_FTS = 'login_custosgerais_busca'
+TRIGGERS_FTS = (f'{TABELA_FTS}_ai', f'{TABELA_FTS}_ad', f'{TABELA_FTS}_au')
+CAMPOS = ('oficina_fornecedor', 'descricao', 'veiculo_placa')
+
+# Menor termo que o índice de trigramas consegue atender
+TAMANHO_MINIMO_INDICE = 3
+
+
+def normalizar(texto):
+    """Texto sem acentos, em minúsculas e com espaços simples (para indexar e para buscar)"""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def texto_busca(custo):
+    """Conteúdo de busca_texto: um campo por linha, para o termo não casar entre dois campos"""
+    return '\n'.join(normalizar(getattr(custo, campo)) for campo in CAMPOS)
+
+
+def preencher_texto(custos):
+    """Atualiza busca_texto dos custos (antes de bulk_create/bulk_update, que não disparam signals)"""
+    for custo in custos:
+        custo.busca_texto = texto_busca(custo)
+    return custos
+
+
+def filtrar_custos(custos, termo):
+    """Filtra o queryset de custos pelos que contêm o termo em algum dos campos de busca"""
+    termo = normalizar(termo)
+    if not termo:
+        return custos
+    if connections[custos.db].vendor == 'sqlite' and len(termo) >= TAMANHO_MINIMO_INDICE:
+        # Com o tokenizer trigram, uma frase entre aspas casa como trecho do texto
+        frase = '"' + termo.replace('"', '""') + '"'
+        return custos.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s', (frase,)
+        ))
+    return custos.filter(busca_texto__contains=termo)
@@ -0,0 +1,135 @@
+"""Cache dos relatórios por tipo e período, invalidado por mês.
+
+Cada mês tem um número de versão no cache. A chave de um relatório inclui as
+versões de todos os meses que o período cobre, então alterar um registro de
+um mês invalida apenas os relatórios que incluem aquele mês. Consultas sem
+período (como as estatísticas da listagem de custos) usam a versão geral,
+incrementada junto com a de qualquer mês.
+"""
+import calendar
+import hashlib
+import time
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIXO = 'relatorios'
+
+# Meses à frente invalidados quando um custo fixo não tem data de fim
+MESES_FUTUROS = 12
+
+# "Mês" cuja versão muda a cada invalidação (consultas que não têm período)
+VERSAO_GERAL = 'geral'
+
+
+def _timeout():
+    return getattr(settings, 'RELATORIOS_CACHE_TIMEOUT', 3600)
+
+
+def meses_do_periodo(data_inicio, data_fim):
+    """Lista 'YYYY-MM' de todos os meses entre duas datas (inclusive)"""
+    meses = []
+    ano, mes = data_inicio.year, data_inicio.month
+    while (ano, mes) <= (data_fim.year, data_fim.month):
+        meses.append(f'{ano}-{mes:02d}')
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
+
+
+def _chave_versao(ano_mes):
+    return f'{PREFIXO}:versao:{ano_mes}'
+
+
+def _versoes(meses):
+    """Versões atuais dos meses; meses sem versão recebem uma nova (nunca reaproveitada)"""
+    chaves = [_chave_versao(ano_mes) for ano_mes in meses]
+    versoes = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in versoes:
+            cache.add(chave, time.time_ns(), timeout=None)
+            versoes[chave] = cache.get(chave)
+    return [versoes[chave] for chave in chaves]
+
+
+def chave_relatorio(tipo, data_inicio, data_fim):
+    """Chave de cache de um relatório, incluindo as versões dos meses do período"""
+    versoes = ':'.join(str(v) for v in _versoes(meses_do_periodo(data_inicio, data_fim)))
+    assinatura = hashlib.md5(versoes.encode()).hexdigest()
+    return f'{PREFIXO}:{tipo}:{data_inicio.isoformat()}:{data_fim.isoformat()}:{assinatura}'
+
+
+def obter_ou_calcular(tipo, data_inicio, data_fim, calcular):
+    """Retorna o relatório do cache ou o calcula com calcular() e o armazena"""
+    chave = chave_relatorio(tipo, data_inicio, data_fim)
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = calcular()
+        cache.set(chave, resultado, _timeout())
+    return resultado
+
+
+async def aobter_ou_calcular(tipo, data_inicio, data_fim, calcular):
+    """Versão assíncrona de obter_ou_calcular; calcular() retorna uma corrotina"""
+    chave = await sync_to_async(chave_relatorio)(tipo, data_inicio, data_fim)
+    resultado = await cache.aget(chave)
+    if resultado is None:
+        resultado = await calcular()
+        await cache.aset(chave, resultado, _timeout())
+    return resultado
+
+
+def obter_ou_calcular_geral(tipo, partes, calcular):
+    """Como obter_ou_calcular, para consultas sem período: invalidada por alterações em qualquer mês"""
+    versao, = _versoes([VERSAO_GERAL])
+    assinatura = hashlib.md5(repr((versao, partes)).encode()).hexdigest()
+    chave = f'{PREFIXO}:{tipo}:{assinatura}'
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = calcular()
+        cache.set(chave, resultado, _timeout())
+    return resultado
+
+
+def _incrementar_versoes(meses):
+    for ano_mes in set(meses):
+        chave = _chave_versao(ano_mes)
+        try:
+            cache.incr(chave)
+        except ValueError:
+            cache.set(chave, time.time_ns(), timeout=None)
+
+
+def invalidar_meses(meses):
+    """Invalida os relatórios que incluem algum dos meses 'YYYY-MM'.
+
+    A versão é incrementada na hora e novamente após o commit, para descartar
+    relatórios calculados por outra requisição antes de a transação terminar.
+    """
+    meses = {ano_mes for ano_mes in meses if ano_mes}
+    if not meses:
+        return
+    meses.add(VERSAO_GERAL)
+    _incrementar_versoes(meses)
+    transaction.on_commit(lambda: _incrementar_versoes(meses))
+
+
+def invalidar_datas(datas):
+    """Invalida os relatórios dos meses que contêm as datas informadas"""
+    invalidar_meses(d.strftime('%Y-%m') for d in datas if d)
+
+
+def invalidar_vigencia(data_inicio, data_fim):
+    """Invalida os meses de vigência de um custo fixo (sem data de fim, até MESES_FUTUROS à frente)"""
+    if not data_inicio:
+        return
+    if not data_fim:
+        hoje = date.today()
+        referencia = max(data_inicio, hoje)
+        ano = referencia.year + (referencia.month - 1 + MESES_FUTUROS) // 12
+        mes = (referencia.month - 1 + MESES_FUTUROS) % 12 + 1
+        data_fim = date(ano, mes, calendar.monthrange(ano, mes)[1])
+    if data_fim >= data_inicio:
+        invalidar_meses(meses_do_periodo(data_inicio, data_fim))
@@ -0,0 +1,161 @@
+"""Upload dos comprovantes dos custos gerais.
+
+O arquivo enviado é lido em blocos (o Django já grava em disco os uploads
+grandes) enquanto o SHA-256 é calculado, e é salvo com o hash como nome:
+arquivos idênticos ficam gravados uma única vez e são compartilhados pelos
+custos. Para imagens são geradas uma versão de exibição e uma miniatura em
+JPEG, depois do commit e fora da requisição (uma thread em segundo plano),
+que no final marca os custos do arquivo (CustosGerais.comprovante_versoes).
+Enquanto a marca não existe as URLs apontam para o original; montar as URLs
+não consulta o storage.
+"""
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+PASTA = 'comprovantes'
+TAMANHO_BLOCO = 64 * 1024
+EXTENSOES_IMAGEM = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff'}
+
+# Versão -> (subpasta, maior lado em pixels)
+VERSOES = {
+    'exibicao': ('exibicao', 1600),
+    'miniatura': ('miniaturas', 320),
+}
+QUALIDADE_JPEG = 80
+
+# Uma thread basta: a geração é rara e não deve disputar CPU com as requisições
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='comprovantes')
+
+
+class ComprovanteInvalido(ValueError):
+    """Arquivo de comprovante vazio ou acima do tamanho máximo"""
+
+
+def _tamanho_maximo():
+    return getattr(settings, 'COMPROVANTE_TAMANHO_MAXIMO_MB', 20) * 1024 * 1024
+
+
+def _extensao(nome):
+    extensao = os.path.splitext(nome or '')[1].lower()
+    return extensao if extensao[1:].isalnum() and len(extensao) <= 6 else ''
+
+
+def _hash(nome):
+    return os.path.splitext(os.path.basename(nome))[0]
+
+
+def salvar_comprovante(arquivo):
+    """Grava o upload com o hash do conteúdo como nome e retorna o nome no storage.
+
+    Se o mesmo conteúdo já foi enviado antes, nada é gravado e o nome do
+    arquivo existente é retornado.
+    """
+    sha256 = hashlib.sha256()
+    tamanho = 0
+    for bloco in arquivo.chunks(TAMANHO_BLOCO):
+        tamanho += len(bloco)
+        if tamanho > _tamanho_maximo():
+            raise ComprovanteInvalido(
+                f'Comprovante maior que {getattr(settings, "COMPROVANTE_TAMANHO_MAXIMO_MB", 20)} MB'
+            )
+        sha256.update(bloco)
+    if not tamanho:
+        raise ComprovanteInvalido('Comprovante vazio')
+
+    nome = f'{PASTA}/{sha256.hexdigest()}{_extensao(arquivo.name)}'
+    if default_storage.exists(nome):
+        logger.info(f'Comprovante repetido reaproveitado: {nome}')
+        return nome
+    arquivo.seek(0)
+    # O storage copia o arquivo em blocos; outro upload simultâneo do mesmo conteúdo recebe um sufixo
+    return default_storage.save(nome, arquivo)
+
+
+def nome_versao(nome, versao):
+    """Nome no storage da versão reduzida ('exibicao' ou 'miniatura') de um comprovante de imagem"""
+    pasta, _ = VERSOES[versao]
+    return f'{PASTA}/{pasta}/{_hash(nome)}.jpg'
+
+
+def url_versao(arquivo, versao, gerada):
+    """URL da versão reduzida se ela já foi gerada (`gerada`), senão a do original"""
+    if not arquivo:
+        return ''
+    if gerada:
+        return default_storage.url(nome_versao(arquivo.name, versao))
+    return arquivo.url
+
+
+def gerar_versoes(nome):
+    """Gera as versões de exibição e miniatura que ainda não existem (só para imagens)"""
+    if _extensao(nome) not in EXTENSOES_IMAGEM:
+        return []
+    pendentes = {
+        versao: nome_versao(nome, versao) for versao in VERSOES
+        if not default_storage.exists(nome_versao(nome, versao))
+    }
+    if not pendentes:
+        return []
+
+    maior_lado = max(VERSOES[versao][1] for versao in pendentes)
+    with default_storage.open(nome) as arquivo, Image.open(arquivo) as imagem:
+        # JPEG: decodifica direto em escala reduzida (bem mais rápido para fotos de celular)
+        imagem.draft('RGB', (maior_lado, maior_lado))
+        # Fotos de celular guardam a rotação no EXIF
+        imagem = ImageOps.exif_transpose(imagem).convert('RGB')
+        for versao, destino in pendentes.items():
+            copia = imagem.copy()
+            copia.thumbnail((VERSOES[versao][1],) * 2, Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            copia.save(buffer, 'JPEG', quality=QUALIDADE_JPEG, optimize=True, progressive=True)
+            default_storage.save(destino, ContentFile(buffer.getvalue()))
+    return list(pendentes.values())
+
+
+def marcar_versoes(nome):
+    """Marca os custos que usam o arquivo (compartilhado pelo hash) como tendo as versões reduzidas"""
+    from .models import CustosGerais  # models importa este módulo
+
+    return CustosGerais.objects.filter(comprovante=nome, comprovante_versoes=False).update(
+        comprovante_versoes=True, updated_at=timezone.now()
+    )
+
+
+def _gerar_versoes_registrando(nome):
+    try:
+        gerados = gerar_versoes(nome)
+        if gerados:
+            logger.info(f'Versões do comprovante {nome} geradas: {", ".join(gerados)}')
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning(f'Não foi possível gerar as versões do comprovante {nome}: {e}')
+        return
+    if _extensao(nome) in EXTENSOES_IMAGEM:
+        marcar_versoes(nome)
+
+
+def _gerar_versoes_em_segundo_plano(nome):
+    try:
+        _gerar_versoes_registrando(nome)
+    finally:
+        # A thread abriu a sua própria conexão
+        connection.close()
+
+
+def agendar_versoes(nome):
+    """Gera as versões do comprovante depois do commit, em segundo plano (ou na hora, se desativado)"""
+    if getattr(settings, 'COMPROVANTES_EM_SEGUNDO_PLANO', True):
+        transaction.on_commit(lambda: _executor.submit(_gerar_versoes_em_segundo_plano, nome))
+    else:
+        transaction.on_commit(lambda: _gerar_versoes_registrando(nome))
@@ -0,0 +1,104 @@
+"""Rateio dos custos fixos mensais por período com um índice de intervalos.
+
+Cada CustoFixoMensal ativo é um intervalo de dias [data_inicio, data_fim]
+(sem data_fim = sem fim) com um valor mensal. O valor atribuído a um período
+é a soma, por custo, de valor_mensal * dias ativos no período / dias do
+período, arredondada ao centavo.
+
+O índice guarda os inícios e os fins dos intervalos ordenados, com somas
+acumuladas de valor e de valor * dia. A soma de valor * dias ativos até um dia
+t, F(t), sai de duas buscas binárias, e o total de qualquer período é
+F(fim) - F(início - 1): O(log n) por consulta. Dashboard, relatórios e APIs
+usam o mesmo índice, guardado no cache até algum custo fixo ser alterado
+(signals de CustoFixoMensal e caminhos com bulk_create chamam invalidar_indice).
+"""
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .dinheiro import centavos, dividir
+from .models import CustoFixoMensal
+
+CHAVE_CACHE = 'custos_fixos:indice'
+
+
+class IndiceCustosFixos:
+    """Intervalos de vigência dos custos fixos com somas acumuladas (valores em centavos)"""
+
+    def __init__(self, custos):
+        # Custos com data_fim anterior ao início nunca estão ativos
+        self.custos = sorted(
+            (c for c in custos if not c.data_fim or c.data_fim >= c.data_inicio),
+            key=lambda c: (c.data_inicio, c.pk or 0)
+        )
+        inicios = [(c.data_inicio.toordinal(), centavos(c.valor_mensal)) for c in self.custos]
+        # Fins ordenados com a posição do custo em self.custos (para ativos())
+        fins = sorted(
+            (c.data_fim.toordinal(), i, centavos(c.valor_mensal)) for i, c in enumerate(self.custos) if c.data_fim
+        )
+        self._inicios = [dia for dia, _ in inicios]
+        self._valor_inicios = list(accumulate((valor for _, valor in inicios), initial=0))
+        self._dia_valor_inicios = list(accumulate((dia * valor for dia, valor in inicios), initial=0))
+        self._fins = [dia for dia, _, _ in fins]
+        self._posicoes_fins = [i for _, i, _ in fins]
+        self._valor_fins = list(accumulate((valor for _, _, valor in fins), initial=0))
+        self._dia_valor_fins = list(accumulate((dia * valor for dia, _, valor in fins), initial=0))
+        self._posicoes_sem_fim = [i for i, c in enumerate(self.custos) if not c.data_fim]
+
+    def __len__(self):
+        return len(self.custos)
+
+    def _acumulado(self, dia):
+        """F(dia): soma de valor * dias ativos de todos os custos até o dia (inclusive)"""
+        # Custos iniciados até o dia contam (dia - início + 1) dias...
+        i = bisect_right(self._inicios, dia)
+        total = (dia + 1) * self._valor_inicios[i] - self._dia_valor_inicios[i]
+        # ...menos os dias depois do fim, para os que terminaram antes do dia
+        j = bisect_left(self._fins, dia)
+        return total - (dia * self._valor_fins[j] - self._dia_valor_fins[j])
+
+    def centavo_dias(self, data_inicio, data_fim):
+        """Soma de valor_mensal * dias ativos no período, em centavos * dias"""
+        return self._acumulado(data_fim.toordinal()) - self._acumulado(data_inicio.toordinal() - 1)
+
+    def total_periodo(self, data_inicio, data_fim):
+        """Custo fixo atribuído ao período (datas inclusive), em centavos"""
+        if data_fim < data_inicio:
+            return 0
+        return dividir(self.centavo_dias(data_inicio, data_fim), (data_fim - data_inicio).days + 1)
+
+    def ativos(self, data_inicio, data_fim):
+        """Custos com vigência em algum dia do período, em ordem de data_inicio
+
+        Duas buscas binárias delimitam os candidatos: os iniciados até o fim do
+        período (prefixo de self.custos) e os sem fim ou terminados a partir do
+        início (sufixo dos fins). Só o menor dos dois conjuntos é percorrido:
+        O(log n + candidatos), não O(log n) — os custos encerrados há muito tempo
+        ou que ainda vão começar ficam de fora da varredura.
+        """
+        inicio = data_inicio.toordinal()
+        limite = bisect_right(self._inicios, data_fim.toordinal())
+        j = bisect_left(self._fins, inicio)
+        sem_fim = bisect_left(self._posicoes_sem_fim, limite)
+        if limite <= sem_fim + len(self._fins) - j:
+            return [c for c in self.custos[:limite] if not c.data_fim or c.data_fim >= data_inicio]
+        posicoes = self._posicoes_sem_fim[:sem_fim] + [p for p in self._posicoes_fins[j:] if p < limite]
+        return [self.custos[p] for p in sorted(posicoes)]
+
+
+def carregar_indice():
+    """Índice dos custos fixos ativos (do cache; reconstruído com uma query após alterações)"""
+    indice = cache.get(CHAVE_CACHE)
+    if indice is None:
+        indice = IndiceCustosFixos(CustoFixoMensal.objects.filter(status='ativo'))
+        cache.set(CHAVE_CACHE, indice, getattr(settings, 'RELATORIOS_CACHE_TIMEOUT', 3600))
+    return indice
+
+
+def invalidar_indice():
+    """Descarta o índice na hora e após o commit (como cache_relatorios.invalidar_meses)"""
+    cache.delete(CHAVE_CACHE)
+    transaction.on_commit(lambda: cache.delete(CHAVE_CACHE))
@@ -0,0 +1,99 @@
+"""Tabelas de dimensão de motoristas e caminhões.
+
+Os campos de texto (DailyReport.motorista, DailyReport.caminhao,
+MotoristaSalario.motorista e CustosGerais.veiculo_placa) continuam sendo
+gravados para exibição, mas cada registro aponta também para um Motorista e um
+Caminhao. Os relatórios agrupam e cruzam pelas chaves inteiras. Grafias
+diferentes do mesmo nome (espaços, maiúsculas, hífen da placa) caem na mesma
+linha de dimensão e o texto gravado passa a ser a grafia canônica dela.
+"""
+import re
+
+from .models import Caminhao, CustosGerais, DailyReport, Motorista, MotoristaSalario
+
+_SEPARADORES_PLACA = re.compile(r'[\s\-.]')
+
+
+def nome_canonico(texto):
+    """Texto sem espaços nas pontas e com espaços internos simples"""
+    return ' '.join((texto or '').split())
+
+
+def chave_motorista(nome):
+    return nome_canonico(nome).casefold()
+
+
+def chave_caminhao(identificacao):
+    return _SEPARADORES_PLACA.sub('', identificacao or '').upper()
+
+
+# Modelo -> (campo com o texto exibido, função que gera a chave única)
+DIMENSOES = {
+    Motorista: ('nome', chave_motorista),
+    Caminhao: ('identificacao', chave_caminhao),
+}
+
+
+def resolver(modelo, textos):
+    """Devolve {texto: instância da dimensão}, criando as que faltarem (no máximo três queries)"""
+    campo, chave = DIMENSOES[modelo]
+    por_chave = {}
+    for texto in textos:
+        if chave(texto):
+            por_chave.setdefault(chave(texto), nome_canonico(texto))
+    if not por_chave:
+        return {}
+
+    existentes = {item.chave: item for item in modelo.objects.filter(chave__in=por_chave)}
+    faltando = [modelo(chave=c, **{campo: texto}) for c, texto in por_chave.items() if c not in existentes]
+    if faltando:
+        # ignore_conflicts: outra requisição pode ter criado a mesma chave em paralelo
+        modelo.objects.bulk_create(faltando, ignore_conflicts=True)
+        existentes.update(
+            (item.chave, item) for item in modelo.objects.filter(chave__in=[item.chave for item in faltando])
+        )
+    return {texto: existentes[chave(texto)] for texto in textos if chave(texto) in existentes}
+
+
+def preencher_referencias(objetos):
+    """Liga viagens, salários e custos gerais às suas dimensões (sem salvar).
+
+    Usado pelo signal pre_save e pelos caminhos com bulk_create/bulk_update,
+    que não disparam signals. Também troca o texto pela grafia canônica.
+    """
+    objetos = list(objetos)
+    # dict.fromkeys mantém a ordem: a primeira grafia vista vira a canônica de uma dimensão nova
+    motoristas = resolver(Motorista, dict.fromkeys(
+        obj.motorista for obj in objetos if isinstance(obj, (DailyReport, MotoristaSalario))
+    ))
+    caminhoes = resolver(Caminhao, dict.fromkeys(
+        obj.caminhao if isinstance(obj, DailyReport) else obj.veiculo_placa
+        for obj in objetos if isinstance(obj, (DailyReport, CustosGerais))
+    ))
+
+    for obj in objetos:
+        if isinstance(obj, (DailyReport, MotoristaSalario)):
+            motorista = motoristas.get(obj.motorista)
+            obj.motorista_ref = motorista
+            if motorista:
+                obj.motorista = motorista.nome
+        if isinstance(obj, DailyReport):
+            caminhao = caminhoes.get(obj.caminhao)
+            obj.caminhao_ref = caminhao
+            if caminhao:
+                obj.caminhao = caminhao.identificacao
+        elif isinstance(obj, CustosGerais):
+            caminhao = caminhoes.get(obj.veiculo_placa)
+            obj.caminhao_ref = caminhao
+            if caminhao:
+                obj.veiculo_placa = caminhao.identificacao[:20]
+    return objetos
+
+
+def nomes(modelo, ids):
+    """{id: texto} das dimensões informadas, em uma query"""
+    campo, _ = DIMENSOES[modelo]
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    return dict(modelo.objects.filter(id__in=ids).values_list('id', campo))
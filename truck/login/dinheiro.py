@@ -0,0 +1,64 @@
+"""Valores monetários em centavos inteiros.
+
+Os campos continuam DecimalField (duas casas) no banco; este módulo é a
+camada usada pelos relatórios para fazer as contas em centavos (int): no
+banco, com SomaCentavos (SUM de inteiros, exato em qualquer volume, inclusive
+no SQLite que guarda decimais como REAL), e no Python, com centavos()/somar().
+O valor só volta para reais na saída: Decimal para os templates (reais()) e
+número JSON para as APIs (para_json(), uma divisão inteira por 100).
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import BigIntegerField, F, Sum
+from django.db.models.functions import Cast, Coalesce, Round
+
+CENTAVO = Decimal('0.01')
+_UNIDADE = Decimal('1')
+
+
+def centavos(valor):
+    """Converte um valor em reais (Decimal, str ou número) para centavos inteiros"""
+    if valor is None or valor == '':
+        return 0
+    if isinstance(valor, int):
+        return valor * 100
+    if not isinstance(valor, Decimal):
+        valor = Decimal(str(valor))
+    return int(valor.scaleb(2).quantize(_UNIDADE, rounding=ROUND_HALF_UP))
+
+
+def reais(valor_centavos):
+    """Converte centavos inteiros para Decimal com duas casas (sem divisão)"""
+    return Decimal(valor_centavos).scaleb(-2)
+
+
+def para_json(valor_centavos):
+    """Centavos como número JSON em reais.
+
+    A divisão de inteiros do Python é corretamente arredondada, então o float
+    resultante é serializado com exatamente as casas do valor em centavos.
+    """
+    return valor_centavos / 100
+
+
+def dividir(numerador, denominador):
+    """Divisão inteira arredondando meio centavo para cima"""
+    return (2 * numerador + denominador) // (2 * denominador)
+
+
+def somar(valores):
+    """Soma exata de valores em reais, em centavos"""
+    return sum(map(centavos, valores))
+
+
+def Centavos(campo):
+    """Expressão SQL com o valor do campo em centavos inteiros"""
+    return Cast(Round(F(campo) * 100), BigIntegerField())
+
+
+def SomaCentavos(campo, filter=None):
+    """Agregação SQL da soma do campo em centavos inteiros (0 quando não há linhas).
+
+    filter (um Q) restringe as linhas somadas, para vários totais na mesma query.
+    """
+    return Coalesce(Sum(Centavos(campo), filter=filter), 0)
@@ -0,0 +1,87 @@
+"""ETags das APIs JSON de relatórios (GET condicional com If-None-Match).
+
+A ETag é derivada da impressão digital das tabelas que a resposta lê:
+quantidade de linhas e maior `updated_at` de cada uma, obtidas em uma única
+query. Inserções e alterações mudam o maior `updated_at` e exclusões mudam a
+contagem, então a ETag muda sempre que a resposta pode mudar. Usadas com
+`django.views.decorators.http.condition`, que responde 304 sem executar a view
+(ou com `condicao_assincrona`, nas views assíncronas).
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .models import DailyReport, CustosGerais, CustoFixoMensal, MonthlyCost, MotoristaSalario
+
+# Incrementar quando o formato das respostas mudar, para invalidar as cópias dos navegadores
+VERSAO_RESPOSTAS = 1
+
+
+def impressao_digital(*modelos):
+    """(contagem, maior updated_at) de cada modelo, em uma única query"""
+    colunas = []
+    for modelo in modelos:
+        tabela = connection.ops.quote_name(modelo._meta.db_table)
+        colunas.append(f'(SELECT COUNT(*) FROM {tabela})')
+        colunas.append(f'(SELECT MAX(updated_at) FROM {tabela})')
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {", ".join(colunas)}')
+        return cursor.fetchone()
+
+
+def calcular_etag(modelos, *partes):
+    """ETag forte a partir da impressão digital dos modelos e de partes da requisição"""
+    conteudo = repr((VERSAO_RESPOSTAS, impressao_digital(*modelos), partes))
+    return hashlib.md5(conteudo.encode()).hexdigest()
+
+
+def condicao_assincrona(etag_func):
+    """Versão de `condition(etag_func=...)` para views assíncronas.
+
+    O `condition` do Django aceita views async, mas chama etag_func direto no
+    event loop, onde a query da impressão digital não pode rodar.
+    """
+    def decorador(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = await sync_to_async(etag_func)(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if etag and request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorador
+
+
+def _somente_get(funcao):
+    # POST/PUT não usam ETag; evita a query de impressão digital nesses métodos
+    def etag(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        return funcao(request, *args, **kwargs)
+    return etag
+
+
+@_somente_get
+def etag_relatorios_mes(request):
+    return calcular_etag(
+        (DailyReport, CustosGerais, CustoFixoMensal, MonthlyCost, MotoristaSalario),
+        request.GET.get('ano_mes', '')
+    )
+
+
+@_somente_get
+def etag_listar_relatorios(request):
+    return calcular_etag((DailyReport, CustosGerais, MotoristaSalario), sorted(request.GET.items()))
+
+
+@_somente_get
+def etag_custos_fixos(request):
+    return calcular_etag((CustoFixoMensal,), request.headers.get('X-Requested-With', ''))
@@ -0,0 +1,208 @@
+"""Exportação de viagens e custos gerais em CSV/XLSX por streaming.
+
+As linhas são lidas do banco com .iterator() e processadas em blocos de
+TAMANHO_BLOCO, então a memória usada não depende do tamanho do período.
+O XLSX é gerado diretamente com zipfile (planilha com strings inline), sem
+dependências extras.
+"""
+import csv
+import zipfile
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from . import dinheiro
+from .models import DailyReport, CustosGerais
+from .relatorios import CAMPOS_RELATORIO, serializar_relatorios
+
+TAMANHO_BLOCO = 500
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+COLUNAS_VIAGENS = [
+    'ID', 'Data', 'Partida', 'Chegada', 'Motorista', 'Caminhão', 'Diárias',
+    'Valor Diárias', 'Litros Gasolina', 'Gasto Gasolina', 'Receita Frete',
+    'Custos Gerais', 'Salário Líquido', 'Total Despesas', 'Lucro Líquido',
+]
+
+COLUNAS_CUSTOS = [
+    'ID', 'Data', 'Tipo', 'Descrição', 'Oficina/Fornecedor', 'Placa', 'Valor',
+    'Forma de Pagamento', 'Status', 'Vencimento', 'Viagem', 'Motorista',
+]
+
+
+def _em_blocos(iteravel, tamanho=TAMANHO_BLOCO):
+    iterador = iter(iteravel)
+    while True:
+        bloco = list(islice(iterador, tamanho))
+        if not bloco:
+            return
+        yield bloco
+
+
+def _filtrar_periodo(queryset, campo, data_inicio, data_fim):
+    if data_inicio:
+        queryset = queryset.filter(**{f'{campo}__gte': data_inicio})
+    if data_fim:
+        queryset = queryset.filter(**{f'{campo}__lte': data_fim})
+    return queryset
+
+
+def linhas_viagens(data_inicio=None, data_fim=None):
+    """Gera as linhas das viagens com as mesmas colunas de lucro de listar_relatorios"""
+    yield COLUNAS_VIAGENS
+    relatorios = _filtrar_periodo(DailyReport.objects.all(), 'data_viagem', data_inicio, data_fim)
+    relatorios = relatorios.order_by('data_viagem', 'created_at', 'id').values(*CAMPOS_RELATORIO)
+
+    for bloco in _em_blocos(relatorios.iterator(chunk_size=TAMANHO_BLOCO)):
+        # Salários e custos do bloco são carregados em lote, como na listagem
+        for r in serializar_relatorios(bloco):
+            yield [
+                r['id'], r['data_viagem'], r['partida'], r['chegada'], r['motorista'],
+                r['nomeCaminhao'] or '', r['quantidadeDiarias'], r['valor_diarias'],
+                r['litrosGasolina'], r['gasto_gasolina'], r['receita_frete'],
+                r['totalCustosGerais'], r['salarioLiquido'], r['totalDespesas'], r['lucroLiquido'],
+            ]
+
+
+def linhas_custos(data_inicio=None, data_fim=None):
+    """Gera as linhas dos custos gerais do período"""
+    yield COLUNAS_CUSTOS
+    custos = _filtrar_periodo(CustosGerais.objects.all(), 'data', data_inicio, data_fim)
+    custos = custos.select_related('relatorio').order_by('data', 'created_at', 'id')
+
+    for custo in custos.iterator(chunk_size=TAMANHO_BLOCO):
+        yield [
+            custo.id,
+            custo.data.isoformat(),
+            custo.get_tipo_gasto_display(),
+            custo.descricao,
+            custo.oficina_fornecedor or '',
+            custo.veiculo_placa or '',
+            dinheiro.para_json(dinheiro.centavos(custo.valor)),
+            custo.get_forma_pagamento_display(),
+            custo.get_status_pagamento_display(),
+            custo.data_vencimento.isoformat() if custo.data_vencimento else '',
+            custo.relatorio_id or '',
+            custo.relatorio.motorista if custo.relatorio else '',
+        ]
+
+
+class _Eco:
+    """Arquivo falso que devolve o que recebe, para o csv.writer gerar strings"""
+
+    def write(self, valor):
+        return valor
+
+
+def _celula_csv(valor):
+    # Formato brasileiro (vírgula decimal) para abrir direto no Excel com ';'
+    if isinstance(valor, float):
+        return f'{valor:.2f}'.replace('.', ',')
+    return valor
+
+
+def gerar_csv(linhas):
+    """Gera o CSV linha a linha (separador ';' e BOM para o Excel reconhecer UTF-8)"""
+    writer = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff'
+    for linha in linhas:
+        yield writer.writerow([_celula_csv(valor) for valor in linha])
+
+
+class _Buffer:
+    """Destino não pesquisável do zipfile; os bytes escritos são recolhidos a cada linha"""
+
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def recolher(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+
+_XLSX_ARQUIVOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Dados" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _celula_xlsx(valor):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(str(valor))}</t></is></c>'
+
+
+def gerar_xlsx(linhas):
+    """Gera o arquivo XLSX em pedaços, escrevendo a planilha linha a linha"""
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo:
+        for nome, conteudo in _XLSX_ARQUIVOS.items():
+            arquivo.writestr(nome, conteudo)
+        yield buffer.recolher()
+
+        with arquivo.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            for linha in linhas:
+                planilha.write(('<row>' + ''.join(_celula_xlsx(v) for v in linha) + '</row>').encode())
+                dados = buffer.recolher()
+                if dados:
+                    yield dados
+            planilha.write(b'</sheetData></worksheet>')
+    yield buffer.recolher()
+
+
+def exportar(tipo, formato, data_inicio=None, data_fim=None):
+    """Retorna o gerador do arquivo de exportação ('viagens' ou 'custos', 'csv' ou 'xlsx')"""
+    linhas = linhas_viagens(data_inicio, data_fim) if tipo == 'viagens' else linhas_custos(data_inicio, data_fim)
+    return gerar_xlsx(linhas) if formato == 'xlsx' else gerar_csv(linhas)
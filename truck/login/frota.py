@@ -0,0 +1,193 @@
+"""Gerador de dados sintéticos da frota (viagens, custos, custos fixos e salários).
+
+Usado pelo comando seed_fleet, pelo benchmark dos relatórios e pelos testes
+de orçamento de queries. Os valores seguem distribuições aproximadas das
+reais (diárias 1-3, consumo proporcional à distância, pedágio frequente,
+manutenção rara e cara) e são reprodutíveis pela semente.
+"""
+import random
+import string
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+
+from . import busca, cache_relatorios, dimensoes, resumos
+from .custos_fixos import invalidar_indice
+from .models import (
+    DailyReport, CustosGerais, CustoFixoMensal, MotoristaSalario, VALOR_DIARIA
+)
+
+TAMANHO_LOTE = 2000
+
+CIDADES = [
+    'São Paulo', 'Campinas', 'Santos', 'Sorocaba', 'Ribeirão Preto', 'Curitiba',
+    'Belo Horizonte', 'Rio de Janeiro', 'Uberlândia', 'Londrina', 'Goiânia', 'Bauru',
+]
+
+NOMES = [
+    'João', 'José', 'Antônio', 'Francisco', 'Carlos', 'Paulo', 'Pedro', 'Lucas',
+    'Marcos', 'Luiz', 'Gabriel', 'Rafael', 'Daniel', 'Marcelo', 'Bruno', 'Eduardo',
+]
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Costa', 'Rodrigues', 'Alves']
+
+# (tipo_gasto, peso, valor médio, fornecedor)
+CUSTOS_VIAGEM = [
+    ('pedagio', 50, 45, 'Concessionária'),
+    ('combustivel', 15, 300, 'Posto'),
+    ('estacionamento', 12, 30, 'Estacionamento'),
+    ('manutencao', 8, 900, 'Oficina'),
+    ('pecas', 7, 600, 'Autopeças'),
+    ('multas', 3, 195, 'Detran'),
+    ('outros', 5, 80, 'Diversos'),
+]
+
+CUSTOS_FIXOS = [
+    ('seguro', 'Seguro', 850),
+    ('ipva', 'IPVA', 420),
+    ('licenciamento', 'Licenciamento', 95),
+    ('manutencao_preventiva', 'Manutenção Preventiva', 700),
+]
+
+
+def _dinheiro(valor):
+    return Decimal(str(round(max(valor, 0), 2))).quantize(Decimal('0.01'))
+
+
+def _placa(rng):
+    return (
+        ''.join(rng.choices(string.ascii_uppercase, k=3)) + str(rng.randint(0, 9))
+        + rng.choice(string.ascii_uppercase) + f'{rng.randint(0, 99):02d}'
+    )
+
+
+def _nomes_motoristas(rng, quantidade):
+    combinacoes = [f'{nome} {sobrenome}' for nome in NOMES for sobrenome in SOBRENOMES]
+    nomes = rng.sample(combinacoes, min(quantidade, len(combinacoes)))
+    nomes += [f'Motorista {i}' for i in range(len(nomes) + 1, quantidade + 1)]
+    return sorted(nomes)
+
+
+def _dias_com_pesos(inicio, fim):
+    """Dias do período com peso menor para domingos"""
+    dias, pesos = [], []
+    atual = inicio
+    while atual <= fim:
+        dias.append(atual)
+        pesos.append(0.2 if atual.weekday() == 6 else 1.0)
+        atual += timedelta(days=1)
+    return dias, pesos
+
+
+def _viagem(rng, data_viagem, motorista, caminhao):
+    partida, chegada = rng.sample(CIDADES, 2)
+    distancia = rng.lognormvariate(5.6, 0.5)  # ~ 300 km, cauda longa
+    diarias = min(3, 1 + int(distancia // 450))
+    litros = distancia / rng.uniform(2.3, 3.2)
+    preco_litro = rng.uniform(5.6, 6.6)
+    return DailyReport(
+        data_viagem=data_viagem,
+        partida=partida,
+        chegada=chegada,
+        diarias=diarias,
+        valor_diarias=diarias * VALOR_DIARIA,
+        litros_gasolina=_dinheiro(litros),
+        gasto_gasolina=_dinheiro(litros * preco_litro),
+        receita_frete=_dinheiro(distancia * rng.uniform(6.5, 9.5)),
+        motorista=motorista,
+        caminhao=caminhao,
+    )
+
+
+def _custos_viagem(rng, viagem):
+    pesos = [tipo[1] for tipo in CUSTOS_VIAGEM]
+    quantidade = rng.choices([0, 1, 2, 3], weights=[35, 40, 18, 7])[0]
+    custos = []
+    for tipo_gasto, _, valor_medio, fornecedor in rng.choices(CUSTOS_VIAGEM, weights=pesos, k=quantidade):
+        custos.append(CustosGerais(
+            relatorio_id=viagem.pk,
+            tipo_gasto=tipo_gasto,
+            data=viagem.data_viagem,
+            veiculo_placa=viagem.caminhao,
+            oficina_fornecedor=fornecedor,
+            descricao=dict(CustosGerais.TIPO_GASTO_CHOICES)[tipo_gasto],
+            valor=_dinheiro(rng.lognormvariate(0, 0.4) * valor_medio),
+            forma_pagamento=rng.choice(['vista', 'pix', 'debito', 'credito']),
+            status_pagamento=rng.choices(['pago', 'nao_pago', 'parcial'], weights=[80, 15, 5])[0],
+        ))
+    return custos
+
+
+def gerar_frota(viagens=1000, caminhoes=10, motoristas=15, anos=2, fim=None, semente=42):
+    """Cria viagens, custos gerais, custos fixos e salários sintéticos.
+
+    As viagens são distribuídas pelos `anos` que terminam em `fim` (hoje por
+    padrão). Retorna a quantidade de registros criados por modelo.
+    """
+    rng = random.Random(semente)
+    fim = fim or date.today()
+    inicio = fim - timedelta(days=int(365 * anos) - 1)
+    placas = [_placa(rng) for _ in range(caminhoes)]
+    nomes = _nomes_motoristas(rng, motoristas)
+    dias, pesos = _dias_com_pesos(inicio, fim)
+
+    criados = {'viagens': 0, 'custos_gerais': 0, 'custos_fixos': 0, 'salarios': 0}
+    meses = set()
+    with transaction.atomic():
+        restantes = viagens
+        while restantes > 0:
+            lote = []
+            for data_viagem in sorted(rng.choices(dias, weights=pesos, k=min(TAMANHO_LOTE, restantes))):
+                lote.append(_viagem(rng, data_viagem, rng.choice(nomes), rng.choice(placas)))
+                meses.add(data_viagem.strftime('%Y-%m'))
+            dimensoes.preencher_referencias(lote)
+            DailyReport.objects.bulk_create(lote, batch_size=TAMANHO_LOTE)
+            custos = [custo for viagem in lote for custo in _custos_viagem(rng, viagem)]
+            dimensoes.preencher_referencias(custos)
+            busca.preencher_texto(custos)
+            CustosGerais.objects.bulk_create(custos, batch_size=TAMANHO_LOTE)
+            criados['viagens'] += len(lote)
+            criados['custos_gerais'] += len(custos)
+            restantes -= len(lote)
+
+        custos_fixos = []
+        for placa in placas:
+            for tipo_custo, descricao, valor in CUSTOS_FIXOS:
+                if tipo_custo == 'manutencao_preventiva' and rng.random() < 0.4:
+                    continue
+                custos_fixos.append(CustoFixoMensal(
+                    descricao=f'{descricao} {placa}',
+                    tipo_custo=tipo_custo,
+                    valor_mensal=_dinheiro(valor * rng.uniform(0.8, 1.2)),
+                    data_inicio=inicio + timedelta(days=rng.randint(0, 60)),
+                    data_fim=None if rng.random() < 0.8 else fim - timedelta(days=rng.randint(0, 180)),
+                ))
+        CustoFixoMensal.objects.bulk_create(custos_fixos)
+        criados['custos_fixos'] = len(custos_fixos)
+
+        salarios = [
+            MotoristaSalario(
+                motorista=nome,
+                ano_mes=ano_mes,
+                salario_base=_dinheiro(rng.uniform(2600, 3800)),
+                bonus_viagens=_dinheiro(rng.uniform(0, 600)),
+                desconto_faltas=_dinheiro(rng.choice([0, 0, 0, rng.uniform(50, 300)])),
+            )
+            for nome in nomes for ano_mes in sorted(meses)
+        ]
+        dimensoes.preencher_referencias(salarios)
+        MotoristaSalario.objects.bulk_create(
+            salarios, batch_size=TAMANHO_LOTE, update_conflicts=True,
+            unique_fields=['motorista_ref', 'ano_mes'],
+            update_fields=['salario_base', 'bonus_viagens', 'desconto_faltas', 'motorista', 'updated_at'],
+        )
+        criados['salarios'] = len(salarios)
+
+        # bulk_create não dispara signals: resumos e cache são refeitos aqui
+        resumos.reconstruir()
+        cache_relatorios.invalidar_meses(meses)
+        for custo in custos_fixos:
+            cache_relatorios.invalidar_vigencia(custo.data_inicio, custo.data_fim)
+        invalidar_indice()
+
+    return criados
@@ -0,0 +1,264 @@
+"""Importação em massa de viagens (CSV ou JSON) com bulk_create.
+
+As linhas são validadas em lotes de TAMANHO_LOTE e gravadas com bulk_create
+dentro de uma única transação: se alguma linha for inválida nada é gravado e
+todos os erros são devolvidos. O valor das diárias é calculado aqui (o
+bulk_create não chama save()) e, como os signals também não disparam, os
+totais das linhas novas são somados aos resumos a cada lote e o cache de
+relatórios é invalidado uma vez no final.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+
+from . import busca, cache_relatorios, dimensoes, resumos
+from .models import DailyReport, CustosGerais, MotoristaSalario, VALOR_DIARIA
+
+TAMANHO_LOTE = 1000
+
+# Nomes aceitos para cada campo (os mesmos do formulário de cadastrar_viagem)
+CAMPOS_VIAGEM = {
+    'data_viagem': ['data_viagem', 'dataViagem'],
+    'partida': ['partida', 'localPartida'],
+    'chegada': ['chegada', 'localChegada'],
+    'diarias': ['diarias', 'quantidadeDiarias'],
+    'litros_gasolina': ['litros_gasolina', 'litrosGasolina'],
+    'gasto_gasolina': ['gasto_gasolina', 'valorGasolina'],
+    'receita_frete': ['receita_frete', 'receita'],
+    'motorista': ['motorista', 'nomeMotorista'],
+    'caminhao': ['caminhao', 'nomeCaminhao'],
+}
+
+CAMPOS_SALARIO = ['salario_base', 'bonus_viagens', 'desconto_faltas']
+
+CAMPOS_CUSTO = ['tipo_gasto', 'oficina_fornecedor', 'descricao', 'valor', 'forma_pagamento', 'status_pagamento']
+
+TIPOS_GASTO = dict(CustosGerais.TIPO_GASTO_CHOICES)
+FORMAS_PAGAMENTO = dict(CustosGerais.FORMA_PAGAMENTO_CHOICES)
+STATUS_PAGAMENTO = dict(CustosGerais.STATUS_PAGAMENTO_CHOICES)
+
+
+class ErroImportacao(ValueError):
+    """Linha de importação inválida"""
+
+
+class _ImportacaoCancelada(Exception):
+    """Desfaz a transação quando alguma linha é inválida"""
+
+
+def ler_csv(arquivo):
+    """Lê as linhas de um CSV (separador ';' ou ',') como dicionários.
+
+    Cada linha pode trazer um custo geral nas colunas custo_tipo_gasto,
+    custo_descricao, custo_valor, custo_oficina_fornecedor,
+    custo_forma_pagamento e custo_status_pagamento.
+    """
+    if isinstance(arquivo, bytes):
+        arquivo = arquivo.decode('utf-8-sig')
+    if isinstance(arquivo, str):
+        arquivo = io.StringIO(arquivo)
+
+    cabecalho = arquivo.readline().lstrip('\ufeff')
+    delimitador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    colunas = next(csv.reader([cabecalho], delimiter=delimitador))
+
+    for linha in csv.DictReader(arquivo, fieldnames=colunas, delimiter=delimitador):
+        custo = {campo: linha.pop(f'custo_{campo}', None) for campo in CAMPOS_CUSTO}
+        linha['custos'] = [custo] if custo['tipo_gasto'] else []
+        yield linha
+
+
+def ler_json(conteudo):
+    """Lê as linhas de um JSON: uma lista de viagens ou {"viagens": [...]}"""
+    dados = json.loads(conteudo)
+    if isinstance(dados, dict):
+        dados = dados.get('viagens', [])
+    if not isinstance(dados, list):
+        raise ErroImportacao('O JSON deve ser uma lista de viagens ou {"viagens": [...]}')
+    return dados
+
+
+def _valor(linha, nomes):
+    for nome in nomes:
+        valor = linha.get(nome)
+        if valor not in (None, ''):
+            return str(valor).strip()
+    return ''
+
+
+def ler_decimal(valor, campo):
+    """Valor não negativo com duas casas; aceita o formato brasileiro ("1.234,56", "10,5")"""
+    texto = str(valor or '0').strip()
+    if ',' in texto:
+        # Vírgula decimal: os pontos separam os milhares
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        numero = Decimal(texto).quantize(Decimal('0.01'))
+        if not numero.is_finite():
+            raise InvalidOperation
+    except InvalidOperation:
+        raise ErroImportacao(f'Valor inválido em {campo}: "{valor}"')
+    if numero < 0:
+        raise ErroImportacao(f'{campo} não pode ser negativo')
+    return numero
+
+
+def _escolha(valor, opcoes, padrao, campo):
+    valor = (valor or padrao).strip()
+    if valor not in opcoes:
+        raise ErroImportacao(f'{campo} inválido: "{valor}"')
+    return valor
+
+
+def validar_linha(linha):
+    """Valida uma linha e devolve (viagem, salario, custos) sem gravar nada"""
+    if not isinstance(linha, dict):
+        raise ErroImportacao('Linha deve ser um objeto')
+
+    dados = {campo: _valor(linha, nomes) for campo, nomes in CAMPOS_VIAGEM.items()}
+    faltando = [campo for campo, valor in dados.items() if not valor and campo != 'receita_frete']
+    if faltando:
+        raise ErroImportacao(f'Campos obrigatórios ausentes: {", ".join(faltando)}')
+
+    try:
+        data_viagem = datetime.strptime(dados['data_viagem'], '%Y-%m-%d').date()
+    except ValueError:
+        raise ErroImportacao(f'Formato de data inválido. Use YYYY-MM-DD. Data recebida: "{dados["data_viagem"]}"')
+    try:
+        diarias = int(dados['diarias'])
+    except ValueError:
+        raise ErroImportacao(f'Número de diárias inválido: "{dados["diarias"]}"')
+    if diarias < 0:
+        raise ErroImportacao('diarias não pode ser negativo')
+
+    viagem = DailyReport(
+        data_viagem=data_viagem,
+        partida=dados['partida'][:200],
+        chegada=dados['chegada'][:200],
+        diarias=diarias,
+        valor_diarias=diarias * VALOR_DIARIA,
+        litros_gasolina=ler_decimal(dados['litros_gasolina'], 'litros_gasolina'),
+        gasto_gasolina=ler_decimal(dados['gasto_gasolina'], 'gasto_gasolina'),
+        receita_frete=ler_decimal(dados['receita_frete'], 'receita_frete'),
+        motorista=dados['motorista'][:100],
+        caminhao=dados['caminhao'][:50],
+    )
+
+    salario = None
+    if any(_valor(linha, [campo]) for campo in CAMPOS_SALARIO):
+        salario = {campo: ler_decimal(_valor(linha, [campo]), campo) for campo in CAMPOS_SALARIO}
+
+    custos = []
+    for custo in linha.get('custos') or []:
+        if not isinstance(custo, dict):
+            raise ErroImportacao('Custo geral deve ser um objeto')
+        descricao = _valor(custo, ['descricao'])
+        oficina_fornecedor = _valor(custo, ['oficina_fornecedor'])
+        if not descricao or not oficina_fornecedor:
+            raise ErroImportacao('Custo geral sem descrição ou oficina/fornecedor')
+        custos.append(CustosGerais(
+            tipo_gasto=_escolha(_valor(custo, ['tipo_gasto']), TIPOS_GASTO, 'outros', 'tipo_gasto'),
+            data=data_viagem,
+            veiculo_placa=viagem.caminhao[:20],
+            oficina_fornecedor=oficina_fornecedor[:200],
+            descricao=descricao,
+            valor=ler_decimal(_valor(custo, ['valor']), 'valor'),
+            forma_pagamento=_escolha(_valor(custo, ['forma_pagamento']), FORMAS_PAGAMENTO, 'vista', 'forma_pagamento'),
+            status_pagamento=_escolha(_valor(custo, ['status_pagamento']), STATUS_PAGAMENTO, 'pago', 'status_pagamento'),
+        ))
+
+    return viagem, salario, custos
+
+
+def _gravar_lote(viagens_lote):
+    viagens = [viagem for viagem, _ in viagens_lote]
+    custos = [custo for _, custos_viagem in viagens_lote for custo in custos_viagem]
+    # bulk_create não dispara o pre_save que liga motorista e caminhão
+    dimensoes.preencher_referencias(viagens + custos)
+    busca.preencher_texto(custos)
+    DailyReport.objects.bulk_create(viagens, batch_size=TAMANHO_LOTE)
+    for viagem, custos_viagem in viagens_lote:
+        for custo in custos_viagem:
+            custo.relatorio = viagem
+    CustosGerais.objects.bulk_create(custos, batch_size=TAMANHO_LOTE)
+    # Só inserções: os totais novos são somados aos resumos, sem reagregar os dias
+    resumos.somar_novos(viagens, custos)
+    return len(custos)
+
+
+def _gravar_salarios(salarios):
+    """Grava os salários {(Motorista, ano_mes): (nome canônico, valores)}.
+
+    O motorista já foi resolvido com a viagem, então não há nova consulta às
+    dimensões; grafias diferentes do mesmo motorista no arquivo já caíram na
+    mesma chave (vale o último salário).
+    """
+    objetos = [
+        MotoristaSalario(motorista=motorista, motorista_ref=referencia, ano_mes=ano_mes, **valores)
+        for (referencia, ano_mes), (motorista, valores) in salarios.items()
+    ]
+    MotoristaSalario.objects.bulk_create(
+        objetos,
+        batch_size=TAMANHO_LOTE,
+        update_conflicts=True,
+        unique_fields=['motorista_ref', 'ano_mes'],
+        # updated_at também, para as ETags e a sincronização verem a alteração
+        update_fields=CAMPOS_SALARIO + ['motorista', 'updated_at'],
+    )
+    return len(objetos)
+
+
+def importar_viagens(linhas, tamanho_lote=TAMANHO_LOTE):
+    """Importa viagens, salários e custos gerais em uma única transação.
+
+    Retorna {'viagens', 'custos', 'salarios', 'erros'}; erros é uma lista de
+    {'linha', 'erro'} (linha começa em 1) e, se não estiver vazia, nada foi gravado.
+    """
+    resultado = {'viagens': 0, 'custos': 0, 'salarios': 0, 'erros': []}
+    salarios = {}
+    datas = set()
+    linhas = enumerate(linhas, start=1)
+
+    try:
+        with transaction.atomic():
+            while True:
+                bloco = list(islice(linhas, tamanho_lote))
+                if not bloco:
+                    break
+
+                viagens_lote, salarios_lote = [], []
+                for numero, linha in bloco:
+                    try:
+                        viagem, salario, custos = validar_linha(linha)
+                    except ErroImportacao as e:
+                        resultado['erros'].append({'linha': numero, 'erro': str(e)})
+                        continue
+                    viagens_lote.append((viagem, custos))
+                    datas.add(viagem.data_viagem)
+                    if salario:
+                        salarios_lote.append((viagem, salario))
+
+                # Com erros, o restante do arquivo só é validado
+                if resultado['erros']:
+                    continue
+                resultado['custos'] += _gravar_lote(viagens_lote)
+                resultado['viagens'] += len(viagens_lote)
+                # Depois de gravar, o motorista da viagem está no texto canônico e ligado à dimensão
+                for viagem, salario in salarios_lote:
+                    salarios[(viagem.motorista_ref, viagem.data_viagem.strftime('%Y-%m'))] = (viagem.motorista, salario)
+
+            if resultado['erros']:
+                raise _ImportacaoCancelada
+
+            resultado['salarios'] = _gravar_salarios(salarios) if salarios else 0
+            cache_relatorios.invalidar_datas(datas)
+            cache_relatorios.invalidar_meses(ano_mes for _, ano_mes in salarios)
+    except _ImportacaoCancelada:
+        resultado.update({'viagens': 0, 'custos': 0, 'salarios': 0})
+
+    return resultado
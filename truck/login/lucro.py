@@ -0,0 +1,183 @@
+"""Motor de lucro dos relatórios por período, em centavos e em colunas.
+
+As viagens do período são carregadas em colunas (array('q') com os valores
+em centavos) e o lucro por viagem, por motorista, por caminhão e por dia, o
+rateio dos custos fixos mensais e a divisão dos salários entre as viagens do
+motorista no mês são calculados em lote. Toda a aritmética é inteira; os
+valores só voltam para Decimal (reais) na saída.
+"""
+import operator
+from array import array
+from collections import defaultdict
+from datetime import date
+
+from .custos_fixos import IndiceCustosFixos
+from .dinheiro import SomaCentavos, centavos
+from .models import DailyReport, CustosGerais, MotoristaSalario
+
+TOTAIS_GRUPO = ['viagens', 'receita', 'gasolina', 'diarias', 'custos', 'salarios', 'lucro', 'lucro_liquido']
+
+
+def _subtrair(a, b):
+    return array('q', map(operator.sub, a, b))
+
+
+class ColunasViagens:
+    """Viagens de um período em colunas; valores monetários em centavos.
+
+    motoristas e caminhoes guardam os ids de Motorista e Caminhao.
+    """
+
+    def __init__(self, relatorios):
+        self.ids = array('q')
+        self.datas = array('l')
+        self.motoristas = []
+        self.caminhoes = []
+        self.receita = array('q')
+        self.gasolina = array('q')
+        self.diarias = array('q')
+        for relatorio in relatorios:
+            self.ids.append(relatorio['id'])
+            self.datas.append(relatorio['data_viagem'].toordinal())
+            self.motoristas.append(relatorio['motorista_ref'])
+            self.caminhoes.append(relatorio['caminhao_ref'])
+            self.receita.append(centavos(relatorio['receita_frete']))
+            self.gasolina.append(centavos(relatorio['gasto_gasolina']))
+            self.diarias.append(centavos(relatorio['valor_diarias']))
+        self.custos = array('q', bytes(8 * len(self.ids)))
+        self.salarios = array('q', bytes(8 * len(self.ids)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def posicoes(self):
+        return {relatorio_id: i for i, relatorio_id in enumerate(self.ids)}
+
+    def lucro_bruto(self):
+        """Receita - gasolina - diárias (o mesmo de DailyReport.get_lucro)"""
+        return _subtrair(_subtrair(self.receita, self.gasolina), self.diarias)
+
+    def lucro(self):
+        """Lucro bruto menos os custos gerais da viagem"""
+        return _subtrair(self.lucro_bruto(), self.custos)
+
+    def lucro_liquido(self):
+        """Lucro menos a parte do salário do motorista atribuída à viagem"""
+        return _subtrair(self.lucro(), self.salarios)
+
+
+def carregar_custos(colunas, data_inicio, data_fim):
+    """Preenche colunas.custos com a soma dos custos gerais de cada viagem (uma query, em centavos)"""
+    posicoes = colunas.posicoes()
+    totais = CustosGerais.objects.filter(
+        relatorio__data_viagem__range=[data_inicio, data_fim]
+    ).order_by().values('relatorio_id').annotate(total=SomaCentavos('valor'))
+    for linha in totais:
+        i = posicoes.get(linha['relatorio_id'])
+        if i is not None:
+            colunas.custos[i] = linha['total']
+
+
+def _meses(colunas):
+    return {date.fromordinal(ordinal).strftime('%Y-%m') for ordinal in set(colunas.datas)}
+
+
+def ratear_salarios(colunas):
+    """Divide o salário líquido mensal de cada motorista entre as suas viagens do mês.
+
+    A divisão considera todas as viagens do mês (mesmo fora do período), em
+    ordem de (data_viagem, id); os centavos que sobram vão para as primeiras
+    viagens, então a soma das partes é exatamente o salário.
+    """
+    if not len(colunas):
+        return
+    meses = _meses(colunas)
+    motoristas = set(colunas.motoristas) - {None}
+
+    salarios = {
+        (salario.motorista_ref_id, salario.ano_mes): centavos(salario.get_salario_liquido())
+        for salario in MotoristaSalario.objects.filter(motorista_ref__in=motoristas, ano_mes__in=meses)
+    }
+    if not salarios:
+        return
+
+    # Do primeiro dia do primeiro mês até o primeiro dia do mês seguinte ao último
+    inicio = date.fromordinal(min(colunas.datas)).replace(day=1)
+    ultimo = date.fromordinal(max(colunas.datas))
+    fim = date(ultimo.year + ultimo.month // 12, ultimo.month % 12 + 1, 1)
+
+    viagens_mes = defaultdict(list)
+    for relatorio_id, motorista, data_viagem in DailyReport.objects.filter(
+        data_viagem__gte=inicio, data_viagem__lt=fim, motorista_ref__in={m for m, _ in salarios}
+    ).order_by('data_viagem', 'id').values_list('id', 'motorista_ref', 'data_viagem'):
+        chave = (motorista, data_viagem.strftime('%Y-%m'))
+        if chave in salarios:
+            viagens_mes[chave].append(relatorio_id)
+
+    posicoes = colunas.posicoes()
+    for chave, ids in viagens_mes.items():
+        parte, resto = divmod(salarios[chave], len(ids))
+        for ordem, relatorio_id in enumerate(ids):
+            i = posicoes.get(relatorio_id)
+            if i is not None:
+                colunas.salarios[i] = parte + (1 if ordem < resto else 0)
+
+
+def agrupar(colunas, chaves):
+    """Soma as colunas por chave (uma chave por viagem); valores em centavos"""
+    lucro = colunas.lucro()
+    lucro_liquido = colunas.lucro_liquido()
+    grupos = defaultdict(lambda: dict.fromkeys(TOTAIS_GRUPO, 0))
+    for i, chave in enumerate(chaves):
+        grupo = grupos[chave]
+        grupo['viagens'] += 1
+        grupo['receita'] += colunas.receita[i]
+        grupo['gasolina'] += colunas.gasolina[i]
+        grupo['diarias'] += colunas.diarias[i]
+        grupo['custos'] += colunas.custos[i]
+        grupo['salarios'] += colunas.salarios[i]
+        grupo['lucro'] += lucro[i]
+        grupo['lucro_liquido'] += lucro_liquido[i]
+    return dict(grupos)
+
+
+def carregar_periodo(data_inicio, data_fim, relatorios=None):
+    """Carrega as viagens do período em colunas, com custos gerais e salários rateados.
+
+    relatorios pode ser a lista (values()) já carregada pela view, com as
+    chaves id, data_viagem, motorista_ref, caminhao_ref, receita_frete,
+    gasto_gasolina e valor_diarias; a ordem das colunas segue a da lista.
+    por_motorista e por_caminhao são indexados pelos ids das dimensões.
+    """
+    if relatorios is None:
+        relatorios = DailyReport.objects.filter(
+            data_viagem__range=[data_inicio, data_fim]
+        ).order_by('data_viagem', 'id').values(
+            'id', 'data_viagem', 'motorista_ref', 'caminhao_ref', 'receita_frete', 'gasto_gasolina', 'valor_diarias'
+        )
+    colunas = ColunasViagens(relatorios)
+    if len(colunas):
+        carregar_custos(colunas, data_inicio, data_fim)
+        ratear_salarios(colunas)
+    return colunas
+
+
+def calcular_periodo(data_inicio, data_fim, relatorios=None, custos_fixos=()):
+    """Lucro do período por viagem, motorista, caminhão e dia, com os custos fixos rateados.
+
+    Os totais são devolvidos em centavos; use dinheiro.reais() para exibir.
+    """
+    colunas = carregar_periodo(data_inicio, data_fim, relatorios)
+    total = agrupar(colunas, [None] * len(colunas)).get(None, dict.fromkeys(TOTAIS_GRUPO, 0))
+    total['custos_fixos_mensais'] = IndiceCustosFixos(custos_fixos).total_periodo(data_inicio, data_fim)
+    total['resultado'] = total['lucro_liquido'] - total['custos_fixos_mensais']
+    return {
+        'viagens': colunas,
+        'lucro_bruto': colunas.lucro_bruto(),
+        'lucro': colunas.lucro(),
+        'lucro_liquido': colunas.lucro_liquido(),
+        'por_motorista': agrupar(colunas, colunas.motoristas),
+        'por_caminhao': agrupar(colunas, colunas.caminhoes),
+        'por_dia': {date.fromordinal(dia): totais for dia, totais in agrupar(colunas, colunas.datas).items()},
+        'total': total,
+    }
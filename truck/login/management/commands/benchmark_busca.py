@@ -0,0 +1,133 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import setup_test_environment, teardown_test_environment
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import django
+import json
+import logging
+import platform
+import random
+import statistics
+import string
+import time
+
+from login import busca
+from login.models import CustosGerais
+from .benchmark_relatorios import _commit_atual
+
+logger = logging.getLogger(__name__)
+
+OFICINAS = [
+    'Auto Peças São José', 'Oficina do João', 'Borracharia Irmãos Araújo', 'Posto Estrela', 'Mecânica Diesel Sul',
+    'Elétrica Automotiva Conceição', 'Concessionária Rodobens', 'Despachante Avenida', 'Autopista Régis Bittencourt',
+]
+DESCRICOES = [
+    'Manutenção preventiva', 'Troca de óleo e filtros', 'Alinhamento e balanceamento', 'Pneus dianteiros',
+    'Revisão dos freios', 'Licenciamento anual', 'Pedágio', 'Estacionamento noturno', 'Multa por excesso de velocidade',
+    'Correia dentada', 'Bateria nova', 'Lavagem completa', 'Embreagem', 'Suspensão traseira',
+]
+
+# Termos medidos: com e sem acento, trecho de placa e um termo curto (sem trigramas)
+TERMOS = ['manutenção', 'manutencao', 'araujo', 'freios', 'régis', 'KX', 'oleo e filtro', 'inexistente']
+
+TAMANHO_LOTE = 5000
+TAMANHO_PAGINA = 20
+
+def _placa(rng):
+    return ''.join(rng.choices(string.ascii_uppercase, k=3)) + '-' + ''.join(rng.choices(string.digits, k=4))
+
+class Command(BaseCommand):
+    help = (
+        'Compara a busca de custos gerais com icontains (varredura) e com o índice de trigramas '
+        '(FTS5 no SQLite, pg_trgm no PostgreSQL) em um banco de teste descartável'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=1_000_000, help='Quantidade de custos gerais sintéticos')
+        parser.add_argument('--repeticoes', type=int, default=5, help='Execuções por termo e estratégia')
+        parser.add_argument('--termos', help='Termos buscados, separados por vírgula')
+        parser.add_argument('--saida', default='benchmark_busca.json', help='Arquivo JSON de resultado')
+        parser.add_argument('--semente', type=int, default=42, help='Semente dos dados sintéticos')
+
+    def handle(self, *args, **options):
+        if options['linhas'] < 1:
+            raise CommandError('--linhas deve ser maior que zero')
+        termos = [t.strip() for t in options['termos'].split(',')] if options['termos'] else TERMOS
+
+        resultado = {
+            'commit': _commit_atual(),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'banco': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'linhas': options['linhas'],
+            'repeticoes': options['repeticoes'],
+            'resultados': {},
+        }
+
+        # Os logs (e o SQL de cada query em DEBUG) distorceriam as medições
+        logging.disable(logging.INFO)
+
+        setup_test_environment()
+        nome_banco = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            inicio = time.monotonic()
+            self._gerar(options['linhas'], random.Random(options['semente']))
+            self.stdout.write(f'{options["linhas"]} custos gerados em {time.monotonic() - inicio:.1f}s')
+            for termo in termos:
+                resultado['resultados'][termo] = medidas = self._medir(termo, options['repeticoes'])
+                self.stdout.write(
+                    f'  {termo!r}: icontains {medidas["icontains"]["ms"]}ms, '
+                    f'índice {medidas["indice"]["ms"]}ms ({medidas["indice"]["encontrados"]} custos)'
+                )
+        finally:
+            connection.creation.destroy_test_db(nome_banco, verbosity=0)
+            teardown_test_environment()
+            logging.disable(logging.NOTSET)
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+        self.stdout.write(self.style.SUCCESS(f'Resultado gravado em {options["saida"]}'))
+        logger.info(f'benchmark_busca: {options["linhas"]} linhas -> {options["saida"]}')
+
+    def _gerar(self, linhas, rng):
+        placas = [_placa(rng) for _ in range(200)]
+        fim = date.today()
+        with transaction.atomic():
+            for inicio in range(0, linhas, TAMANHO_LOTE):
+                custos = [
+                    CustosGerais(
+                        tipo_gasto='manutencao', data=fim - timedelta(days=rng.randrange(1095)),
+                        veiculo_placa=rng.choice(placas), oficina_fornecedor=rng.choice(OFICINAS),
+                        descricao=rng.choice(DESCRICOES), valor=Decimal(rng.randrange(1000, 500000)) / 100,
+                        forma_pagamento='pix', status_pagamento='pago',
+                    )
+                    for _ in range(min(TAMANHO_LOTE, linhas - inicio))
+                ]
+                # bulk_create não dispara o pre_save que preenche o texto da busca
+                busca.preencher_texto(custos)
+                CustosGerais.objects.bulk_create(custos)
+
+    def _medir(self, termo, repeticoes):
+        estrategias = {
+            'icontains': lambda: CustosGerais.objects.filter(
+                Q(oficina_fornecedor__icontains=termo) | Q(descricao__icontains=termo) |
+                Q(veiculo_placa__icontains=termo)
+            ),
+            'indice': lambda: busca.filtrar_custos(CustosGerais.objects.all(), termo),
+        }
+        medidas = {}
+        for nome, consulta in estrategias.items():
+            tempos = []
+            for _ in range(max(1, repeticoes)):
+                inicio = time.perf_counter()
+                # O que a listagem faz: contagem para o paginador e a primeira página
+                encontrados = consulta().count()
+                list(consulta().order_by('-data', '-created_at')[:TAMANHO_PAGINA])
+                tempos.append(time.perf_counter() - inicio)
+            medidas[nome] = {'ms': round(statistics.median(tempos) * 1000, 2), 'encontrados': encontrados}
+        return medidas
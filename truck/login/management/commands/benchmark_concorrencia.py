@@ -0,0 +1,209 @@
+from asgiref.sync import ThreadSensitiveContext
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import asyncio
+import django
+import json
+import logging
+import platform
+import queue
+import statistics
+import time
+
+from login import frota
+from login.models import DailyReport
+from .benchmark_relatorios import _commit_atual
+
+logger = logging.getLogger(__name__)
+
+def _mes(hoje, i):
+    """Um dos 12 meses anteriores, variando com o número da requisição"""
+    referencia = hoje.replace(day=1)
+    for _ in range(1 + i % 12):
+        referencia = (referencia - timedelta(days=1)).replace(day=1)
+    return referencia.strftime('%Y-%m')
+
+# Nome -> função que faz a requisição i (client, data de referência, i, ids de viagens).
+# Períodos, meses e viagens variam com i para que o cache de relatórios não responda tudo.
+# Serve para Client e AsyncClient: com o AsyncClient a função retorna uma corrotina.
+ENDPOINTS = {
+    'listar_relatorios': lambda client, hoje, i, ids: client.get(
+        reverse('listar_relatorios'), {'limite': 50, 'data_fim': (hoje - timedelta(days=i % 90)).isoformat()},
+        secure=True
+    ),
+    'buscar_relatorios_periodo': lambda client, hoje, i, ids: client.post(
+        reverse('buscar_relatorios_periodo'),
+        json.dumps({
+            'data_inicio': (hoje - timedelta(days=29 + i % 90)).isoformat(),
+            'data_fim': (hoje - timedelta(days=i % 90)).isoformat(),
+        }),
+        content_type='application/json', secure=True
+    ),
+    'buscar_relatorios_mes': lambda client, hoje, i, ids: client.get(
+        reverse('buscar_relatorios_mes'), {'ano_mes': _mes(hoje, i)}, secure=True
+    ),
+    'buscar_detalhes_viagem': lambda client, hoje, i, ids: client.get(
+        reverse('buscar_detalhes_viagem', args=[ids[i % len(ids)]]), secure=True
+    ),
+}
+
+def _atraso(segundos):
+    """execute_wrapper que simula a latência de rede de um banco remoto"""
+    def executar(execute, sql, params, many, context):
+        time.sleep(segundos)
+        return execute(sql, params, many, context)
+    return executar
+
+def _medidas(duracoes, status, decorrido):
+    duracoes = sorted(duracoes)
+    return {
+        'req_s': round(len(duracoes) / decorrido, 1),
+        'p50_ms': round(statistics.median(duracoes) * 1000, 2),
+        'p95_ms': round(duracoes[int(len(duracoes) * 0.95) - 1] * 1000, 2),
+        'erros': sum(1 for s in status if s != 200),
+    }
+
+class Command(BaseCommand):
+    help = (
+        'Compara a vazão das APIs JSON de relatórios (views assíncronas) servidas pelo handler WSGI '
+        '(uma thread por requisição, como o gunicorn com threads) e pelo handler ASGI (event loop, '
+        'como o worker do uvicorn) sob carga concorrente, em um banco de teste descartável'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--viagens', type=int, default=5000, help='Quantidade de viagens sintéticas')
+        parser.add_argument('--concorrencia', type=int, default=20, help='Requisições simultâneas')
+        parser.add_argument('--requisicoes', type=int, default=200, help='Requisições por endpoint e handler')
+        parser.add_argument(
+            '--latencia-ms', type=float, default=0,
+            help='Latência simulada por query (banco remoto); com 0 só o custo de CPU é medido'
+        )
+        parser.add_argument('--saida', default='benchmark_concorrencia.json', help='Arquivo JSON de resultado')
+        parser.add_argument('--endpoints', help='Limitar aos endpoints informados, separados por vírgula')
+
+    def handle(self, *args, **options):
+        if options['concorrencia'] < 1 or options['requisicoes'] < 1:
+            raise CommandError('--concorrencia e --requisicoes devem ser maiores que zero')
+        endpoints = ENDPOINTS
+        if options['endpoints']:
+            nomes = [n.strip() for n in options['endpoints'].split(',')]
+            desconhecidos = set(nomes) - set(ENDPOINTS)
+            if desconhecidos:
+                raise CommandError(f'Endpoints desconhecidos: {", ".join(sorted(desconhecidos))}')
+            endpoints = {nome: ENDPOINTS[nome] for nome in nomes}
+
+        resultado = {
+            'commit': _commit_atual(),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'banco': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'viagens': options['viagens'],
+            'concorrencia': options['concorrencia'],
+            'requisicoes': options['requisicoes'],
+            'latencia_ms': options['latencia_ms'],
+            'resultados': {},
+        }
+
+        # Os logs das views (e o SQL de cada query em DEBUG) distorceriam as medições
+        logging.disable(logging.INFO)
+
+        setup_test_environment()
+        nome_banco = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        atraso = _atraso(options['latencia_ms'] / 1000) if options['latencia_ms'] > 0 else None
+        try:
+            frota.gerar_frota(viagens=options['viagens'], caminhoes=max(5, options['viagens'] // 2000),
+                              motoristas=max(8, options['viagens'] // 1500))
+            usuario = User.objects.create_user(username='benchmark', password=None)
+            ids = list(DailyReport.objects.values_list('id', flat=True))
+            hoje = date.today()
+
+            # Cada thread abre a sua conexão: o atraso entra em todas pelo connection_created
+            if atraso:
+                connection.execute_wrappers.append(atraso)
+                connection_created.connect(self._instalar_atraso(atraso), weak=False, dispatch_uid='benchmark_atraso')
+
+            for nome, requisicao in endpoints.items():
+                cache.clear()
+                wsgi = self._medir_wsgi(requisicao, usuario, hoje, ids, options)
+                cache.clear()
+                asgi = asyncio.run(self._medir_asgi(requisicao, usuario, hoje, ids, options))
+                resultado['resultados'][nome] = {'wsgi': wsgi, 'asgi': asgi}
+                self.stdout.write(
+                    f'  {nome}: WSGI {wsgi["req_s"]} req/s (p95 {wsgi["p95_ms"]}ms), '
+                    f'ASGI {asgi["req_s"]} req/s (p95 {asgi["p95_ms"]}ms)'
+                )
+        finally:
+            connection_created.disconnect(dispatch_uid='benchmark_atraso')
+            if atraso in connection.execute_wrappers:
+                connection.execute_wrappers.remove(atraso)
+            connection.creation.destroy_test_db(nome_banco, verbosity=0)
+            teardown_test_environment()
+            logging.disable(logging.NOTSET)
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+        self.stdout.write(self.style.SUCCESS(f'Resultado gravado em {options["saida"]}'))
+        logger.info(f'benchmark_concorrencia: {list(endpoints)} -> {options["saida"]}')
+
+    def _instalar_atraso(self, atraso):
+        def receiver(sender, connection, **kwargs):
+            connection.execute_wrappers.append(atraso)
+        return receiver
+
+    def _medir_wsgi(self, requisicao, usuario, hoje, ids, options):
+        """Requisições simultâneas pelo handler síncrono, uma thread por requisição em andamento"""
+        clientes = queue.Queue()
+        for _ in range(options['concorrencia']):
+            client = Client()
+            client.force_login(usuario)
+            clientes.put(client)
+
+        def executar(i):
+            client = clientes.get()
+            try:
+                inicio = time.perf_counter()
+                response = requisicao(client, hoje, i, ids)
+                return response.status_code, time.perf_counter() - inicio
+            finally:
+                clientes.put(client)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concorrencia']) as executor:
+            respostas = list(executor.map(executar, range(options['requisicoes'])))
+        decorrido = time.perf_counter() - inicio
+        return _medidas([d for _, d in respostas], [s for s, _ in respostas], decorrido)
+
+    async def _medir_asgi(self, requisicao, usuario, hoje, ids, options):
+        """Requisições simultâneas pelo handler assíncrono, todas no mesmo event loop"""
+        clientes = asyncio.Queue()
+        for _ in range(options['concorrencia']):
+            client = AsyncClient()
+            await client.aforce_login(usuario)
+            clientes.put_nowait(client)
+
+        async def executar(i):
+            client = await clientes.get()
+            try:
+                # Como o ASGIHandler: o código síncrono de cada requisição roda na sua própria thread
+                async with ThreadSensitiveContext():
+                    inicio = time.perf_counter()
+                    response = await requisicao(client, hoje, i, ids)
+                    return response.status_code, time.perf_counter() - inicio
+            finally:
+                clientes.put_nowait(client)
+
+        inicio = time.perf_counter()
+        respostas = await asyncio.gather(*(executar(i) for i in range(options['requisicoes'])))
+        decorrido = time.perf_counter() - inicio
+        return _medidas([d for _, d in respostas], [s for s, _ in respostas], decorrido)
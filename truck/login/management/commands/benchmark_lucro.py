@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from datetime import datetime
+from decimal import Decimal
+import logging
+import time
+
+from login import dinheiro, lucro
+from login.models import DailyReport, CustosGerais
+
+logger = logging.getLogger(__name__)
+
+def lucro_em_loop(data_inicio, data_fim):
+    """Cálculo anterior ao motor de lucro: laço em float com uma query de custos por viagem"""
+    total = 0.0
+    for relatorio in DailyReport.objects.filter(data_viagem__range=[data_inicio, data_fim]):
+        custos = CustosGerais.objects.filter(relatorio_id=relatorio.id).aggregate(Sum('valor'))['valor__sum'] or Decimal('0')
+        total += (
+            float(relatorio.receita_frete) - float(relatorio.valor_diarias)
+            - float(relatorio.gasto_gasolina) - float(custos)
+        )
+    return total
+
+class Command(BaseCommand):
+    help = 'Compara o tempo do motor de lucro (colunas em centavos) com o laço em float anterior'
+
+    def add_arguments(self, parser):
+        parser.add_argument('data_inicio', help='YYYY-MM-DD')
+        parser.add_argument('data_fim', help='YYYY-MM-DD')
+        parser.add_argument('--repeticoes', type=int, default=3)
+
+    def _medir(self, funcao, repeticoes):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resultado = funcao()
+            tempos.append(time.perf_counter() - inicio)
+        return resultado, min(tempos)
+
+    def handle(self, *args, **options):
+        try:
+            data_inicio = datetime.strptime(options['data_inicio'], '%Y-%m-%d').date()
+            data_fim = datetime.strptime(options['data_fim'], '%Y-%m-%d').date()
+        except ValueError as e:
+            raise CommandError(f'Data inválida: {e}')
+        repeticoes = max(1, options['repeticoes'])
+
+        total_loop, tempo_loop = self._medir(lambda: lucro_em_loop(data_inicio, data_fim), repeticoes)
+        periodo, tempo_motor = self._medir(lambda: lucro.calcular_periodo(data_inicio, data_fim), repeticoes)
+        total_motor = dinheiro.reais(periodo['total']['lucro'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Viagens: {len(periodo["viagens"])}\n'
+                f'Laço em float: {tempo_loop:.3f}s (lucro {total_loop:.2f})\n'
+                f'Motor de lucro: {tempo_motor:.3f}s (lucro {total_motor})\n'
+                f'Ganho: {tempo_loop / tempo_motor if tempo_motor else 0:.1f}x\n'
+                f'Diferença do float: {Decimal(repr(total_loop)) - total_motor:.6f}'
+            )
+        )
+        logger.info(f'benchmark_lucro: loop {tempo_loop:.3f}s, motor {tempo_motor:.3f}s')
@@ -0,0 +1,157 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from datetime import date, datetime, timedelta
+import django
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import time
+
+from login import frota
+from login.middleware import _ColetorQueries
+from login.models import (
+    DailyReport, CustosGerais, CustoFixoMensal, MotoristaSalario, MonthlyCost, ResumoDiario, ResumoMensal
+)
+
+logger = logging.getLogger(__name__)
+
+def _mes_anterior(referencia):
+    return (referencia.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+
+# Nome -> função que faz a requisição (client, data de referência)
+ENDPOINTS = {
+    'listar_relatorios': lambda client, hoje: client.get(
+        reverse('listar_relatorios'), {'limite': 200}, secure=True
+    ),
+    'buscar_relatorios_periodo': lambda client, hoje: client.post(
+        reverse('buscar_relatorios_periodo'),
+        json.dumps({'data_inicio': (hoje - timedelta(days=29)).isoformat(), 'data_fim': hoje.isoformat()}),
+        content_type='application/json', secure=True
+    ),
+    'buscar_relatorios_mes': lambda client, hoje: client.post(
+        reverse('buscar_relatorios_mes'), json.dumps({'ano_mes': _mes_anterior(hoje)}),
+        content_type='application/json', secure=True
+    ),
+    'relatorio_mensal': lambda client, hoje: client.get(
+        reverse('relatorio_mensal'), {'ano_mes': _mes_anterior(hoje)}, secure=True
+    ),
+    'relatorio_semanal': lambda client, hoje: client.get(
+        reverse('relatorio_semanal'),
+        {'data_inicio': (hoje - timedelta(days=6)).isoformat(), 'data_fim': hoje.isoformat()}, secure=True
+    ),
+    'dashboard': lambda client, hoje: client.get(reverse('dashboard'), secure=True),
+}
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Command(BaseCommand):
+    help = (
+        'Mede o tempo e as queries dos relatórios e APIs com 1k/10k/100k viagens sintéticas '
+        '(em um banco de teste descartável) e grava o resultado em JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', default='1000,10000,100000', help='Quantidades de viagens, separadas por vírgula')
+        parser.add_argument('--repeticoes', type=int, default=5, help='Requisições com cache quente por endpoint')
+        parser.add_argument('--saida', default='benchmark_relatorios.json', help='Arquivo JSON de resultado')
+        parser.add_argument('--endpoints', help='Limitar aos endpoints informados, separados por vírgula')
+
+    def handle(self, *args, **options):
+        try:
+            tamanhos = [int(t) for t in options['tamanhos'].split(',') if t.strip()]
+        except ValueError:
+            raise CommandError('--tamanhos deve ser uma lista de inteiros')
+        endpoints = ENDPOINTS
+        if options['endpoints']:
+            nomes = [n.strip() for n in options['endpoints'].split(',')]
+            desconhecidos = set(nomes) - set(ENDPOINTS)
+            if desconhecidos:
+                raise CommandError(f'Endpoints desconhecidos: {", ".join(sorted(desconhecidos))}')
+            endpoints = {nome: ENDPOINTS[nome] for nome in nomes}
+
+        resultado = {
+            'commit': _commit_atual(),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'banco': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repeticoes': options['repeticoes'],
+            'resultados': {},
+        }
+
+        # Os logs das views (e o SQL de cada query em DEBUG) distorceriam as medições
+        logging.disable(logging.INFO)
+
+        setup_test_environment()
+        nome_banco = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for tamanho in tamanhos:
+                resultado['resultados'][str(tamanho)] = self._medir_tamanho(tamanho, endpoints, options['repeticoes'])
+        finally:
+            connection.creation.destroy_test_db(nome_banco, verbosity=0)
+            teardown_test_environment()
+            logging.disable(logging.NOTSET)
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+        self.stdout.write(self.style.SUCCESS(f'Resultado gravado em {options["saida"]}'))
+        logger.info(f'benchmark_relatorios: {tamanhos} -> {options["saida"]}')
+
+    def _medir_tamanho(self, tamanho, endpoints, repeticoes):
+        for modelo in (CustosGerais, DailyReport, CustoFixoMensal, MotoristaSalario, MonthlyCost,
+                       ResumoDiario, ResumoMensal, User):
+            modelo.objects.all().delete()
+
+        inicio = time.monotonic()
+        frota.gerar_frota(viagens=tamanho, caminhoes=max(5, tamanho // 2000), motoristas=max(8, tamanho // 1500))
+        self.stdout.write(f'{tamanho} viagens geradas em {time.monotonic() - inicio:.1f}s')
+
+        client = Client()
+        client.force_login(User.objects.create_user(username='benchmark', password=None))
+        hoje = date.today()
+
+        medidas = {}
+        for nome, requisicao in endpoints.items():
+            cache.clear()
+            # Conta pelo execute_wrapper (como o middleware de perfil): connection.queries
+            # é zerado a cada request_started e não é confiável aqui
+            coletor = _ColetorQueries()
+            with connection.execute_wrapper(coletor):
+                inicio = time.perf_counter()
+                response = requisicao(client, hoje)
+                frio = time.perf_counter() - inicio
+
+            quentes = []
+            for _ in range(max(1, repeticoes)):
+                inicio = time.perf_counter()
+                requisicao(client, hoje)
+                quentes.append(time.perf_counter() - inicio)
+
+            medidas[nome] = {
+                'status': response.status_code,
+                'frio_ms': round(frio * 1000, 2),
+                'quente_ms': round(statistics.median(quentes) * 1000, 2),
+                'queries': coletor.total,
+                'db_ms': round(coletor.duracao * 1000, 2),
+                'bytes': len(response.content),
+            }
+            self.stdout.write(
+                f'  {nome}: frio {medidas[nome]["frio_ms"]}ms, quente {medidas[nome]["quente_ms"]}ms, '
+                f'{medidas[nome]["queries"]} queries'
+            )
+        return medidas
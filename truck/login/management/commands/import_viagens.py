@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+import logging
+import time
+
+from login import importacao
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Importa viagens (com salários e custos gerais) de um arquivo CSV ou JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo .csv ou .json')
+        parser.add_argument('--formato', choices=['csv', 'json'], help='Formato do arquivo (padrão: pela extensão)')
+        parser.add_argument('--lote', type=int, default=importacao.TAMANHO_LOTE, help='Linhas validadas e gravadas por lote')
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        formato = options['formato'] or ('json' if caminho.lower().endswith('.json') else 'csv')
+
+        inicio = time.monotonic()
+        try:
+            with open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+                linhas = importacao.ler_json(arquivo.read()) if formato == 'json' else importacao.ler_csv(arquivo)
+                resultado = importacao.importar_viagens(linhas, tamanho_lote=options['lote'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Erro ao ler {caminho}: {e}')
+        duracao = time.monotonic() - inicio
+
+        if resultado['erros']:
+            for erro in resultado['erros'][:50]:
+                self.stderr.write(f"Linha {erro['linha']}: {erro['erro']}")
+            raise CommandError(f"{len(resultado['erros'])} linha(s) inválida(s); nada foi importado")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Importação concluída com sucesso!\n'
+                f'Viagens: {resultado["viagens"]}\n'
+                f'Custos gerais: {resultado["custos"]}\n'
+                f'Salários: {resultado["salarios"]}\n'
+                f'Tempo: {duracao:.2f}s'
+            )
+        )
+        logger.info(f'Importadas {resultado["viagens"]} viagens de {caminho} em {duracao:.2f}s')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+import logging
+
+from login import sincronizacao
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (
+        'Apaga as marcas de exclusão da sincronização mais antigas que SINCRONIZACAO_RETENCAO_DIAS '
+        '(o worker já faz isso periodicamente; use em agendamentos quando não houver worker)'
+    )
+
+    def handle(self, *args, **options):
+        total = sincronizacao.limpar_exclusoes()
+        self.stdout.write(self.style.SUCCESS(f'{total} marcas de exclusão apagadas'))
+        logger.info(f'{total} marcas de exclusão antigas apagadas')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+import logging
+import time
+
+from login import resumos, tarefas
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Reconstrói do zero os resumos diários e mensais (rollups) de viagens e custos gerais'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--em-segundo-plano', action='store_true',
+            help='Enfileira a reconstrução para o worker (manage.py run_worker) em vez de executá-la agora'
+        )
+
+    def handle(self, *args, **options):
+        if options['em_segundo_plano']:
+            job = tarefas.enfileirar('reconstruir_resumos')
+            self.stdout.write(self.style.SUCCESS(f'Reconstrução enfileirada (tarefa #{job.id})'))
+            return
+
+        inicio = time.monotonic()
+        total_dias, total_meses = resumos.reconstruir()
+        duracao = time.monotonic() - inicio
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Resumos reconstruídos com sucesso!\n'
+                f'Linhas diárias: {total_dias}\n'
+                f'Meses: {total_meses}\n'
+                f'Tempo: {duracao:.2f}s'
+            )
+        )
+        logger.info(f'Resumos reconstruídos: {total_dias} linhas diárias, {total_meses} meses em {duracao:.2f}s')
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+from login import sincronizacao, tarefas
+
+logger = logging.getLogger(__name__)
+
+# A cada quantos segundos o worker libera tarefas travadas e apaga as tarefas e marcas de exclusão antigas
+INTERVALO_MANUTENCAO = 60
+
+class Command(BaseCommand):
+    help = (
+        'Processa a fila de tarefas em segundo plano (relatórios mensais, exportações, reconstrução '
+        'dos resumos) enfileiradas pelas views; com --processos, vários workers disputam a mesma fila'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processos', type=int, default=1, help='Quantidade de processos worker')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre consultas à fila vazia')
+        parser.add_argument('--uma-vez', action='store_true', help='Processa as tarefas pendentes e encerra')
+
+    def handle(self, *args, **options):
+        if options['processos'] < 1 or options['intervalo'] <= 0:
+            raise CommandError('--processos e --intervalo devem ser maiores que zero')
+
+        if options['processos'] == 1:
+            processadas = self._trabalhar(options['intervalo'], options['uma_vez'])
+            self.stdout.write(self.style.SUCCESS(f'Worker encerrado: {processadas} tarefas processadas'))
+            return
+
+        # Os processos filhos abrem as suas próprias conexões (uma conexão não pode ser compartilhada)
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork')
+        processos = [
+            contexto.Process(target=self._trabalhar, args=(options['intervalo'], options['uma_vez']),
+                             name=f'run_worker-{i + 1}')
+            for i in range(options['processos'])
+        ]
+        for processo in processos:
+            processo.start()
+
+        def repassar(signum, frame):
+            for processo in processos:
+                if processo.is_alive():
+                    os.kill(processo.pid, signal.SIGTERM)
+
+        anteriores = {sinal: signal.signal(sinal, repassar) for sinal in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            for processo in processos:
+                processo.join()
+        finally:
+            for sinal, anterior in anteriores.items():
+                signal.signal(sinal, anterior)
+        self.stdout.write(self.style.SUCCESS(f'{len(processos)} workers encerrados'))
+
+    def _trabalhar(self, intervalo, uma_vez):
+        """Laço do worker: reserva e executa tarefas até receber SIGTERM/SIGINT (ou a fila esvaziar)"""
+        parar = threading.Event()
+
+        def encerrar(signum, frame):
+            # Termina a tarefa em andamento antes de sair
+            logger.info(f'Worker {os.getpid()}: sinal {signum} recebido, encerrando')
+            parar.set()
+
+        anteriores = {sinal: signal.signal(sinal, encerrar) for sinal in (signal.SIGTERM, signal.SIGINT)}
+        logger.info(f'Worker {os.getpid()} iniciado')
+        processadas = 0
+        proxima_manutencao = 0
+        try:
+            while not parar.is_set():
+                # Como no ciclo de uma requisição: descarta conexões velhas ou quebradas
+                close_old_connections()
+                if time.monotonic() >= proxima_manutencao:
+                    tarefas.liberar_travadas()
+                    tarefas.limpar_antigas()
+                    sincronizacao.limpar_exclusoes()
+                    proxima_manutencao = time.monotonic() + INTERVALO_MANUTENCAO
+
+                job = tarefas.processar_proxima()
+                if job is not None:
+                    processadas += 1
+                elif uma_vez:
+                    break
+                else:
+                    parar.wait(intervalo)
+        finally:
+            for sinal, anterior in anteriores.items():
+                signal.signal(sinal, anterior)
+            close_old_connections()
+        logger.info(f'Worker {os.getpid()} encerrado: {processadas} tarefas processadas')
+        return processadas
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+import logging
+import time
+
+from login import frota
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Gera dados sintéticos da frota (viagens, custos gerais, custos fixos e salários)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--viagens', type=int, default=1000, help='Quantidade de viagens')
+        parser.add_argument('--caminhoes', type=int, default=10)
+        parser.add_argument('--motoristas', type=int, default=15)
+        parser.add_argument('--anos', type=float, default=2, help='Anos de histórico (terminando hoje)')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do gerador aleatório')
+        parser.add_argument('--forcar', action='store_true', help='Permite rodar com DEBUG=False')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['forcar']:
+            raise CommandError('DEBUG=False: use --forcar para gerar dados sintéticos neste banco')
+        if options['viagens'] < 0 or options['caminhoes'] < 1 or options['motoristas'] < 1:
+            raise CommandError('Informe ao menos 1 caminhão e 1 motorista')
+
+        inicio = time.monotonic()
+        criados = frota.gerar_frota(
+            viagens=options['viagens'],
+            caminhoes=options['caminhoes'],
+            motoristas=options['motoristas'],
+            anos=options['anos'],
+            semente=options['semente'],
+        )
+        duracao = time.monotonic() - inicio
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Dados sintéticos gerados com sucesso!\n'
+                f'Viagens: {criados["viagens"]}\n'
+                f'Custos gerais: {criados["custos_gerais"]}\n'
+                f'Custos fixos: {criados["custos_fixos"]}\n'
+                f'Salários: {criados["salarios"]}\n'
+                f'Tempo: {duracao:.2f}s'
+            )
+        )
+        logger.info(f'seed_fleet: {criados} em {duracao:.2f}s')
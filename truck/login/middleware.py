@@ -0,0 +1,169 @@
+"""Middleware opcional de perfil das requisições.
+
+Ativado com PERFIL_REQUISICOES=True (variável de ambiente de mesmo nome).
+Para cada requisição mede o tempo total, o tempo e a quantidade de queries,
+queries repetidas (assinatura de N+1) e o tamanho da resposta; envia o
+cabeçalho Server-Timing e registra no log um resumo por view a cada
+PERFIL_INTERVALO_RESUMO segundos. O custo é um wrapper em volta de cada
+query, então pode ficar ligado em produção.
+
+Funciona nos dois modos (WSGI e ASGI). No modo assíncrono as queries do ORM
+rodam na thread do sync_to_async da requisição, não na do event loop, então o
+wrapper é instalado e removido nessa thread.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Listas de parâmetros (IN (%s, %s, ...)) viram um único marcador na assinatura
+_LISTA_PARAMETROS = re.compile(r'(%s|\?)(\s*,\s*(%s|\?))+')
+
+
+def assinatura_sql(sql):
+    """Assinatura de uma query: o SQL sem variação de tamanho das listas de parâmetros"""
+    return _LISTA_PARAMETROS.sub('%s, ...', sql)
+
+
+class _ColetorQueries:
+    """execute_wrapper que conta as queries, o tempo gasto e as assinaturas repetidas"""
+
+    def __init__(self):
+        self.total = 0
+        self.duracao = 0.0
+        self.assinaturas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duracao += time.perf_counter() - inicio
+            self.total += 1
+            self.assinaturas[sql] += 1
+
+    def repetidas(self, limite):
+        """Queries executadas pelo menos `limite` vezes (por assinatura)"""
+        contagem = Counter()
+        for sql, vezes in self.assinaturas.items():
+            contagem[assinatura_sql(sql)] += vezes
+        return [(sql, vezes) for sql, vezes in contagem.most_common() if vezes >= limite]
+
+
+class _Estatisticas:
+    """Acumula os números por view e gera a linha de resumo periódica"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inicio = time.monotonic()
+        self.views = defaultdict(lambda: {'requisicoes': 0, 'tempo': 0.0, 'tempo_max': 0.0, 'db': 0.0, 'queries': 0})
+
+    def registrar(self, view, tempo, db, queries):
+        with self.lock:
+            dados = self.views[view]
+            dados['requisicoes'] += 1
+            dados['tempo'] += tempo
+            dados['tempo_max'] = max(dados['tempo_max'], tempo)
+            dados['db'] += db
+            dados['queries'] += queries
+
+    def coletar_resumo(self, intervalo):
+        """Devolve e zera os números se o intervalo já passou; senão None"""
+        with self.lock:
+            if time.monotonic() - self.inicio < intervalo or not self.views:
+                return None
+            views, self.views = self.views, defaultdict(self.views.default_factory)
+            self.inicio = time.monotonic()
+        return views
+
+
+estatisticas = _Estatisticas()
+
+
+class PerfilRequisicoesMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFIL_REQUISICOES', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limite_repeticoes = getattr(settings, 'PERFIL_LIMITE_REPETICOES', 5)
+        self.intervalo_resumo = getattr(settings, 'PERFIL_INTERVALO_RESUMO', 60)
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        coletor = _ColetorQueries()
+        inicio = time.perf_counter()
+        with self._instalar_coletor(coletor):
+            response = self.get_response(request)
+        return self._registrar(request, response, coletor, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        coletor = _ColetorQueries()
+        inicio = time.perf_counter()
+        pilha = await sync_to_async(self._instalar_coletor)(coletor)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(pilha.close)()
+        return self._registrar(request, response, coletor, time.perf_counter() - inicio)
+
+    @staticmethod
+    def _instalar_coletor(coletor):
+        """Instala o coletor em todas as conexões da thread atual; fechar a pilha o remove"""
+        pilha = ExitStack()
+        for conexao in connections.all():
+            pilha.enter_context(conexao.execute_wrapper(coletor))
+        return pilha
+
+    def _registrar(self, request, response, coletor, tempo):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else request.path
+        tamanho = None if response.streaming else len(response.content)
+
+        response['Server-Timing'] = (
+            f'total;dur={tempo * 1000:.1f}, '
+            f'db;dur={coletor.duracao * 1000:.1f};desc="{coletor.total} queries"'
+        )
+
+        repetidas = coletor.repetidas(self.limite_repeticoes)
+        if repetidas:
+            sql, vezes = repetidas[0]
+            logger.warning(f'Possível N+1 em {view}: {vezes}x {sql[:200]}')
+
+        logger.debug(
+            f'{view} {response.status_code} {tempo * 1000:.1f}ms '
+            f'db={coletor.duracao * 1000:.1f}ms queries={coletor.total} bytes={tamanho}'
+        )
+
+        estatisticas.registrar(view, tempo, coletor.duracao, coletor.total)
+        self._registrar_resumo()
+        return response
+
+    def _registrar_resumo(self):
+        views = estatisticas.coletar_resumo(self.intervalo_resumo)
+        if not views:
+            return
+        partes = []
+        for view, dados in sorted(views.items(), key=lambda item: -item[1]['tempo']):
+            n = dados['requisicoes']
+            partes.append(
+                f"{view} n={n} media={dados['tempo'] / n * 1000:.1f}ms "
+                f"max={dados['tempo_max'] * 1000:.1f}ms db={dados['db'] / n * 1000:.1f}ms "
+                f"queries={dados['queries'] / n:.1f}"
+            )
+        logger.info('Resumo de desempenho: ' + ' | '.join(partes))
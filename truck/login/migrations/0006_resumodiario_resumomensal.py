@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:41
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0005_alter_custofixomensal_tipo_custo_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimensao', models.CharField(choices=[('geral', 'Geral'), ('motorista', 'Motorista'), ('caminhao', 'Caminhão')], max_length=10, verbose_name='Dimensão')),
+                ('chave', models.CharField(blank=True, default='', max_length=100, verbose_name='Chave')),
+                ('total_viagens', models.PositiveIntegerField(default=0, verbose_name='Total de Viagens')),
+                ('total_diarias', models.PositiveIntegerField(default=0, verbose_name='Total de Diárias')),
+                ('total_valor_diarias', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Valor das Diárias')),
+                ('total_litros', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Total de Litros')),
+                ('total_gasto_gasolina', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Gasto com Gasolina')),
+                ('total_receita_frete', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Receita do Frete')),
+                ('total_custos_gerais', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Custos Gerais')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('data', models.DateField(verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário',
+                'verbose_name_plural': 'Resumos Diários',
+                'ordering': ['-data', 'dimensao', 'chave'],
+                'unique_together': {('data', 'dimensao', 'chave')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimensao', models.CharField(choices=[('geral', 'Geral'), ('motorista', 'Motorista'), ('caminhao', 'Caminhão')], max_length=10, verbose_name='Dimensão')),
+                ('chave', models.CharField(blank=True, default='', max_length=100, verbose_name='Chave')),
+                ('total_viagens', models.PositiveIntegerField(default=0, verbose_name='Total de Viagens')),
+                ('total_diarias', models.PositiveIntegerField(default=0, verbose_name='Total de Diárias')),
+                ('total_valor_diarias', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Valor das Diárias')),
+                ('total_litros', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Total de Litros')),
+                ('total_gasto_gasolina', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Gasto com Gasolina')),
+                ('total_receita_frete', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Receita do Frete')),
+                ('total_custos_gerais', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Custos Gerais')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('ano_mes', models.CharField(max_length=7, verbose_name='Ano-Mês (YYYY-MM)')),
+            ],
+            options={
+                'verbose_name': 'Resumo Mensal',
+                'verbose_name_plural': 'Resumos Mensais',
+                'ordering': ['-ano_mes', 'dimensao', 'chave'],
+                'unique_together': {('ano_mes', 'dimensao', 'chave')},
+            },
+        ),
+    ]
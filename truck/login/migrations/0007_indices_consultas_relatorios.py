@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0006_resumodiario_resumomensal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='custofixomensal',
+            index=models.Index(fields=['status', 'data_inicio', 'data_fim'], name='custofixo_vigencia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='custosgerais',
+            index=models.Index(fields=['data', 'created_at'], name='custosgerais_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='custosgerais',
+            index=models.Index(fields=['data', 'status_pagamento', 'valor'], name='custosgerais_valor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='custosgerais',
+            index=models.Index(fields=['relatorio', 'data'], name='custosgerais_relatorio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['data_viagem', 'created_at', 'id'], name='dailyreport_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['motorista', 'data_viagem'], name='dailyreport_motorista_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['caminhao', 'data_viagem'], name='dailyreport_caminhao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='motoristasalario',
+            index=models.Index(fields=['ano_mes'], name='salario_ano_mes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resumodiario',
+            index=models.Index(fields=['dimensao', 'data'], name='resumodiario_dimensao_idx'),
+        ),
+    ]
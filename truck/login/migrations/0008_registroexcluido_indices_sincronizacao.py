@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0007_indices_consultas_relatorios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroExcluido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('relatorio', 'Relatório Diário'), ('custo_geral', 'Custo Geral'), ('custo_fixo', 'Custo Fixo Mensal')], max_length=20, verbose_name='Modelo')),
+                ('objeto_id', models.BigIntegerField(verbose_name='ID do Registro')),
+                ('excluido_em', models.DateTimeField(auto_now_add=True, verbose_name='Excluído em')),
+            ],
+            options={
+                'verbose_name': 'Registro Excluído',
+                'verbose_name_plural': 'Registros Excluídos',
+                'ordering': ['excluido_em'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='custofixomensal',
+            index=models.Index(fields=['updated_at'], name='custofixo_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='custosgerais',
+            index=models.Index(fields=['updated_at'], name='custosgerais_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['updated_at'], name='dailyreport_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroexcluido',
+            index=models.Index(fields=['excluido_em'], name='registroexcluido_data_idx'),
+        ),
+    ]
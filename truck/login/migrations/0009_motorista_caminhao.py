@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0008_registroexcluido_indices_sincronizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Caminhao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identificacao', models.CharField(max_length=50, verbose_name='Placa/Identificação')),
+                ('chave', models.CharField(max_length=50, unique=True, verbose_name='Chave')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Caminhão',
+                'verbose_name_plural': 'Caminhões',
+                'ordering': ['identificacao'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Motorista',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('chave', models.CharField(max_length=100, unique=True, verbose_name='Chave')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Motorista',
+                'verbose_name_plural': 'Motoristas',
+                'ordering': ['nome'],
+            },
+        ),
+        migrations.AddField(
+            model_name='custosgerais',
+            name='caminhao_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='custos_gerais', to='login.caminhao', verbose_name='Caminhão (cadastro)'),
+        ),
+        migrations.AddField(
+            model_name='dailyreport',
+            name='caminhao_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='viagens', to='login.caminhao', verbose_name='Caminhão (cadastro)'),
+        ),
+        migrations.AddIndex(
+            model_name='custosgerais',
+            index=models.Index(fields=['caminhao_ref', 'data'], name='custosgerais_caminhao_ref_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyreport',
+            name='motorista_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='viagens', to='login.motorista', verbose_name='Motorista (cadastro)'),
+        ),
+        migrations.AddField(
+            model_name='motoristasalario',
+            name='motorista_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='salarios', to='login.motorista', verbose_name='Motorista (cadastro)'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['motorista_ref', 'data_viagem'], name='dailyreport_motorista_ref_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['caminhao_ref', 'data_viagem'], name='dailyreport_caminhao_ref_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='motoristasalario',
+            index=models.Index(fields=['motorista_ref', 'ano_mes'], name='salario_motorista_ref_idx'),
+        ),
+    ]
@@ -0,0 +1,135 @@
+"""Cria os motoristas e caminhões a partir dos textos já gravados e liga os registros a eles.
+
+As funções de chave são cópias das de login/dimensoes.py: a migração não
+pode depender do código atual do app.
+"""
+import re
+from collections import Counter, defaultdict
+
+from django.db import migrations
+from django.db.models import Count
+
+_SEPARADORES_PLACA = re.compile(r'[\s\-.]')
+
+CAMPOS_TOTAIS = [
+    'total_viagens', 'total_diarias', 'total_valor_diarias', 'total_litros',
+    'total_gasto_gasolina', 'total_receita_frete', 'total_custos_gerais',
+]
+
+
+def _nome_canonico(texto):
+    return ' '.join((texto or '').split())
+
+
+def _chave_motorista(nome):
+    return _nome_canonico(nome).casefold()
+
+
+def _chave_caminhao(identificacao):
+    return _SEPARADORES_PLACA.sub('', identificacao or '').upper()
+
+
+def _contar(consulta, campo, contagem):
+    for linha in consulta.order_by().values(campo).annotate(total=Count('id')):
+        contagem[_nome_canonico(linha[campo])] += linha['total']
+
+
+def _criar_dimensao(modelo, campo, chave, contagem):
+    """Cria uma linha por chave com a grafia mais usada; devolve {chave: instância}"""
+    grafias = defaultdict(list)
+    for texto, total in contagem.items():
+        if chave(texto):
+            grafias[chave(texto)].append((-total, texto))
+    modelo.objects.bulk_create(
+        [modelo(chave=c, **{campo: min(opcoes)[1]}) for c, opcoes in grafias.items()],
+        batch_size=1000
+    )
+    return {item.chave: item for item in modelo.objects.all()}
+
+
+def _ligar(consulta, campo_texto, campo_ref, chave, dimensoes, campo_dimensao, tamanho):
+    """Aponta os registros para a dimensão e troca o texto pela grafia canônica"""
+    textos = consulta.order_by().values_list(campo_texto, flat=True).distinct()
+    for texto in list(textos):
+        dimensao = dimensoes.get(chave(texto))
+        if dimensao:
+            consulta.filter(**{campo_texto: texto}).update(**{
+                campo_ref: dimensao,
+                campo_texto: getattr(dimensao, campo_dimensao)[:tamanho],
+            })
+
+
+def _juntar_salarios(MotoristaSalario):
+    """Mantém só o salário alterado por último quando duas grafias caem no mesmo motorista e mês"""
+    por_chave = defaultdict(list)
+    for salario in MotoristaSalario.objects.order_by('-updated_at', '-id').only('id', 'motorista', 'ano_mes'):
+        por_chave[(_chave_motorista(salario.motorista), salario.ano_mes)].append(salario.id)
+    repetidos = [i for ids in por_chave.values() for i in ids[1:]]
+    if repetidos:
+        MotoristaSalario.objects.filter(id__in=repetidos).delete()
+
+
+def _rechavear_resumos(modelo, campo_periodo, motoristas, caminhoes):
+    """Troca a chave dos resumos por motorista/caminhão pela grafia canônica, somando os repetidos"""
+    grupos = defaultdict(list)
+    for resumo in modelo.objects.filter(dimensao__in=['motorista', 'caminhao']).order_by('id'):
+        if resumo.dimensao == 'motorista':
+            dimensao = motoristas.get(_chave_motorista(resumo.chave))
+            chave = dimensao.nome if dimensao else resumo.chave
+        else:
+            dimensao = caminhoes.get(_chave_caminhao(resumo.chave))
+            chave = dimensao.identificacao if dimensao else resumo.chave
+        grupos[(getattr(resumo, campo_periodo), resumo.dimensao, chave)].append(resumo)
+
+    for (_, _, chave), resumos in grupos.items():
+        principal, repetidos = resumos[0], resumos[1:]
+        if not repetidos and principal.chave == chave:
+            continue
+        for resumo in repetidos:
+            for campo in CAMPOS_TOTAIS:
+                setattr(principal, campo, getattr(principal, campo) + getattr(resumo, campo))
+        # Apaga antes de gravar para não violar unique_together com a chave nova
+        modelo.objects.filter(id__in=[resumo.id for resumo in repetidos]).delete()
+        principal.chave = chave
+        principal.save()
+
+
+def preencher(apps, schema_editor):
+    DailyReport = apps.get_model('login', 'DailyReport')
+    MotoristaSalario = apps.get_model('login', 'MotoristaSalario')
+    CustosGerais = apps.get_model('login', 'CustosGerais')
+    Motorista = apps.get_model('login', 'Motorista')
+    Caminhao = apps.get_model('login', 'Caminhao')
+    ResumoDiario = apps.get_model('login', 'ResumoDiario')
+    ResumoMensal = apps.get_model('login', 'ResumoMensal')
+
+    nomes = Counter()
+    _contar(DailyReport.objects.all(), 'motorista', nomes)
+    _contar(MotoristaSalario.objects.all(), 'motorista', nomes)
+    motoristas = _criar_dimensao(Motorista, 'nome', _chave_motorista, nomes)
+
+    placas = Counter()
+    _contar(DailyReport.objects.all(), 'caminhao', placas)
+    _contar(CustosGerais.objects.all(), 'veiculo_placa', placas)
+    caminhoes = _criar_dimensao(Caminhao, 'identificacao', _chave_caminhao, placas)
+
+    _juntar_salarios(MotoristaSalario)
+    _ligar(DailyReport.objects.all(), 'motorista', 'motorista_ref', _chave_motorista, motoristas, 'nome', 100)
+    _ligar(DailyReport.objects.all(), 'caminhao', 'caminhao_ref', _chave_caminhao, caminhoes, 'identificacao', 50)
+    _ligar(MotoristaSalario.objects.all(), 'motorista', 'motorista_ref', _chave_motorista, motoristas, 'nome', 100)
+    _ligar(CustosGerais.objects.all(), 'veiculo_placa', 'caminhao_ref', _chave_caminhao, caminhoes, 'identificacao', 20)
+
+    _rechavear_resumos(ResumoDiario, 'data', motoristas, caminhoes)
+    _rechavear_resumos(ResumoMensal, 'ano_mes', motoristas, caminhoes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0009_motorista_caminhao'),
+    ]
+
+    operations = [
+        # Os campos de texto continuam preenchidos, então voltar não precisa desfazer nada
+        migrations.RunPython(preencher, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+"""Texto normalizado de busca dos custos gerais e o índice de trigramas sobre ele.
+
+A normalização é uma cópia da de login/busca.py: a migração não pode depender
+do código atual do app. O índice depende do banco (ver login/busca.py):
+GIN pg_trgm no PostgreSQL e tabela FTS5 trigram com triggers no SQLite.
+"""
+import unicodedata
+
+from django.db import migrations, models
+
+CAMPOS = ('oficina_fornecedor', 'descricao', 'veiculo_placa')
+TAMANHO_LOTE = 2000
+
+SQL_SQLITE = [
+    "CREATE VIRTUAL TABLE login_custosgerais_busca USING fts5("
+    "busca_texto, content='login_custosgerais', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER login_custosgerais_busca_ai AFTER INSERT ON login_custosgerais BEGIN "
+    "INSERT INTO login_custosgerais_busca(rowid, busca_texto) VALUES (new.id, new.busca_texto); END",
+    "CREATE TRIGGER login_custosgerais_busca_ad AFTER DELETE ON login_custosgerais BEGIN "
+    "INSERT INTO login_custosgerais_busca(login_custosgerais_busca, rowid, busca_texto) "
+    "VALUES ('delete', old.id, old.busca_texto); END",
+    "CREATE TRIGGER login_custosgerais_busca_au AFTER UPDATE OF busca_texto ON login_custosgerais BEGIN "
+    "INSERT INTO login_custosgerais_busca(login_custosgerais_busca, rowid, busca_texto) "
+    "VALUES ('delete', old.id, old.busca_texto); "
+    "INSERT INTO login_custosgerais_busca(rowid, busca_texto) VALUES (new.id, new.busca_texto); END",
+    "INSERT INTO login_custosgerais_busca(login_custosgerais_busca) VALUES ('rebuild')",
+]
+
+SQL_SQLITE_REVERSO = [
+    'DROP TRIGGER IF EXISTS login_custosgerais_busca_ai',
+    'DROP TRIGGER IF EXISTS login_custosgerais_busca_ad',
+    'DROP TRIGGER IF EXISTS login_custosgerais_busca_au',
+    'DROP TABLE IF EXISTS login_custosgerais_busca',
+]
+
+SQL_POSTGRESQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS custosgerais_busca_trgm_idx ON login_custosgerais '
+    'USING gin (busca_texto gin_trgm_ops)',
+]
+
+SQL_POSTGRESQL_REVERSO = ['DROP INDEX IF EXISTS custosgerais_busca_trgm_idx']
+
+
+def _normalizar(texto):
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def preencher(apps, schema_editor):
+    CustosGerais = apps.get_model('login', 'CustosGerais')
+    lote = []
+    for custo in CustosGerais.objects.only(*CAMPOS).iterator(chunk_size=TAMANHO_LOTE):
+        custo.busca_texto = '\n'.join(_normalizar(getattr(custo, campo)) for campo in CAMPOS)
+        lote.append(custo)
+        if len(lote) == TAMANHO_LOTE:
+            CustosGerais.objects.bulk_update(lote, ['busca_texto'])
+            lote = []
+    if lote:
+        CustosGerais.objects.bulk_update(lote, ['busca_texto'])
+
+
+def _executar(schema_editor, comandos):
+    for sql in comandos.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def criar_indice(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQL_SQLITE, 'postgresql': SQL_POSTGRESQL})
+
+
+def remover_indice(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQL_SQLITE_REVERSO, 'postgresql': SQL_POSTGRESQL_REVERSO})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0010_preencher_motorista_caminhao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='custosgerais',
+            name='busca_texto',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Texto de busca'),
+        ),
+        migrations.RunPython(preencher, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
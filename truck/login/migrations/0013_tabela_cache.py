@@ -0,0 +1,22 @@
+"""Cria a tabela do cache no banco (CACHES padrão em truck/settings.py).
+
+O `migrate` basta para um ambiente novo; o build.sh também executa o
+`createcachetable`. Com CACHE_DIR ou CACHE_LOCAL o comando não faz nada.
+"""
+from django.core.management import call_command
+from django.db import migrations
+
+
+def criar_tabela_cache(apps, schema_editor):
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0012_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_tabela_cache, migrations.RunPython.noop),
+    ]
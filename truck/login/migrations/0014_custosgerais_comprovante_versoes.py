@@ -0,0 +1,75 @@
+"""Marca dos custos cujo comprovante já tem as versões reduzidas no storage.
+
+Os comprovantes já enviados são verificados uma vez aqui (um exists() por
+arquivo distinto); depois disso as URLs das versões saem só da marca. Os
+nomes das versões são cópias dos de login/comprovantes.py: a migração não
+pode depender do código atual do app.
+
+No SQLite o AddField recria a tabela de custos e descarta os triggers do
+índice de busca (FTS5): eles são recriados aqui como na 0011.
+"""
+import os
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+EXTENSOES_IMAGEM = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff'}
+PASTAS_VERSOES = ['exibicao', 'miniaturas']
+
+SQL_TRIGGERS_SQLITE = [
+    'DROP TRIGGER IF EXISTS login_custosgerais_busca_ai',
+    'DROP TRIGGER IF EXISTS login_custosgerais_busca_ad',
+    'DROP TRIGGER IF EXISTS login_custosgerais_busca_au',
+    "CREATE TRIGGER login_custosgerais_busca_ai AFTER INSERT ON login_custosgerais BEGIN "
+    "INSERT INTO login_custosgerais_busca(rowid, busca_texto) VALUES (new.id, new.busca_texto); END",
+    "CREATE TRIGGER login_custosgerais_busca_ad AFTER DELETE ON login_custosgerais BEGIN "
+    "INSERT INTO login_custosgerais_busca(login_custosgerais_busca, rowid, busca_texto) "
+    "VALUES ('delete', old.id, old.busca_texto); END",
+    "CREATE TRIGGER login_custosgerais_busca_au AFTER UPDATE OF busca_texto ON login_custosgerais BEGIN "
+    "INSERT INTO login_custosgerais_busca(login_custosgerais_busca, rowid, busca_texto) "
+    "VALUES ('delete', old.id, old.busca_texto); "
+    "INSERT INTO login_custosgerais_busca(rowid, busca_texto) VALUES (new.id, new.busca_texto); END",
+    "INSERT INTO login_custosgerais_busca(login_custosgerais_busca) VALUES ('rebuild')",
+]
+
+
+def _versoes_existem(nome):
+    if os.path.splitext(nome)[1].lower() not in EXTENSOES_IMAGEM:
+        return False
+    hash_arquivo = os.path.splitext(os.path.basename(nome))[0]
+    return all(default_storage.exists(f'comprovantes/{pasta}/{hash_arquivo}.jpg') for pasta in PASTAS_VERSOES)
+
+
+def marcar_versoes_existentes(apps, schema_editor):
+    CustosGerais = apps.get_model('login', 'CustosGerais')
+    nomes = CustosGerais.objects.exclude(comprovante='').exclude(comprovante__isnull=True).values_list(
+        'comprovante', flat=True
+    ).order_by().distinct()
+    com_versoes = [nome for nome in nomes if _versoes_existem(nome)]
+    if com_versoes:
+        CustosGerais.objects.filter(comprovante__in=com_versoes).update(comprovante_versoes=True)
+
+
+def recriar_triggers_busca(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQL_TRIGGERS_SQLITE:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0013_tabela_cache'),
+    ]
+
+    operations = [
+        # Ao desfazer, o RemoveField também recria a tabela: os triggers voltam depois dele
+        migrations.RunPython(migrations.RunPython.noop, recriar_triggers_busca),
+        migrations.AddField(
+            model_name='custosgerais',
+            name='comprovante_versoes',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Versões do comprovante geradas'),
+        ),
+        migrations.RunPython(recriar_triggers_busca, migrations.RunPython.noop),
+        migrations.RunPython(marcar_versoes_existentes, migrations.RunPython.noop),
+    ]
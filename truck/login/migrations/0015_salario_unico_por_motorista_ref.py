@@ -0,0 +1,51 @@
+"""Salário único por motorista cadastrado (motorista_ref) e mês, em vez do texto do nome.
+
+Antes de criar a restrição, salários repetidos do mesmo motorista no mesmo mês
+(grafias diferentes gravadas antes das dimensões) ficam só com o mais recente.
+Os índices pelo texto de motorista/caminhão das viagens não são mais usados
+(os filtros e agrupamentos vão pelas referências) e o de (motorista_ref,
+ano_mes) dos salários passa a ser o da própria restrição.
+"""
+from django.db import migrations
+
+
+def remover_salarios_repetidos(apps, schema_editor):
+    MotoristaSalario = apps.get_model('login', 'MotoristaSalario')
+    vistos = set()
+    repetidos = []
+    salarios = MotoristaSalario.objects.filter(motorista_ref__isnull=False).order_by(
+        'motorista_ref', 'ano_mes', '-updated_at', '-id'
+    ).values_list('id', 'motorista_ref', 'ano_mes')
+    for salario_id, motorista_ref, ano_mes in salarios.iterator():
+        if (motorista_ref, ano_mes) in vistos:
+            repetidos.append(salario_id)
+        vistos.add((motorista_ref, ano_mes))
+    if repetidos:
+        MotoristaSalario.objects.filter(id__in=repetidos).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0014_custosgerais_comprovante_versoes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='dailyreport',
+            name='dailyreport_motorista_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dailyreport',
+            name='dailyreport_caminhao_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='motoristasalario',
+            name='salario_motorista_ref_idx',
+        ),
+        migrations.RunPython(remover_salarios_repetidos, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='motoristasalario',
+            unique_together={('motorista_ref', 'ano_mes')},
+        ),
+    ]
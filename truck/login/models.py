@@ -1,7 +1,43 @@
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+from .comprovantes import url_versao
+
+# Valor pago por diária de viagem
+VALOR_DIARIA = Decimal('70.00')
+
+class Motorista(models.Model):
+    """Dimensão de motoristas (referenciada pelas viagens e salários)"""
+    nome = models.CharField(max_length=100, verbose_name="Nome")
+    # Nome normalizado (espaços simples, sem maiúsculas): grafias diferentes viram o mesmo motorista
+    chave = models.CharField(max_length=100, unique=True, verbose_name="Chave")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    class Meta:
+        verbose_name = "Motorista"
+        verbose_name_plural = "Motoristas"
+        ordering = ['nome']
+
+    def __str__(self):
+        return self.nome
+
+class Caminhao(models.Model):
+    """Dimensão de caminhões (referenciada pelas viagens e custos gerais)"""
+    identificacao = models.CharField(max_length=50, verbose_name="Placa/Identificação")
+    # Identificação sem espaços, hífens e pontos, em maiúsculas
+    chave = models.CharField(max_length=50, unique=True, verbose_name="Chave")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    class Meta:
+        verbose_name = "Caminhão"
+        verbose_name_plural = "Caminhões"
+        ordering = ['identificacao']
+
+    def __str__(self):
+        return self.identificacao
+
 class DailyReport(models.Model):
     """Modelo para relatórios diários de viagens"""
     data_viagem = models.DateField(verbose_name="Data da Viagem")
@@ -38,6 +74,14 @@ class DailyReport(models.Model):
     )
     motorista = models.CharField(max_length=100, verbose_name="Motorista")
     caminhao = models.CharField(max_length=50, verbose_name="Caminhão")
+    motorista_ref = models.ForeignKey(
+        Motorista, on_delete=models.PROTECT, null=True, blank=True, related_name='viagens',
+        verbose_name="Motorista (cadastro)"
+    )
+    caminhao_ref = models.ForeignKey(
+        Caminhao, on_delete=models.PROTECT, null=True, blank=True, related_name='viagens',
+        verbose_name="Caminhão (cadastro)"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
@@ -45,6 +89,14 @@ class DailyReport(models.Model):
         verbose_name = "Relatório Diário"
         verbose_name_plural = "Relatórios Diários"
         ordering = ['-data_viagem', '-created_at']
+        indexes = [
+            # Filtros por período e paginação por (data_viagem, created_at, id)
+            models.Index(fields=['data_viagem', 'created_at', 'id'], name='dailyreport_data_idx'),
+            models.Index(fields=['motorista_ref', 'data_viagem'], name='dailyreport_motorista_ref_idx'),
+            models.Index(fields=['caminhao_ref', 'data_viagem'], name='dailyreport_caminhao_ref_idx'),
+            # Sincronização incremental (alterações desde um token)
+            models.Index(fields=['updated_at'], name='dailyreport_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.data_viagem} - {self.partida} → {self.chegada} ({self.motorista})"
@@ -59,7 +111,7 @@ class DailyReport(models.Model):
     def save(self, *args, **kwargs):
         # Calcular valor das diárias automaticamente (R$ 70 por diária)
         try:
-            self.valor_diarias = self.diarias * Decimal('70.00')
+            self.valor_diarias = self.diarias * VALOR_DIARIA
         except (TypeError, ValueError, InvalidOperation) as e:
             # Se houver erro na operação decimal, usar valor padrão
             self.valor_diarias = Decimal('0.00')
@@ -107,6 +159,10 @@ class MonthlyCost(models.Model):
 class MotoristaSalario(models.Model):
     """Modelo para salários dos motoristas"""
     motorista = models.CharField(max_length=100, verbose_name="Motorista")
+    motorista_ref = models.ForeignKey(
+        Motorista, on_delete=models.PROTECT, null=True, blank=True, related_name='salarios',
+        verbose_name="Motorista (cadastro)"
+    )
     ano_mes = models.CharField(max_length=7, verbose_name="Ano-Mês (YYYY-MM)")
     salario_base = models.DecimalField(
         max_digits=10, 
@@ -135,8 +191,13 @@ class MotoristaSalario(models.Model):
     class Meta:
         verbose_name = "Salário do Motorista"
         verbose_name_plural = "Salários dos Motoristas"
-        unique_together = ['motorista', 'ano_mes']
+        # Um salário por motorista cadastrado e mês; o unique_together já cria o
+        # índice de (motorista_ref, ano_mes) usado pelos relatórios
+        unique_together = [('motorista_ref', 'ano_mes')]
         ordering = ['-ano_mes', 'motorista']
+        indexes = [
+            models.Index(fields=['ano_mes'], name='salario_ano_mes_idx'),
+        ]
 
     def __str__(self):
         return f"{self.motorista} - {self.ano_mes}"
@@ -190,6 +251,10 @@ class CustosGerais(models.Model):
     )
     data = models.DateField(verbose_name="Data")
     veiculo_placa = models.CharField(max_length=20, verbose_name="Placa do Veículo")
+    caminhao_ref = models.ForeignKey(
+        Caminhao, on_delete=models.PROTECT, null=True, blank=True, related_name='custos_gerais',
+        verbose_name="Caminhão (cadastro)"
+    )
     km_atual = models.PositiveIntegerField(null=True, blank=True, verbose_name="KM Atual")
     oficina_fornecedor = models.CharField(max_length=200, verbose_name="Oficina/Fornecedor")
     descricao = models.TextField(verbose_name="Descrição")
@@ -212,12 +277,16 @@ class CustosGerais(models.Model):
     )
     data_vencimento = models.DateField(null=True, blank=True, verbose_name="Data de Vencimento")
     observacoes = models.TextField(blank=True, verbose_name="Observações")
+    # Oficina, descrição e placa normalizadas para a busca indexada (ver login/busca.py)
+    busca_texto = models.TextField(blank=True, default='', editable=False, verbose_name="Texto de busca")
     comprovante = models.FileField(
         upload_to='comprovantes/', 
         null=True, 
         blank=True, 
         verbose_name="Comprovante"
     )
+    # Marcado quando as versões reduzidas do comprovante (imagem) já estão no storage
+    comprovante_versoes = models.BooleanField(default=False, editable=False, verbose_name="Versões do comprovante geradas")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
@@ -225,6 +294,15 @@ class CustosGerais(models.Model):
         verbose_name = "Custo Geral"
         verbose_name_plural = "Custos Gerais"
         ordering = ['-data', '-created_at']
+        indexes = [
+            # Filtros por período e ordenação da listagem
+            models.Index(fields=['data', 'created_at'], name='custosgerais_data_idx'),
+            # Índice de cobertura para somas de valor por período e status (sem ler a tabela)
+            models.Index(fields=['data', 'status_pagamento', 'valor'], name='custosgerais_valor_idx'),
+            models.Index(fields=['relatorio', 'data'], name='custosgerais_relatorio_idx'),
+            models.Index(fields=['caminhao_ref', 'data'], name='custosgerais_caminhao_ref_idx'),
+            models.Index(fields=['updated_at'], name='custosgerais_updated_idx'),
+        ]
 
     def __str__(self):
         try:
@@ -235,6 +313,14 @@ class CustosGerais(models.Model):
     def get_tipo_gasto_display(self):
         return dict(self.TIPO_GASTO_CHOICES).get(self.tipo_gasto, self.tipo_gasto)
 
+    def get_comprovante_exibicao_url(self):
+        """URL da versão reduzida do comprovante para exibir nas páginas (o original se ainda não existir)"""
+        return url_versao(self.comprovante, 'exibicao', self.comprovante_versoes)
+
+    def get_comprovante_miniatura_url(self):
+        """URL da miniatura do comprovante (o original se ainda não existir)"""
+        return url_versao(self.comprovante, 'miniatura', self.comprovante_versoes)
+
     def get_forma_pagamento_display(self):
         return dict(self.FORMA_PAGAMENTO_CHOICES).get(self.forma_pagamento, self.forma_pagamento)
 
@@ -287,6 +373,10 @@ class CustoFixoMensal(models.Model):
         verbose_name = "Custo Fixo Mensal"
         verbose_name_plural = "Custos Fixos Mensais"
         ordering = ['-data_inicio', 'descricao']
+        indexes = [
+            models.Index(fields=['status', 'data_inicio', 'data_fim'], name='custofixo_vigencia_idx'),
+            models.Index(fields=['updated_at'], name='custofixo_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_custo_display()} - {self.descricao} - R$ {self.valor_mensal}/mês"
@@ -306,3 +396,130 @@ class CustoFixoMensal(models.Model):
         if self.data_fim and data > self.data_fim:
             return False
         return True
+
+
+class ResumoBase(models.Model):
+    """Campos comuns das tabelas de totais pré-calculados (rollups)"""
+    DIMENSAO_CHOICES = [
+        ('geral', 'Geral'),
+        ('motorista', 'Motorista'),
+        ('caminhao', 'Caminhão'),
+    ]
+
+    dimensao = models.CharField(max_length=10, choices=DIMENSAO_CHOICES, verbose_name="Dimensão")
+    chave = models.CharField(max_length=100, blank=True, default='', verbose_name="Chave")
+    total_viagens = models.PositiveIntegerField(default=0, verbose_name="Total de Viagens")
+    total_diarias = models.PositiveIntegerField(default=0, verbose_name="Total de Diárias")
+    total_valor_diarias = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name="Total Valor das Diárias"
+    )
+    total_litros = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'), verbose_name="Total de Litros"
+    )
+    total_gasto_gasolina = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name="Total Gasto com Gasolina"
+    )
+    total_receita_frete = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name="Total Receita do Frete"
+    )
+    total_custos_gerais = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name="Total Custos Gerais"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    class Meta:
+        abstract = True
+
+
+class ResumoDiario(ResumoBase):
+    """Totais de viagens e custos gerais por dia (geral, por motorista e por caminhão)"""
+    data = models.DateField(verbose_name="Data")
+
+    class Meta:
+        verbose_name = "Resumo Diário"
+        verbose_name_plural = "Resumos Diários"
+        unique_together = ['data', 'dimensao', 'chave']
+        ordering = ['-data', 'dimensao', 'chave']
+        indexes = [
+            models.Index(fields=['dimensao', 'data'], name='resumodiario_dimensao_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.data} - {self.dimensao} {self.chave}".strip()
+
+
+class ResumoMensal(ResumoBase):
+    """Totais de viagens e custos gerais por mês (geral, por motorista e por caminhão)"""
+    ano_mes = models.CharField(max_length=7, verbose_name="Ano-Mês (YYYY-MM)")
+
+    class Meta:
+        verbose_name = "Resumo Mensal"
+        verbose_name_plural = "Resumos Mensais"
+        unique_together = ['ano_mes', 'dimensao', 'chave']
+        ordering = ['-ano_mes', 'dimensao', 'chave']
+
+    def __str__(self):
+        return f"{self.ano_mes} - {self.dimensao} {self.chave}".strip()
+
+
+class RegistroExcluido(models.Model):
+    """Marca (tombstone) de um registro excluído, usada pela sincronização incremental"""
+    MODELO_CHOICES = [
+        ('relatorio', 'Relatório Diário'),
+        ('custo_geral', 'Custo Geral'),
+        ('custo_fixo', 'Custo Fixo Mensal'),
+    ]
+
+    modelo = models.CharField(max_length=20, choices=MODELO_CHOICES, verbose_name="Modelo")
+    objeto_id = models.BigIntegerField(verbose_name="ID do Registro")
+    excluido_em = models.DateTimeField(auto_now_add=True, verbose_name="Excluído em")
+
+    class Meta:
+        verbose_name = "Registro Excluído"
+        verbose_name_plural = "Registros Excluídos"
+        ordering = ['excluido_em']
+        indexes = [
+            models.Index(fields=['excluido_em'], name='registroexcluido_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} #{self.objeto_id} ({self.excluido_em})"
+
+
+class Job(models.Model):
+    """Tarefa pesada (relatório, exportação) na fila do banco, executada pelo `manage.py run_worker`"""
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ]
+
+    tipo = models.CharField(max_length=50, verbose_name="Tipo")
+    parametros = models.JSONField(default=dict, blank=True, verbose_name="Parâmetros")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente', verbose_name="Status")
+    tentativas = models.PositiveSmallIntegerField(default=0, verbose_name="Tentativas")
+    # Resultado JSON (relatórios) e/ou arquivo para download (exportações)
+    resultado = models.JSONField(null=True, blank=True, verbose_name="Resultado")
+    arquivo = models.FileField(upload_to='jobs/', null=True, blank=True, verbose_name="Arquivo")
+    erro = models.TextField(blank=True, verbose_name="Erro")
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='jobs', verbose_name="Usuário"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    iniciado_em = models.DateTimeField(null=True, blank=True, verbose_name="Iniciado em")
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluído em")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+
+    class Meta:
+        verbose_name = "Tarefa"
+        verbose_name_plural = "Tarefas"
+        ordering = ['-created_at']
+        indexes = [
+            # O worker busca a próxima pendente (e as travadas em execução) por status e idade
+            models.Index(fields=['status', 'created_at'], name='job_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.get_status_display()})"
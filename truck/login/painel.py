@@ -0,0 +1,65 @@
+"""Retrato diário do dashboard (totais da semana e custos fixos vigentes) e últimas viagens.
+
+O dashboard é a página de entrada depois do login. O retrato do dia fica no
+cache de relatórios com as versões dos meses que ele lê (os da semana atual e
+o mês atual), incrementadas pelos signals de DailyReport, CustosGerais e
+CustoFixoMensal (e pelos caminhos com SQL direto e bulk_create, via
+datas_alteradas/invalidar_vigencia): alterações em outros meses não o
+invalidam. A primeira leitura depois de uma alteração nesses meses recalcula
+o retrato (os totais vêm dos resumos diários) e as demais são um acerto de
+cache. As últimas viagens podem ser de qualquer mês, então não entram no
+retrato: vão para o contexto como queryset preguiçoso, avaliado (uma query
+pelo índice de data) só se o template as listar.
+"""
+from datetime import timedelta
+
+from . import cache_relatorios, dinheiro, resumos
+from .custos_fixos import carregar_indice
+from .models import DailyReport
+
+# Custos fixos vigentes listados e quantidade de últimas viagens
+LIMITE_CUSTOS_FIXOS = 20
+LIMITE_ULTIMAS_VIAGENS = 5
+
+
+def calcular_painel(hoje):
+    """Retrato do dashboard para o dia `hoje` (semana de segunda até hoje)"""
+    inicio_semana = hoje - timedelta(days=hoje.weekday())
+
+    # Totais da semana lidos dos resumos diários (no máximo 7 linhas)
+    totais = resumos.totais_periodo(inicio_semana, hoje)
+
+    # Custos fixos pelo índice de intervalos (mesma regra de rateio dos relatórios):
+    # vigentes hoje na lista e total atribuído ao mês atual
+    indice_custos_fixos = carregar_indice()
+    total_custos_fixos_mensais = dinheiro.reais(
+        indice_custos_fixos.total_periodo(*resumos.limites_mes(hoje.strftime('%Y-%m')))
+    )
+
+    return {
+        'inicio_semana': inicio_semana,
+        'total_viagens': totais['total_viagens'],
+        'total_diarias': totais['total_diarias'],
+        'total_valor_diarias': totais['total_valor_diarias'],
+        'total_gasto_gasolina': totais['total_gasto_gasolina'],
+        'custos_fixos_mensais': indice_custos_fixos.ativos(hoje, hoje)[:LIMITE_CUSTOS_FIXOS],
+        'total_custos_fixos_mensais': total_custos_fixos_mensais,
+    }
+
+
+def obter_retrato(hoje):
+    """Retrato do dia, do cache (recalculado só depois de alterações na semana ou no mês atual)"""
+    inicio_semana = hoje - timedelta(days=hoje.weekday())
+    # A semana pode começar no mês anterior; o total de custos fixos é do mês atual
+    inicio = min(inicio_semana, hoje.replace(day=1))
+    return cache_relatorios.obter_ou_calcular('painel', inicio, hoje, lambda: calcular_painel(hoje))
+
+
+def ultimas_viagens():
+    """Últimas viagens pela data (de qualquer mês); queryset não avaliado"""
+    return DailyReport.objects.order_by('-data_viagem', '-created_at')[:LIMITE_ULTIMAS_VIAGENS]
+
+
+def obter_painel(hoje):
+    """Dados do dashboard: o retrato do dia e as últimas viagens"""
+    return {**obter_retrato(hoje), 'ultimas_viagens': ultimas_viagens()}
@@ -0,0 +1,377 @@
+"""Carregamento em lote, paginação e serialização dos relatórios de viagem"""
+import base64
+import binascii
+import json
+from collections import defaultdict
+from datetime import datetime
+from decimal import InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+
+from . import dimensoes, dinheiro, resumos
+from .models import DailyReport, CustosGerais, MotoristaSalario
+from .totais import calcular_totais
+
+# Quantidade máxima de ids por cláusula IN (o SQLite limita o número de parâmetros)
+TAMANHO_LOTE_IDS = 500
+
+# Tamanho de página padrão e máximo da listagem paginada
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+CAMPOS_RELATORIO = [
+    'id', 'data_viagem', 'partida', 'chegada', 'diarias',
+    'litros_gasolina', 'gasto_gasolina', 'receita_frete',
+    'motorista', 'caminhao', 'valor_diarias', 'created_at',
+    'motorista_ref', 'caminhao_ref',
+]
+
+
+class CursorInvalido(ValueError):
+    """Cursor de paginação malformado ou adulterado"""
+
+
+def _ano_mes(data_viagem):
+    """Retorna 'YYYY-MM' para uma data (objeto date ou string ISO)"""
+    return str(data_viagem)[:7]
+
+
+def _float(valor):
+    """Converte valores monetários para float sem levantar exceções"""
+    try:
+        return float(valor) if valor else 0.0
+    except (TypeError, ValueError, InvalidOperation):
+        return 0.0
+
+
+def carregar_salarios(relatorios):
+    """Busca em uma única query os salários dos relatórios, indexados por (motorista_ref, ano_mes)"""
+    chaves = {(r['motorista_ref'], _ano_mes(r['data_viagem'])) for r in relatorios if r['motorista_ref']}
+    if not chaves:
+        return {}
+
+    motoristas = {motorista for motorista, _ in chaves}
+    meses = {ano_mes for _, ano_mes in chaves}
+    salarios = MotoristaSalario.objects.filter(motorista_ref__in=motoristas, ano_mes__in=meses)
+    return {
+        (salario.motorista_ref_id, salario.ano_mes): salario
+        for salario in salarios
+        if (salario.motorista_ref_id, salario.ano_mes) in chaves
+    }
+
+
+def carregar_custos(relatorio_ids):
+    """Busca os custos gerais dos relatórios, agrupados por relatorio_id"""
+    custos_por_relatorio = defaultdict(list)
+    relatorio_ids = list(relatorio_ids)
+
+    for inicio in range(0, len(relatorio_ids), TAMANHO_LOTE_IDS):
+        lote = relatorio_ids[inicio:inicio + TAMANHO_LOTE_IDS]
+        for custo in CustosGerais.objects.filter(relatorio_id__in=lote):
+            custos_por_relatorio[custo.relatorio_id].append(custo)
+
+    return custos_por_relatorio
+
+
+def serializar_parcela(custo):
+    """Representa um custo geral como uma "parcela" (sistema simplificado sem parcelas)"""
+    return {
+        'id': f"custo_{custo.id}",
+        'custo_id': custo.id,
+        'tipo_gasto': custo.get_tipo_gasto_display(),
+        'descricao': custo.descricao,
+        'oficina_fornecedor': custo.oficina_fornecedor or 'N/A',
+        'veiculo_placa': custo.veiculo_placa or 'N/A',
+        'numero_parcela': 1,
+        'valor_parcela': dinheiro.para_json(dinheiro.centavos(custo.valor)),
+        'data_vencimento': custo.data.strftime('%d/%m/%Y'),
+        'status_pagamento': custo.get_status_pagamento_display(),
+        'paga': custo.status_pagamento == 'pago',
+        'forma_pagamento': custo.get_forma_pagamento_display(),
+        'observacoes': custo.observacoes or ''
+    }
+
+
+def serializar_relatorio(relatorio, salario, custos):
+    """Monta o dicionário JSON de um relatório com totais e lucro calculados"""
+    # Valores em centavos: somas exatas, convertidos para número JSON só na saída
+    custos_centavos = [dinheiro.centavos(custo.valor) for custo in custos]
+    total_custos_gerais = sum(custos_centavos)
+    total_diarias = dinheiro.centavos(relatorio['valor_diarias'])
+    gasto_gasolina = dinheiro.centavos(relatorio['gasto_gasolina'])
+    receita_frete = dinheiro.centavos(relatorio['receita_frete'])
+    salario_liquido = dinheiro.centavos(salario.get_salario_liquido()) if salario else 0
+    total_despesas = gasto_gasolina + total_diarias + total_custos_gerais + salario_liquido
+
+    # Ordenar todas as parcelas por data de vencimento
+    todas_parcelas = sorted(
+        (serializar_parcela(custo) for custo in custos),
+        key=lambda p: datetime.strptime(p['data_vencimento'], '%d/%m/%Y')
+    )
+
+    # Lista de custos gerais para o frontend (sem parcelas individuais)
+    custos_gerais_list = [{
+        'id': custo.id,
+        'tipo_gasto': custo.get_tipo_gasto_display(),
+        'oficina_fornecedor': custo.oficina_fornecedor,
+        'descricao': custo.descricao,
+        'valor': dinheiro.para_json(valor),
+        'forma_pagamento': custo.get_forma_pagamento_display(),
+        'status_pagamento': custo.get_status_pagamento_display(),
+        'veiculo_placa': custo.veiculo_placa,
+        'data_vencimento': custo.data_vencimento.strftime('%d/%m/%Y') if custo.data_vencimento else None,
+        'observacoes': custo.observacoes
+    } for custo, valor in zip(custos, custos_centavos)]
+
+    parcelas_pagas = sum(1 for p in todas_parcelas if p['paga'])
+
+    relatorio_data = {
+        'id': relatorio['id'],
+        'date': str(relatorio['data_viagem']),
+        'localPartida': relatorio['partida'],
+        'localChegada': relatorio['chegada'],
+        'quantidadeDiarias': relatorio['diarias'],
+        'totalDiarias': dinheiro.para_json(total_diarias),
+        'litrosGasolina': _float(relatorio['litros_gasolina']),
+        'valorGasolina': dinheiro.para_json(gasto_gasolina),
+        'nomeMotorista': relatorio['motorista'],
+        'nomeCaminhao': relatorio['caminhao'],
+        'receita': dinheiro.para_json(receita_frete),
+        'totalGastosViagem': dinheiro.para_json(gasto_gasolina + total_diarias),
+        'totalCustosGerais': dinheiro.para_json(total_custos_gerais),
+        'totalDespesas': dinheiro.para_json(total_despesas),
+        'lucroLiquido': dinheiro.para_json(receita_frete - total_despesas),
+        'salarioBase': _float(salario.salario_base) if salario else 0,
+        'bonusViagens': _float(salario.bonus_viagens) if salario else 0,
+        'descontoFaltas': _float(salario.desconto_faltas) if salario else 0,
+        'salarioLiquido': dinheiro.para_json(salario_liquido),
+        'custosGerais': custos_gerais_list,
+        'todasParcelas': todas_parcelas,
+        'totalParcelas': len(todas_parcelas),
+        'parcelasPagas': parcelas_pagas,
+        'parcelasPendentes': len(todas_parcelas) - parcelas_pagas
+    }
+
+    # Campos de compatibilidade esperados pelo frontend da tabela
+    relatorio_data.update({
+        'data_viagem': str(relatorio['data_viagem']) if relatorio.get('data_viagem') else '',
+        'partida': relatorio.get('partida') or '',
+        'chegada': relatorio.get('chegada') or '',
+        'motorista': relatorio.get('motorista') or '',
+        'receita_frete': dinheiro.para_json(receita_frete),
+        'gasto_gasolina': dinheiro.para_json(gasto_gasolina),
+        'valor_diarias': dinheiro.para_json(total_diarias),
+        # Usado no resumo da busca
+        'totalGastos': dinheiro.para_json(gasto_gasolina + total_diarias)
+    })
+
+    return relatorio_data
+
+
+def serializar_relatorios(relatorios):
+    """Serializa uma lista de relatórios com um número constante de queries"""
+    salarios = carregar_salarios(relatorios)
+    custos = carregar_custos(r['id'] for r in relatorios)
+    return _serializar(relatorios, salarios, custos)
+
+
+async def aserializar_relatorios(relatorios):
+    """Versão assíncrona de serializar_relatorios (as duas queries em uma única passagem pela thread do ORM)"""
+    return await sync_to_async(serializar_relatorios)(relatorios)
+
+
+def _serializar(relatorios, salarios, custos):
+    return [
+        serializar_relatorio(
+            relatorio,
+            salarios.get((relatorio['motorista_ref'], _ano_mes(relatorio['data_viagem']))),
+            custos.get(relatorio['id'], [])
+        )
+        for relatorio in relatorios
+    ]
+
+
+def codificar_cursor(relatorio):
+    """Gera o token de continuação a partir da chave (data_viagem, created_at, id)"""
+    chave = [relatorio['data_viagem'].isoformat(), relatorio['created_at'].isoformat(), relatorio['id']]
+    return base64.urlsafe_b64encode(json.dumps(chave).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Converte o token de continuação de volta em (data_viagem, created_at, id)"""
+    try:
+        preenchimento = '=' * (-len(token) % 4)
+        data_viagem, created_at, relatorio_id = json.loads(base64.urlsafe_b64decode(token + preenchimento))
+        return (
+            datetime.strptime(data_viagem, '%Y-%m-%d').date(),
+            datetime.fromisoformat(created_at),
+            int(relatorio_id),
+        )
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise CursorInvalido(f'Cursor inválido: {token}') from e
+
+
+def consultar_pagina(cursor=None, limite=LIMITE_PADRAO, motorista=None, caminhao=None,
+                     data_inicio=None, data_fim=None):
+    """Monta a query de uma página de relatórios (mais recentes primeiro) com paginação por chave.
+
+    Retorna (queryset, limite); o queryset traz um registro a mais que o limite
+    para saber se existe próxima página (ver _fechar_pagina).
+    """
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+    relatorios = DailyReport.objects.all()
+
+    # Pela chave da dimensão: qualquer grafia do nome/placa encontra as viagens
+    if motorista:
+        relatorios = relatorios.filter(motorista_ref__chave=dimensoes.chave_motorista(motorista))
+    if caminhao:
+        relatorios = relatorios.filter(caminhao_ref__chave=dimensoes.chave_caminhao(caminhao))
+    if data_inicio:
+        relatorios = relatorios.filter(data_viagem__gte=data_inicio)
+    if data_fim:
+        relatorios = relatorios.filter(data_viagem__lte=data_fim)
+
+    if cursor:
+        data_viagem, created_at, relatorio_id = decodificar_cursor(cursor)
+        relatorios = relatorios.filter(
+            Q(data_viagem__lt=data_viagem) |
+            Q(data_viagem=data_viagem, created_at__lt=created_at) |
+            Q(data_viagem=data_viagem, created_at=created_at, id__lt=relatorio_id)
+        )
+
+    consulta = relatorios.order_by('-data_viagem', '-created_at', '-id').values(*CAMPOS_RELATORIO)[:limite + 1]
+    return consulta, limite
+
+
+def _fechar_pagina(pagina, limite):
+    next_cursor = codificar_cursor(pagina[limite - 1]) if len(pagina) > limite else None
+    return pagina[:limite], next_cursor
+
+
+def paginar_relatorios(**filtros):
+    """Busca uma página de relatórios; retorna (relatorios, next_cursor), com next_cursor None na última página"""
+    consulta, limite = consultar_pagina(**filtros)
+    return _fechar_pagina(list(consulta), limite)
+
+
+async def apaginar_relatorios(**filtros):
+    """Versão assíncrona de paginar_relatorios (ORM assíncrono)"""
+    consulta, limite = consultar_pagina(**filtros)
+    return _fechar_pagina([relatorio async for relatorio in consulta], limite)
+
+
+def dados_relatorios_mes(ano_mes):
+    """Dados da API de relatórios por mês (servidos pela view e pela fila de tarefas).
+
+    Síncrona: a view assíncrona a executa inteira em um único sync_to_async.
+    Um asyncio.gather das consultas não ganhava nada, porque o ORM executa
+    todas na mesma thread e conexão da requisição, uma de cada vez.
+    """
+    # Buscar relatórios do mês (intervalo de datas usa o índice de data_viagem)
+    data_inicio_mes, data_fim_mes = resumos.limites_mes(ano_mes)
+    # Valores monetários já em centavos inteiros (sem Decimal por linha)
+    consulta_relatorios = DailyReport.objects.filter(
+        data_viagem__range=[data_inicio_mes, data_fim_mes]
+    ).order_by('data_viagem').values(
+        'id', 'data_viagem', 'motorista', 'caminhao', 'partida', 'chegada', 'diarias', 'litros_gasolina',
+        valor_diarias_centavos=dinheiro.Centavos('valor_diarias'),
+        gasto_gasolina_centavos=dinheiro.Centavos('gasto_gasolina'),
+        receita_frete_centavos=dinheiro.Centavos('receita_frete'),
+    )
+    
+    # Custos gerais do mês
+    consulta_custos = CustosGerais.objects.filter(
+        data__range=[data_inicio_mes, data_fim_mes]
+    ).annotate(valor_centavos=dinheiro.Centavos('valor'))
+    
+    # Relatórios, totais (serviço compartilhado com os demais relatórios) e custos gerais
+    relatorios = list(consulta_relatorios)
+    totais = calcular_totais(data_inicio_mes, data_fim_mes, ano_mes=ano_mes)
+    custos_gerais_mes = list(consulta_custos)
+    
+    # Custos fixos do mês
+    custos_fixos = totais['custos_fixos']
+    custos_fixos_data = {
+        'pecas': float(custos_fixos.pecas) if custos_fixos else 0.0,
+        'seguro': float(custos_fixos.seguro) if custos_fixos else 0.0,
+        'manutencao': float(custos_fixos.manutencao) if custos_fixos else 0.0
+    }
+    
+    # Converter QuerySet para lista de dicionários
+    relatorios_data = []
+    for relatorio in relatorios:
+        relatorios_data.append({
+            'id': relatorio['id'],
+            'data_viagem': relatorio['data_viagem'].isoformat(),
+            'motorista': relatorio['motorista'],
+            'caminhao': relatorio['caminhao'],
+            'partida': relatorio['partida'],
+            'chegada': relatorio['chegada'],
+            'diarias': relatorio['diarias'],
+            'valor_diarias': dinheiro.para_json(relatorio['valor_diarias_centavos']),
+            'litros_gasolina': float(relatorio['litros_gasolina']),
+            'gasto_gasolina': dinheiro.para_json(relatorio['gasto_gasolina_centavos']),
+            'receita_frete': dinheiro.para_json(relatorio['receita_frete_centavos'])
+        })
+    
+    # Converter custos gerais para lista de dicionários
+    custos_gerais_data = []
+    todas_parcelas_mes = []
+    
+    for custo in custos_gerais_mes:
+        custos_gerais_data.append({
+            'id': custo.id,
+            'data': custo.data.isoformat(),
+            'tipo_gasto': custo.tipo_gasto,
+            'tipo_gasto_display': custo.get_tipo_gasto_display(),
+            'veiculo_placa': custo.veiculo_placa,
+            'descricao': custo.descricao,
+            'valor': dinheiro.para_json(custo.valor_centavos),
+            'status_pagamento': custo.status_pagamento,
+            'status_pagamento_display': custo.get_status_pagamento_display()
+        })
+        
+        # Adicionar custo como parcela
+        todas_parcelas_mes.append({
+            'id': f"custo_{custo.id}",
+            'custo_id': custo.id,
+            'tipo_gasto': custo.get_tipo_gasto_display(),
+            'descricao': custo.descricao,
+            'oficina_fornecedor': custo.oficina_fornecedor or 'N/A',
+            'veiculo_placa': custo.veiculo_placa or 'N/A',
+            'numero_parcela': 1,
+            'valor_parcela': dinheiro.para_json(custo.valor_centavos),
+            'data_vencimento': custo.data.strftime('%d/%m/%Y'),
+            'status_pagamento': custo.get_status_pagamento_display(),
+            'paga': custo.status_pagamento == 'pago',
+            'forma_pagamento': custo.get_forma_pagamento_display(),
+            'observacoes': custo.observacoes or ''
+        })
+        
+        # REMOVIDO: Sistema simplificado sem parcelas
+        # parcelas = custo.parcelas.all().order_by('numero_parcela')
+        # for parcela in parcelas: ...
+    
+    return {
+        'success': True,
+        'relatorios': relatorios_data,
+        'totais': {
+            'total_diarias': totais['total_diarias'],
+            'total_valor_diarias': float(totais['total_valor_diarias']),
+            'total_litros': float(totais['total_litros']),
+            'total_gasto_gasolina': float(totais['total_gasto_gasolina']),
+            'total_receita_frete': float(totais['total_receita_frete']),
+            'total_custos_fixos': float(totais['total_custos_fixos']),
+            'total_custos_fixos_mensais': float(totais['total_custos_fixos_mensais']),
+            'total_custos_gerais': float(totais['total_custos_gerais']),
+            'total_despesas': float(totais['total_despesas']),
+            'lucro_liquido': float(totais['lucro_liquido'])
+        },
+        'custos_fixos': custos_fixos_data,
+        'custos_gerais_mes': custos_gerais_data,
+        'todasParcelas': todas_parcelas_mes,
+        'totalParcelas': len(todas_parcelas_mes),
+        'parcelasPagas': len([p for p in todas_parcelas_mes if p['paga']]),
+        'parcelasPendentes': len([p for p in todas_parcelas_mes if not p['paga']])
+    }
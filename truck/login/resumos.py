@@ -0,0 +1,310 @@
+"""Manutenção e leitura das tabelas de totais pré-calculados (ResumoDiario / ResumoMensal).
+
+Os resumos são recalculados por dia a partir das linhas brutas e o mês é
+recalculado a partir dos resumos diários, de forma que os relatórios leem
+O(dias) linhas em vez de O(viagens + custos). Linhas apenas inseridas
+(cadastro e importação) não precisam reagregar o dia: os totais delas são
+somados às linhas dos resumos (somar_novos).
+"""
+import calendar
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import cache_relatorios, dimensoes
+from .dinheiro import SomaCentavos, reais
+from .models import Caminhao, DailyReport, CustosGerais, Motorista, ResumoDiario, ResumoMensal
+
+# Valores monetários são somados em centavos inteiros no banco (SomaCentavos)
+CAMPOS_VIAGEM = {
+    'total_viagens': Count('id'),
+    'total_diarias': Sum('diarias'),
+    'total_valor_diarias': SomaCentavos('valor_diarias'),
+    'total_litros': Sum('litros_gasolina'),
+    'total_gasto_gasolina': SomaCentavos('gasto_gasolina'),
+    'total_receita_frete': SomaCentavos('receita_frete'),
+}
+
+CAMPOS_DINHEIRO = {'total_valor_diarias', 'total_gasto_gasolina', 'total_receita_frete', 'total_custos_gerais'}
+
+CAMPOS_TOTAIS = [
+    'total_viagens', 'total_diarias', 'total_valor_diarias', 'total_litros',
+    'total_gasto_gasolina', 'total_receita_frete', 'total_custos_gerais',
+]
+
+# Referência (inteira) usada para agrupar cada dimensão nas viagens e nos custos gerais.
+# A chave gravada no resumo continua sendo o nome canônico do motorista/caminhão.
+DIMENSOES_VIAGEM = {'geral': None, 'motorista': 'motorista_ref', 'caminhao': 'caminhao_ref'}
+DIMENSOES_CUSTO = {'geral': None, 'motorista': 'relatorio__motorista_ref', 'caminhao': 'caminhao_ref'}
+MODELOS_DIMENSAO = {'motorista': Motorista, 'caminhao': Caminhao}
+
+TAMANHO_LOTE = 1000
+
+
+def _zero(campo):
+    return 0 if campo in ('total_viagens', 'total_diarias') else Decimal('0')
+
+
+def _somas(campos):
+    """Agregações dos campos de ResumoBase (dinheiro em centavos)"""
+    return {campo: SomaCentavos(campo) if campo in CAMPOS_DINHEIRO else Sum(campo) for campo in campos}
+
+
+def _valor(campo, agregado):
+    """Converte o resultado de uma agregação de _somas/CAMPOS_VIAGEM para o valor do resumo"""
+    if campo in CAMPOS_DINHEIRO:
+        return reais(agregado or 0)
+    return agregado or _zero(campo)
+
+
+def totais_vazios():
+    """Dicionário de totais zerado"""
+    return {campo: _zero(campo) for campo in CAMPOS_TOTAIS}
+
+
+def limites_mes(ano_mes):
+    """Retorna o primeiro e o último dia de um mês 'YYYY-MM'"""
+    ano, mes = int(ano_mes[:4]), int(ano_mes[5:7])
+    return date(ano, mes, 1), date(ano, mes, calendar.monthrange(ano, mes)[1])
+
+
+def _agregar_dias(datas=None):
+    """Calcula as linhas de ResumoDiario a partir das tabelas brutas"""
+    agrupados = defaultdict(totais_vazios)
+
+    viagens = DailyReport.objects.all()
+    custos = CustosGerais.objects.all()
+    if datas is not None:
+        viagens = viagens.filter(data_viagem__in=datas)
+        custos = custos.filter(data__in=datas)
+
+    for dimensao, campo in DIMENSOES_VIAGEM.items():
+        agrupamento = ['data_viagem'] + ([campo] if campo else [])
+        consulta = viagens.order_by()
+        if campo:
+            consulta = consulta.exclude(**{f'{campo}__isnull': True})
+        for linha in consulta.values(*agrupamento).annotate(**CAMPOS_VIAGEM):
+            chave = (linha['data_viagem'], dimensao, linha[campo] if campo else None)
+            for total in CAMPOS_VIAGEM:
+                agrupados[chave][total] = _valor(total, linha[total])
+
+    for dimensao, campo in DIMENSOES_CUSTO.items():
+        agrupamento = ['data'] + ([campo] if campo else [])
+        consulta = custos.order_by()
+        if campo:
+            consulta = consulta.exclude(**{f'{campo}__isnull': True})
+        for linha in consulta.values(*agrupamento).annotate(total=SomaCentavos('valor')):
+            chave = (linha['data'], dimensao, linha[campo] if campo else None)
+            agrupados[chave]['total_custos_gerais'] = reais(linha['total'])
+
+    # Ids das dimensões -> nomes, uma query por dimensão
+    nomes = {
+        dimensao: dimensoes.nomes(modelo, {ref for _, d, ref in agrupados if d == dimensao})
+        for dimensao, modelo in MODELOS_DIMENSAO.items()
+    }
+    return [
+        ResumoDiario(data=data_resumo, dimensao=dimensao, chave=nomes[dimensao][ref] if ref else '', **totais)
+        for (data_resumo, dimensao, ref), totais in agrupados.items()
+    ]
+
+
+def _agregar_meses(meses):
+    """Calcula as linhas de ResumoMensal somando os resumos diários do mês"""
+    resumos = []
+    agregados = _somas(CAMPOS_TOTAIS)
+    for ano_mes in meses:
+        inicio, fim = limites_mes(ano_mes)
+        linhas = ResumoDiario.objects.filter(data__range=[inicio, fim]).order_by().values(
+            'dimensao', 'chave'
+        ).annotate(**agregados)
+        for linha in linhas:
+            totais = {campo: _valor(campo, linha[campo]) for campo in CAMPOS_TOTAIS}
+            resumos.append(ResumoMensal(ano_mes=ano_mes, dimensao=linha['dimensao'], chave=linha['chave'], **totais))
+    return resumos
+
+
+def _gravar(modelo, coluna_periodo, periodos, linhas):
+    """Grava as linhas recalculadas dos períodos e apaga as chaves que deixaram de existir.
+
+    As linhas vão por upsert (ON CONFLICT DO UPDATE) em vez de apagar e
+    inserir de novo: no PostgreSQL (READ COMMITTED) dois saves simultâneos no
+    mesmo dia apagavam as linhas e o INSERT do segundo colidia com as que o
+    primeiro acabou de gravar (IntegrityError na unique_together).
+    """
+    modelo.objects.bulk_create(
+        linhas, batch_size=TAMANHO_LOTE, update_conflicts=True,
+        unique_fields=[coluna_periodo, 'dimensao', 'chave'], update_fields=CAMPOS_TOTAIS + ['updated_at'],
+    )
+    chaves = {(getattr(linha, coluna_periodo), linha.dimensao, linha.chave) for linha in linhas}
+    existentes = modelo.objects.filter(**{f'{coluna_periodo}__in': periodos}).values_list(
+        'id', coluna_periodo, 'dimensao', 'chave'
+    )
+    obsoletos = [resumo_id for resumo_id, *chave in existentes if tuple(chave) not in chaves]
+    if obsoletos:
+        modelo.objects.filter(id__in=obsoletos).delete()
+
+
+def recalcular_meses(meses):
+    """Recalcula os resumos mensais dos meses 'YYYY-MM' informados"""
+    meses = sorted(set(meses))
+    if not meses:
+        return
+    with transaction.atomic():
+        _gravar(ResumoMensal, 'ano_mes', meses, _agregar_meses(meses))
+
+
+def recalcular_dias(datas):
+    """Recalcula os resumos dos dias informados e dos meses que os contêm"""
+    datas = {d for d in datas if d}
+    if not datas:
+        return
+    with transaction.atomic():
+        _gravar(ResumoDiario, 'data', datas, _agregar_dias(datas))
+        recalcular_meses(d.strftime('%Y-%m') for d in datas)
+
+
+def _referencia(objeto, caminho):
+    """Segue um caminho de DIMENSOES_VIAGEM/DIMENSOES_CUSTO nos objetos em memória"""
+    for parte in caminho.split('__'):
+        objeto = getattr(objeto, parte, None) if objeto is not None else None
+    return objeto
+
+
+def _chave(dimensao, referencia):
+    campo, _ = dimensoes.DIMENSOES[MODELOS_DIMENSAO[dimensao]]
+    return getattr(referencia, campo)
+
+
+def _incrementar(modelo, coluna_periodo, deltas):
+    """Soma os deltas {(período, dimensão, chave): totais} às linhas do resumo.
+
+    Um INSERT ... ON CONFLICT DO UPDATE por lote (SQLite e PostgreSQL): a soma
+    é feita pelo banco, então cadastros simultâneos no mesmo dia não perdem
+    totais. Os decimais são arredondados a cada soma (o SQLite guarda REAL).
+    """
+    if not deltas:
+        return
+    qn = connection.ops.quote_name
+    tabela = qn(modelo._meta.db_table)
+    colunas = [coluna_periodo, 'dimensao', 'chave'] + CAMPOS_TOTAIS + ['updated_at']
+    atualizacoes = [
+        f'{qn(campo)} = ROUND({tabela}.{qn(campo)} + excluded.{qn(campo)}, 2)' if campo in CAMPOS_DINHEIRO
+        or campo == 'total_litros' else f'{qn(campo)} = {tabela}.{qn(campo)} + excluded.{qn(campo)}'
+        for campo in CAMPOS_TOTAIS
+    ] + [f'{qn("updated_at")} = excluded.{qn("updated_at")}']
+    agora = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    linhas = [
+        [periodo, dimensao, chave] + [totais[campo] for campo in CAMPOS_TOTAIS] + [agora]
+        for (periodo, dimensao, chave), totais in deltas.items()
+    ]
+    lote = max(connection.ops.bulk_batch_size(colunas, linhas), 1)
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(linhas), lote):
+            parte = linhas[inicio:inicio + lote]
+            cursor.execute(
+                f'INSERT INTO {tabela} ({", ".join(map(qn, colunas))}) '
+                f'VALUES {", ".join(["(" + ", ".join(["%s"] * len(colunas)) + ")"] * len(parte))} '
+                f'ON CONFLICT ({qn(coluna_periodo)}, {qn("dimensao")}, {qn("chave")}) '
+                f'DO UPDATE SET {", ".join(atualizacoes)}',
+                [valor for linha in parte for valor in linha],
+            )
+
+
+def somar_novos(viagens, custos):
+    """Soma viagens e custos gerais recém-inseridos aos resumos diários e mensais.
+
+    Só serve para inserções (uma alteração ou exclusão precisa de
+    recalcular_dias). As viagens e os custos já devem estar ligados às
+    dimensões e cada custo à sua viagem (custo.relatorio). São duas queries
+    (dia e mês), independente da quantidade de linhas.
+    """
+    diarios = defaultdict(totais_vazios)
+
+    def somar(data_resumo, objeto, caminhos, valores):
+        for dimensao, caminho in caminhos.items():
+            referencia = _referencia(objeto, caminho) if caminho else None
+            if caminho and referencia is None:
+                continue
+            totais = diarios[(data_resumo, dimensao, _chave(dimensao, referencia) if caminho else '')]
+            for campo, valor in valores.items():
+                totais[campo] += valor
+
+    for viagem in viagens:
+        somar(viagem.data_viagem, viagem, DIMENSOES_VIAGEM, {
+            'total_viagens': 1,
+            'total_diarias': viagem.diarias,
+            'total_valor_diarias': viagem.valor_diarias,
+            'total_litros': viagem.litros_gasolina,
+            'total_gasto_gasolina': viagem.gasto_gasolina,
+            'total_receita_frete': viagem.receita_frete,
+        })
+    for custo in custos:
+        somar(custo.data, custo, DIMENSOES_CUSTO, {'total_custos_gerais': custo.valor})
+
+    mensais = defaultdict(totais_vazios)
+    for (data_resumo, dimensao, chave), totais in diarios.items():
+        mes = mensais[(data_resumo.strftime('%Y-%m'), dimensao, chave)]
+        for campo in CAMPOS_TOTAIS:
+            mes[campo] += totais[campo]
+
+    _incrementar(ResumoDiario, 'data', {
+        (connection.ops.adapt_datefield_value(data_resumo), dimensao, chave): totais
+        for (data_resumo, dimensao, chave), totais in diarios.items()
+    })
+    _incrementar(ResumoMensal, 'ano_mes', mensais)
+
+
+def reconstruir():
+    """Apaga e reconstrói todos os resumos a partir das tabelas brutas.
+
+    Invalida o cache de relatórios dos meses que tinham ou passam a ter
+    resumos (e a versão geral): totais, relatórios e o dashboard em cache
+    foram calculados com os resumos antigos.
+    """
+    with transaction.atomic():
+        meses_anteriores = set(ResumoMensal.objects.values_list('ano_mes', flat=True).distinct())
+        ResumoDiario.objects.all().delete()
+        ResumoMensal.objects.all().delete()
+        diarios = _agregar_dias()
+        ResumoDiario.objects.bulk_create(diarios, batch_size=TAMANHO_LOTE)
+        meses = {resumo.data.strftime('%Y-%m') for resumo in diarios}
+        ResumoMensal.objects.bulk_create(_agregar_meses(sorted(meses)), batch_size=TAMANHO_LOTE)
+        cache_relatorios.invalidar_meses(meses_anteriores | meses | {cache_relatorios.VERSAO_GERAL})
+    return len(diarios), len(meses)
+
+
+def totais_periodo(data_inicio, data_fim):
+    """Totais gerais de viagens e custos gerais entre duas datas (inclusive)"""
+    totais = ResumoDiario.objects.filter(
+        dimensao='geral', data__range=[data_inicio, data_fim]
+    ).aggregate(**_somas(CAMPOS_TOTAIS))
+    return {campo: _valor(campo, totais[campo]) for campo in CAMPOS_TOTAIS}
+
+
+def totais_mes(ano_mes):
+    """Totais gerais de um mês 'YYYY-MM' lidos de uma única linha de ResumoMensal"""
+    resumo = ResumoMensal.objects.filter(ano_mes=ano_mes, dimensao='geral', chave='').first()
+    if not resumo:
+        return totais_vazios()
+    return {campo: getattr(resumo, campo) for campo in CAMPOS_TOTAIS}
+
+
+def resumo_por(dimensao, data_inicio, data_fim):
+    """Totais de viagens por motorista ou caminhão no período, no formato de values().annotate()"""
+    linhas = ResumoDiario.objects.filter(
+        dimensao=dimensao, data__range=[data_inicio, data_fim], total_viagens__gt=0
+    ).values('chave').annotate(
+        **_somas(CAMPOS_VIAGEM)
+    ).order_by('chave')
+    return [
+        {
+            dimensao: linha['chave'],
+            **{campo: _valor(campo, linha[campo]) for campo in CAMPOS_VIAGEM if campo != 'total_litros'}
+        }
+        for linha in linhas
+    ]
@@ -0,0 +1,109 @@
+"""Receivers que mantêm os dados derivados (resumos e cache de relatórios) em dia com as tabelas brutas"""
+from datetime import date
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import busca, cache_relatorios, custos_fixos, dimensoes, resumos, sincronizacao
+from .models import DailyReport, CustosGerais, CustoFixoMensal, MonthlyCost, MotoristaSalario
+
+
+def datas_alteradas(datas):
+    """Atualiza os resumos e invalida o cache dos dias informados.
+
+    Chamado pelos receivers e pelos caminhos que não disparam signals
+    (SQL direto, bulk_create/bulk_update).
+    """
+    datas = {d for d in datas if d}
+    resumos.recalcular_dias(datas)
+    cache_relatorios.invalidar_datas(datas)
+
+
+@receiver(pre_save, sender=DailyReport)
+@receiver(pre_save, sender=CustosGerais)
+@receiver(pre_save, sender=MotoristaSalario)
+def ligar_dimensoes(sender, instance, **kwargs):
+    """Liga o registro ao Motorista/Caminhao do texto informado antes de gravar"""
+    dimensoes.preencher_referencias([instance])
+
+
+@receiver(pre_save, sender=CustosGerais)
+def atualizar_texto_busca(sender, instance, **kwargs):
+    """Mantém o texto normalizado da busca de custos em dia com oficina, descrição e placa"""
+    busca.preencher_texto([instance])
+
+
+@receiver(pre_save, sender=DailyReport)
+@receiver(pre_save, sender=CustosGerais)
+def guardar_data_anterior(sender, instance, **kwargs):
+    """Guarda a data atual do registro para recalcular também o dia de origem após a alteração"""
+    campo = 'data_viagem' if sender is DailyReport else 'data'
+    instance._data_anterior = None
+    if instance.pk:
+        instance._data_anterior = sender.objects.filter(pk=instance.pk).values_list(campo, flat=True).first()
+
+
+@receiver(pre_save, sender=CustoFixoMensal)
+def guardar_vigencia_anterior(sender, instance, **kwargs):
+    """Guarda a vigência atual do custo fixo para invalidar também os meses de origem"""
+    instance._vigencia_anterior = None
+    if instance.pk:
+        instance._vigencia_anterior = sender.objects.filter(pk=instance.pk).values_list(
+            'data_inicio', 'data_fim'
+        ).first()
+
+
+@receiver(pre_save, sender=MonthlyCost)
+@receiver(pre_save, sender=MotoristaSalario)
+def guardar_ano_mes_anterior(sender, instance, **kwargs):
+    instance._ano_mes_anterior = None
+    if instance.pk:
+        instance._ano_mes_anterior = sender.objects.filter(pk=instance.pk).values_list('ano_mes', flat=True).first()
+
+
+def _como_data(valor):
+    # Algumas views atribuem a data como string 'YYYY-MM-DD' antes do save()
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def _datas_afetadas(instance, campo):
+    return {getattr(instance, '_data_anterior', None), _como_data(getattr(instance, campo))}
+
+
+@receiver(post_save, sender=DailyReport)
+@receiver(post_delete, sender=DailyReport)
+def atualizar_resumos_viagem(sender, instance, **kwargs):
+    datas_alteradas(_datas_afetadas(instance, 'data_viagem'))
+
+
+@receiver(post_save, sender=CustosGerais)
+@receiver(post_delete, sender=CustosGerais)
+def atualizar_resumos_custo(sender, instance, **kwargs):
+    datas_alteradas(_datas_afetadas(instance, 'data'))
+
+
+@receiver(post_save, sender=CustoFixoMensal)
+@receiver(post_delete, sender=CustoFixoMensal)
+def invalidar_cache_custo_fixo(sender, instance, **kwargs):
+    vigencia_anterior = getattr(instance, '_vigencia_anterior', None)
+    if vigencia_anterior:
+        cache_relatorios.invalidar_vigencia(*vigencia_anterior)
+    cache_relatorios.invalidar_vigencia(_como_data(instance.data_inicio), _como_data(instance.data_fim))
+    custos_fixos.invalidar_indice()
+
+
+@receiver(post_save, sender=MonthlyCost)
+@receiver(post_delete, sender=MonthlyCost)
+@receiver(post_save, sender=MotoristaSalario)
+@receiver(post_delete, sender=MotoristaSalario)
+def invalidar_cache_mes(sender, instance, **kwargs):
+    cache_relatorios.invalidar_meses({getattr(instance, '_ano_mes_anterior', None), instance.ano_mes})
+
+
+@receiver(post_delete, sender=DailyReport)
+@receiver(post_delete, sender=CustosGerais)
+@receiver(post_delete, sender=CustoFixoMensal)
+def registrar_exclusao(sender, instance, **kwargs):
+    """Grava a marca de exclusão lida pela sincronização incremental"""
+    modelo = {DailyReport: 'relatorio', CustosGerais: 'custo_geral', CustoFixoMensal: 'custo_fixo'}[sender]
+    sincronizacao.registrar_exclusoes(modelo, [instance.pk])
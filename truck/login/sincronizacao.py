@@ -0,0 +1,141 @@
+"""Sincronização incremental: registros criados, alterados ou excluídos desde um token.
+
+O token codifica um instante. As alterações vêm de `updated_at` e as
+exclusões da tabela RegistroExcluido (tombstones gravados pelos signals e
+pelos caminhos de SQL direto). O próximo token é o instante da consulta
+menos JANELA_SEGURANCA: transações que gravaram antes e confirmaram depois
+ainda aparecem na próxima chamada. O cliente aplica as linhas por id, então
+receber a mesma linha duas vezes é inofensivo.
+
+As marcas de exclusão são mantidas por SINCRONIZACAO_RETENCAO_DIAS
+(limpar_exclusoes, chamado pelo worker e pelo comando limpar_exclusoes). Um
+token mais antigo que isso pode ter perdido exclusões já apagadas, então
+recebe uma carga completa em vez das alterações.
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import dinheiro
+from .models import DailyReport, CustosGerais, CustoFixoMensal, RegistroExcluido
+from .relatorios import CAMPOS_RELATORIO, serializar_relatorios
+
+JANELA_SEGURANCA = timedelta(seconds=30)
+
+# Nome do grupo na resposta -> valor de RegistroExcluido.modelo
+MODELOS = {
+    'relatorios': 'relatorio',
+    'custos_gerais': 'custo_geral',
+    'custos_fixos': 'custo_fixo',
+}
+
+
+class TokenInvalido(ValueError):
+    """Token de sincronização malformado"""
+
+
+def codificar_token(momento):
+    return base64.urlsafe_b64encode(momento.isoformat().encode()).decode().rstrip('=')
+
+
+def decodificar_token(token):
+    try:
+        preenchimento = '=' * (-len(token) % 4)
+        momento = datetime.fromisoformat(base64.urlsafe_b64decode(token + preenchimento).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise TokenInvalido(f'Token inválido: {token}') from e
+    if timezone.is_naive(momento):
+        raise TokenInvalido(f'Token inválido: {token}')
+    return momento
+
+
+def _retencao():
+    return timedelta(days=getattr(settings, 'SINCRONIZACAO_RETENCAO_DIAS', 30))
+
+
+def registrar_exclusoes(modelo, ids):
+    """Grava as marcas de exclusão (usado pelos signals e pelos deletes em SQL direto)"""
+    RegistroExcluido.objects.bulk_create(
+        [RegistroExcluido(modelo=modelo, objeto_id=objeto_id) for objeto_id in ids]
+    )
+
+
+def serializar_custo_geral(custo):
+    return {
+        'id': custo.id,
+        'relatorio_id': custo.relatorio_id,
+        'data': custo.data.isoformat(),
+        'tipo_gasto': custo.tipo_gasto,
+        'tipo_gasto_display': custo.get_tipo_gasto_display(),
+        'oficina_fornecedor': custo.oficina_fornecedor,
+        'descricao': custo.descricao,
+        'valor': dinheiro.para_json(dinheiro.centavos(custo.valor)),
+        'forma_pagamento': custo.get_forma_pagamento_display(),
+        'status_pagamento': custo.get_status_pagamento_display(),
+        'veiculo_placa': custo.veiculo_placa,
+        'data_vencimento': custo.data_vencimento.strftime('%d/%m/%Y') if custo.data_vencimento else None,
+        'observacoes': custo.observacoes,
+    }
+
+
+def serializar_custo_fixo(custo):
+    return {
+        'id': custo.id,
+        'descricao': custo.descricao,
+        'tipo_custo': custo.tipo_custo,
+        'tipo_custo_display': custo.get_tipo_custo_display(),
+        'valor_mensal': dinheiro.para_json(dinheiro.centavos(custo.valor_mensal)),
+        'data_inicio': custo.data_inicio.strftime('%Y-%m-%d'),
+        'data_fim': custo.data_fim.strftime('%Y-%m-%d') if custo.data_fim else None,
+        'status': custo.status,
+        'status_display': custo.get_status_display(),
+        'observacoes': custo.observacoes,
+        'created_at': custo.created_at.strftime('%Y-%m-%d %H:%M')
+    }
+
+
+def alteracoes(token=None):
+    """Registros alterados e ids excluídos desde o token (tudo, se não houver token).
+
+    Retorna {'token', 'completo', 'relatorios', 'custos_gerais', 'custos_fixos', 'excluidos'};
+    'completo' indica uma carga inicial, que substitui a cópia local do cliente.
+    """
+    agora = timezone.now()
+    desde = decodificar_token(token) if token else None
+    if desde and desde < agora - _retencao():
+        # As marcas de exclusão desse período já podem ter sido apagadas
+        desde = None
+    proximo_token = codificar_token(agora - JANELA_SEGURANCA)
+
+    relatorios = DailyReport.objects.all()
+    custos_gerais = CustosGerais.objects.all()
+    custos_fixos = CustoFixoMensal.objects.all()
+    excluidos = {grupo: [] for grupo in MODELOS}
+    if desde:
+        relatorios = relatorios.filter(updated_at__gt=desde)
+        custos_gerais = custos_gerais.filter(updated_at__gt=desde)
+        custos_fixos = custos_fixos.filter(updated_at__gt=desde)
+
+        grupos = {modelo: grupo for grupo, modelo in MODELOS.items()}
+        for modelo, objeto_id in RegistroExcluido.objects.filter(excluido_em__gt=desde).values_list(
+            'modelo', 'objeto_id'
+        ):
+            excluidos[grupos[modelo]].append(objeto_id)
+
+    return {
+        'token': proximo_token,
+        'completo': desde is None,
+        'relatorios': serializar_relatorios(list(relatorios.order_by('id').values(*CAMPOS_RELATORIO))),
+        'custos_gerais': [serializar_custo_geral(custo) for custo in custos_gerais.order_by('id')],
+        'custos_fixos': [serializar_custo_fixo(custo) for custo in custos_fixos.order_by('id')],
+        'excluidos': excluidos,
+    }
+
+
+def limpar_exclusoes():
+    """Apaga as marcas de exclusão mais antigas que a retenção da sincronização"""
+    total, _ = RegistroExcluido.objects.filter(excluido_em__lt=timezone.now() - _retencao()).delete()
+    return total
@@ -3,6 +3,12 @@ let reports = [];
 let currentWeekData = { gastos: 0, lucros: 0, lucroLiquido: 0 };
 let custosGeraisRelatorio = [];
 
+// Lista de relatórios anteriores: páginas de listar-relatorios carregadas sob demanda
+// (independente da janela dos resumos, para que as viagens antigas continuem acessíveis)
+const TAMANHO_PAGINA_ANTERIORES = 50;
+let relatoriosAnteriores = [];
+let cursorRelatoriosAnteriores = null;
+
 // ===== FUNÇÕES PRINCIPAIS =====
 
 // Função para buscar relatório por data específica
@@ -57,29 +63,76 @@ function buscarRelatorioPorData() {
     });
 }
 
-// Carregar relatórios do servidor
+// Carregar relatórios do servidor (apenas a janela usada pelos resumos semanal e mensal)
 async function carregarRelatoriosDoServidor() {
     try {
-        const response = await fetch('/login/listar-relatorios/');
-        
-        if (response.ok) {
+        const hoje = new Date();
+        const inicioSemana = new Date(hoje);
+        inicioSemana.setDate(hoje.getDate() - hoje.getDay());
+        const inicioMes = new Date(hoje.getFullYear(), hoje.getMonth(), 1);
+        const inicioJanela = inicioSemana < inicioMes ? inicioSemana : inicioMes;
+        const dataInicio = `${inicioJanela.getFullYear()}-${String(inicioJanela.getMonth() + 1).padStart(2, '0')}-${String(inicioJanela.getDate()).padStart(2, '0')}`;
+
+        const carregados = [];
+        let cursor = null;
+        do {
+            const params = new URLSearchParams({ data_inicio: dataInicio, limite: '200' });
+            if (cursor) {
+                params.set('cursor', cursor);
+            }
+            const response = await fetch(`/login/listar-relatorios/?${params.toString()}`);
+
+            if (!response.ok) {
+                console.error('Erro ao carregar relatórios:', response.status);
+                return;
+            }
             const data = await response.json();
-            reports = data.relatorios || [];
-            
-            // Usar requestAnimationFrame para atualizações
-            requestAnimationFrame(() => {
-                updateWeekSummary();
-                updateMonthSummary();
-                updatePreviousReportsList();
-            });
-        } else {
-            console.error('Erro ao carregar relatórios:', response.status);
-        }
+            carregados.push(...(data.relatorios || []));
+            cursor = data.next_cursor;
+        } while (cursor);
+
+        reports = carregados;
+
+        // Usar requestAnimationFrame para atualizações
+        requestAnimationFrame(() => {
+            updateWeekSummary();
+            updateMonthSummary();
+        });
+
+        // Primeira página da lista de relatórios anteriores (as demais pelo botão "Carregar mais")
+        await carregarRelatoriosAnteriores(true);
     } catch (error) {
         console.error('Erro ao carregar relatórios:', error);
     }
 }
 
+// Carregar a próxima página da lista de relatórios anteriores (reiniciar = voltar à primeira)
+async function carregarRelatoriosAnteriores(reiniciar = false) {
+    try {
+        if (reiniciar) {
+            relatoriosAnteriores = [];
+            cursorRelatoriosAnteriores = null;
+        }
+        const params = new URLSearchParams({ limite: String(TAMANHO_PAGINA_ANTERIORES) });
+        if (cursorRelatoriosAnteriores) {
+            params.set('cursor', cursorRelatoriosAnteriores);
+        }
+        const response = await fetch(`/login/listar-relatorios/?${params.toString()}`);
+
+        if (!response.ok) {
+            console.error('Erro ao carregar relatórios anteriores:', response.status);
+            return;
+        }
+        const data = await response.json();
+        relatoriosAnteriores.push(...(data.relatorios || []));
+        cursorRelatoriosAnteriores = data.next_cursor;
+
+        requestAnimationFrame(updatePreviousReportsList);
+    } catch (error) {
+        console.error('Erro ao carregar relatórios anteriores:', error);
+    }
+}
+
 // Alternar entre resumo semanal e mensal
 function alternarResumo(tipo) {
     const btnSemanal = document.getElementById('btnSemanal');
@@ -503,7 +556,8 @@ function viewReportSummary(reportId) {
     
     // Usar requestAnimationFrame para evitar bloqueios
     requestAnimationFrame(() => {
-        const report = reports.find(r => r.id === reportId);
+        // A viagem pode estar só nas páginas carregadas da lista de relatórios anteriores
+        const report = reports.find(r => r.id === reportId) || relatoriosAnteriores.find(r => r.id === reportId);
         
         if (!report) {
             console.error('Relatório não encontrado no array. ID:', reportId);
@@ -830,6 +884,7 @@ async function deleteReport(reportId) {
                 
                 // Remover da lista local
                 reports = reports.filter(r => r.id !== reportId);
+                relatoriosAnteriores = relatoriosAnteriores.filter(r => r.id !== reportId);
                 
                 // Atualizar resumos
                 updateWeekSummary();
@@ -1452,9 +1507,6 @@ async function atualizarDashboardCompleto() {
         updateWeekSummary();
         updateMonthSummary();
         
-        // Atualizar lista de relatórios anteriores
-        updatePreviousReportsList();
-        
         // Recarregar custos fixos se o modal estiver aberto
         const custosFixosModal = document.getElementById('custosFixosModal');
         if (custosFixosModal && !custosFixosModal.classList.contains('hidden')) {
@@ -1640,17 +1692,37 @@ function getTipoDisplay(tipo) {
 // ===== FUNÇÕES ADICIONAIS =====
 
 function updatePreviousReportsList() {
-    if (reports.length > 0) {
+    if (relatoriosAnteriores.length > 0) {
         const container = document.getElementById('relatoriosAnteriores');
         if (container) {
             container.innerHTML = `
                 <div class="text-center text-gray-400 py-4">
-                    ${reports.length} relatório(s) encontrado(s)
+                    ${relatoriosAnteriores.length} relatório(s) carregado(s)
                 </div>
             `;
         }
-        mostrarResultadosBusca(reports);
+        mostrarResultadosBusca({ relatorios: relatoriosAnteriores }, 'Relatórios Anteriores');
+
+        // Há mais páginas no servidor: botão para carregar a próxima
+        const resultadosDiv = document.getElementById('resultadosBusca');
+        if (resultadosDiv && cursorRelatoriosAnteriores) {
+            resultadosDiv.insertAdjacentHTML('beforeend', `
+                <div class="text-center mb-6 sm:mb-8">
+                    <button id="btnCarregarMaisRelatorios" onclick="carregarMaisRelatoriosAnteriores(this)" class="bg-blue-600 hover:bg-blue-700 text-white px-6 py-2 rounded-lg text-sm font-semibold transition-colors">
+                        ⬇️ Carregar mais
+                    </button>
+                </div>
+            `);
+        }
+    }
+}
+
+async function carregarMaisRelatoriosAnteriores(botao) {
+    if (botao) {
+        botao.disabled = true;
+        botao.textContent = 'Carregando...';
     }
+    await carregarRelatoriosAnteriores();
 }
 
 function atualizarTodasAsSecoes() {
@@ -1896,6 +1968,7 @@ window.irParaRelatorioDiario = irParaRelatorioDiario;
 window.irParaRelatorioSemanal = irParaRelatorioSemanal;
 window.irParaRelatorioMensal = irParaRelatorioMensal;
 window.alternarResumo = alternarResumo;
+window.carregarMaisRelatoriosAnteriores = carregarMaisRelatoriosAnteriores;
 window.viewReportSummary = viewReportSummary;
 window.editReport = editReport;
 window.deleteReport = deleteReport;
@@ -0,0 +1,171 @@
+"""Fila de tarefas pesadas (relatórios e exportações) no próprio banco, sem broker externo.
+
+A view cria um Job pendente (enfileirar) e responde na hora; o processo
+`manage.py run_worker` reserva as tarefas pendentes, executa o tipo
+registrado com @tarefa e grava o resultado JSON e/ou o arquivo para
+download. O cliente acompanha pelo endpoint de status.
+
+A reserva é um UPDATE condicional (só se a tarefa ainda estiver pendente):
+vários workers podem disputar a fila sem executar a mesma tarefa duas vezes,
+no SQLite e no PostgreSQL. Uma tarefa que falha volta para a fila até
+JOBS_MAX_TENTATIVAS; uma que ficou em execução além de JOBS_TEMPO_MAXIMO
+(worker encerrado no meio) é liberada para outro worker.
+"""
+import logging
+import tempfile
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import F
+from django.utils import timezone
+
+from . import exportacao, resumos
+from .models import Job
+from .relatorios import dados_relatorios_mes
+
+logger = logging.getLogger(__name__)
+
+# Tipo -> função que recebe o Job e retorna o resultado JSON (pode gravar job.arquivo)
+TIPOS = {}
+
+
+class TarefaDesconhecida(ValueError):
+    """Tipo de tarefa sem função registrada"""
+
+
+def tarefa(nome):
+    """Registra a função que executa as tarefas do tipo informado"""
+    def registrar(funcao):
+        TIPOS[nome] = funcao
+        return funcao
+    return registrar
+
+
+def _max_tentativas():
+    return getattr(settings, 'JOBS_MAX_TENTATIVAS', 3)
+
+
+def _data(valor):
+    return date.fromisoformat(valor) if valor else None
+
+
+@tarefa('relatorio_mensal')
+def _relatorio_mensal(job):
+    """Os mesmos dados da API de relatórios por mês, calculados do banco.
+
+    Sem o cache de relatórios: o worker é outro processo (no Render, outro
+    serviço) e não vê as invalidações feitas pelos signals do processo web.
+    """
+    ano_mes = job.parametros['ano_mes']
+    resumos.limites_mes(ano_mes)  # valida o mês antes de consultar
+    return dados_relatorios_mes(ano_mes)
+
+
+@tarefa('exportacao')
+def _exportacao(job):
+    """Grava a exportação CSV/XLSX em um arquivo, em blocos, e o anexa ao job"""
+    tipo, formato = job.parametros['tipo'], job.parametros['formato']
+    data_inicio = _data(job.parametros.get('data_inicio'))
+    data_fim = _data(job.parametros.get('data_fim'))
+    nome_arquivo = f"{tipo}_{data_inicio or 'inicio'}_{data_fim or 'hoje'}.{formato}"
+
+    with tempfile.TemporaryFile() as destino:
+        for parte in exportacao.exportar(tipo, formato, data_inicio, data_fim):
+            destino.write(parte.encode('utf-8') if isinstance(parte, str) else parte)
+        destino.seek(0)
+        job.arquivo.save(nome_arquivo, File(destino), save=False)
+    return {'nome_arquivo': nome_arquivo, 'content_type': exportacao.FORMATOS[formato]}
+
+
+@tarefa('reconstruir_resumos')
+def _reconstruir_resumos(job):
+    total_dias, total_meses = resumos.reconstruir()
+    return {'linhas_diarias': total_dias, 'meses': total_meses}
+
+
+def enfileirar(tipo, parametros=None, usuario=None):
+    """Cria a tarefa pendente; o worker a executa assim que estiver livre"""
+    if tipo not in TIPOS:
+        raise TarefaDesconhecida(f'Tipo de tarefa desconhecido: {tipo}')
+    job = Job.objects.create(tipo=tipo, parametros=parametros or {}, usuario=usuario)
+    logger.info(f'Tarefa {tipo} #{job.id} enfileirada')
+    return job
+
+
+def reservar():
+    """Reserva a tarefa pendente mais antiga para este worker; None se a fila está vazia"""
+    pendentes = Job.objects.filter(status='pendente').order_by('created_at', 'id')
+    while True:
+        job_id = pendentes.values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        agora = timezone.now()
+        # Outro worker pode ter reservado a mesma tarefa entre o SELECT e o UPDATE: aí tenta a próxima
+        if Job.objects.filter(id=job_id, status='pendente').update(
+            status='executando', tentativas=F('tentativas') + 1, iniciado_em=agora, updated_at=agora
+        ):
+            return Job.objects.get(id=job_id)
+
+
+def executar(job):
+    """Executa uma tarefa reservada e grava o resultado (ou o erro, devolvendo-a à fila se couber)"""
+    try:
+        funcao = TIPOS.get(job.tipo)
+        if funcao is None:
+            raise TarefaDesconhecida(f'Tipo de tarefa desconhecido: {job.tipo}')
+        job.resultado = funcao(job)
+    except Exception as e:
+        logger.error(f'Erro na tarefa {job.tipo} #{job.id} (tentativa {job.tentativas}): {e}', exc_info=True)
+        job.erro = f'{type(e).__name__}: {e}'
+        if job.tipo in TIPOS and job.tentativas < _max_tentativas():
+            job.status = 'pendente'
+        else:
+            job.status = 'erro'
+            job.concluido_em = timezone.now()
+        job.save(update_fields=['status', 'erro', 'concluido_em', 'updated_at'])
+        return job
+
+    job.status = 'concluido'
+    job.erro = ''
+    job.concluido_em = timezone.now()
+    job.save(update_fields=['status', 'resultado', 'arquivo', 'erro', 'concluido_em', 'updated_at'])
+    logger.info(f'Tarefa {job.tipo} #{job.id} concluída em {(job.concluido_em - job.iniciado_em).total_seconds():.2f}s')
+    return job
+
+
+def processar_proxima():
+    """Reserva e executa a próxima tarefa; retorna o job processado ou None se não havia nenhuma"""
+    job = reservar()
+    return executar(job) if job else None
+
+
+def liberar_travadas(tempo_maximo=None):
+    """Devolve à fila as tarefas em execução há mais de tempo_maximo segundos (worker encerrado no meio)"""
+    tempo_maximo = tempo_maximo or getattr(settings, 'JOBS_TEMPO_MAXIMO', 900)
+    agora = timezone.now()
+    travadas = Job.objects.filter(status='executando', iniciado_em__lt=agora - timedelta(seconds=tempo_maximo))
+    esgotadas = travadas.filter(tentativas__gte=_max_tentativas()).update(
+        status='erro', erro='Tempo máximo de execução excedido', concluido_em=agora, updated_at=agora
+    )
+    liberadas = travadas.update(status='pendente', updated_at=agora)
+    if liberadas or esgotadas:
+        logger.warning(f'Tarefas travadas: {liberadas} devolvidas à fila, {esgotadas} com erro')
+    return liberadas, esgotadas
+
+
+def limpar_antigas(dias=None):
+    """Apaga as tarefas terminadas há mais de `dias` dias, com os arquivos gerados"""
+    dias = dias or getattr(settings, 'JOBS_RETENCAO_DIAS', 7)
+    antigas = Job.objects.filter(
+        status__in=['concluido', 'erro'], concluido_em__lt=timezone.now() - timedelta(days=dias)
+    )
+    total = 0
+    for job in antigas.iterator():
+        if job.arquivo:
+            job.arquivo.delete(save=False)
+        job.delete()
+        total += 1
+    if total:
+        logger.info(f'{total} tarefas antigas apagadas')
+    return total
@@ -1,3 +1,1658 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import busca, comprovantes, dimensoes, dinheiro, frota, importacao, lucro, painel, resumos, sincronizacao, tarefas, urls, views
+from .models import (
+    Caminhao, DailyReport, Job, MonthlyCost, Motorista, MotoristaSalario, CustosGerais, CustoFixoMensal,
+    RegistroExcluido, ResumoDiario, ResumoMensal,
+)
+from .middleware import PerfilRequisicoesMiddleware, assinatura_sql
+from .custos_fixos import IndiceCustosFixos, carregar_indice
+from .totais import calcular_totais
+from PIL import Image
+
+
+def criar_viagens(quantidade, inicio=date(2025, 1, 1), custos_por_viagem=2):
+    """Cria viagens com salário e custos gerais para os testes"""
+    viagens = []
+    for i in range(quantidade):
+        data_viagem = inicio + timedelta(days=i)
+        motorista = f'Motorista {i % 3}'
+        viagem = DailyReport.objects.create(
+            data_viagem=data_viagem,
+            partida='Origem',
+            chegada='Destino',
+            diarias=1 + i % 2,
+            litros_gasolina=Decimal('100.00'),
+            gasto_gasolina=Decimal('550.00'),
+            receita_frete=Decimal('2000.00'),
+            motorista=motorista,
+            caminhao=f'Caminhão {i % 2}',
+        )
+        MotoristaSalario.objects.get_or_create(
+            motorista=motorista,
+            ano_mes=data_viagem.strftime('%Y-%m'),
+            defaults={'salario_base': Decimal('1500.00')},
+        )
+        for j in range(custos_por_viagem):
+            CustosGerais.objects.create(
+                relatorio=viagem,
+                tipo_gasto='pedagio',
+                data=data_viagem,
+                veiculo_placa=viagem.caminhao,
+                oficina_fornecedor='Fornecedor',
+                descricao=f'Custo {j}',
+                valor=Decimal('10.50'),
+                forma_pagamento='pix',
+                status_pagamento='pago' if j % 2 == 0 else 'nao_pago',
+            )
+        viagens.append(viagem)
+    return viagens
+
+
+class ListarRelatoriosTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='teste', password='senha-teste')
+        self.client.force_login(self.user)
+
+    def _contar_queries(self):
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(reverse('listar_relatorios'))
+        self.assertEqual(response.status_code, 200)
+        return len(contexto.captured_queries), response.json()['relatorios']
+
+    def test_numero_de_queries_nao_cresce_com_as_viagens(self):
+        criar_viagens(3)
+        queries_poucas, relatorios = self._contar_queries()
+        self.assertEqual(len(relatorios), 3)
+
+        criar_viagens(20, inicio=date(2025, 3, 1))
+        queries_muitas, relatorios = self._contar_queries()
+        self.assertEqual(len(relatorios), 23)
+        self.assertEqual(queries_poucas, queries_muitas)
+
+    def test_totais_e_lucro_por_viagem(self):
+        viagem = criar_viagens(1)[0]
+        _, relatorios = self._contar_queries()
+        relatorio = relatorios[0]
+
+        self.assertEqual(relatorio['id'], viagem.id)
+        self.assertEqual(relatorio['totalCustosGerais'], 21.0)
+        self.assertEqual(relatorio['salarioLiquido'], 1500.0)
+        self.assertEqual(relatorio['totalDespesas'], 550.0 + 70.0 + 1500.0 + 21.0)
+        self.assertEqual(relatorio['lucroLiquido'], 2000.0 - (550.0 + 70.0 + 1500.0 + 21.0))
+        self.assertEqual(relatorio['parcelasPagas'], 1)
+        self.assertEqual(relatorio['parcelasPendentes'], 1)
+
+    def test_paginacao_por_cursor_percorre_todas_as_viagens(self):
+        viagens = criar_viagens(5, custos_por_viagem=0)
+        esperado = [v.id for v in sorted(viagens, key=lambda v: v.data_viagem, reverse=True)]
+
+        recebidos, cursor = [], None
+        while True:
+            params = {'limite': 2}
+            if cursor:
+                params['cursor'] = cursor
+            dados = self.client.get(reverse('listar_relatorios'), params).json()
+            self.assertLessEqual(len(dados['relatorios']), 2)
+            recebidos += [r['id'] for r in dados['relatorios']]
+            cursor = dados['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(recebidos, esperado)
+
+    def test_filtros_no_servidor(self):
+        criar_viagens(6, custos_por_viagem=0)
+        dados = self.client.get(reverse('listar_relatorios'), {
+            'motorista': 'Motorista 0',
+            'data_inicio': '2025-01-02',
+            'data_fim': '2025-01-06',
+        }).json()
+        self.assertEqual([r['date'] for r in dados['relatorios']], ['2025-01-04'])
+        self.assertIsNone(dados['next_cursor'])
+
+    def test_cursor_invalido(self):
+        response = self.client.get(reverse('listar_relatorios'), {'cursor': 'nao-e-um-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ResumosTests(TestCase):
+    def test_resumos_acompanham_inclusao_alteracao_e_exclusao(self):
+        viagem = criar_viagens(1)[0]
+
+        totais = resumos.totais_periodo(date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual(totais['total_viagens'], 1)
+        self.assertEqual(totais['total_receita_frete'], Decimal('2000.00'))
+        self.assertEqual(totais['total_custos_gerais'], Decimal('21.00'))
+        self.assertEqual(resumos.totais_mes('2025-01')['total_valor_diarias'], Decimal('70.00'))
+
+        # Mover a viagem para outro mês recalcula os dois meses
+        viagem.data_viagem = date(2025, 2, 10)
+        viagem.save()
+        self.assertEqual(resumos.totais_mes('2025-01')['total_viagens'], 0)
+        self.assertEqual(resumos.totais_mes('2025-02')['total_viagens'], 1)
+
+        viagem.delete()
+        self.assertEqual(resumos.totais_mes('2025-02'), resumos.totais_vazios())
+        self.assertFalse(ResumoMensal.objects.filter(ano_mes='2025-01', total_custos_gerais__gt=0).exists())
+
+    def test_recalcular_tolera_save_simultaneo_no_mesmo_dia(self):
+        viagem = criar_viagens(1)[0]
+        agregar_dias, agregar_meses = resumos._agregar_dias, resumos._agregar_meses
+
+        # Outra requisição grava as mesmas chaves entre o cálculo e a gravação desta
+        def dias_com_concorrente(datas):
+            ResumoDiario.objects.filter(data__in=datas).delete()
+            ResumoDiario.objects.bulk_create(agregar_dias(datas))
+            return agregar_dias(datas)
+
+        def meses_com_concorrente(meses):
+            ResumoMensal.objects.filter(ano_mes__in=meses).delete()
+            ResumoMensal.objects.bulk_create(agregar_meses(meses))
+            return agregar_meses(meses)
+
+        viagem.motorista = 'Motorista 9'
+        with mock.patch.object(resumos, '_agregar_dias', dias_com_concorrente), \
+                mock.patch.object(resumos, '_agregar_meses', meses_com_concorrente):
+            viagem.save()
+
+        chaves = set(ResumoDiario.objects.filter(dimensao='motorista').values_list('chave', flat=True))
+        self.assertEqual(chaves, {'Motorista 9'})
+        self.assertEqual(resumos.totais_mes('2025-01')['total_viagens'], 1)
+        self.assertFalse(ResumoMensal.objects.filter(dimensao='motorista', chave='Motorista 0').exists())
+
+    def test_resumo_por_motorista_e_caminhao(self):
+        criar_viagens(4)
+        por_motorista = resumos.resumo_por('motorista', date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual(
+            [(linha['motorista'], linha['total_viagens']) for linha in por_motorista],
+            [('Motorista 0', 2), ('Motorista 1', 1), ('Motorista 2', 1)]
+        )
+        por_caminhao = resumos.resumo_por('caminhao', date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual(sum(linha['total_diarias'] for linha in por_caminhao), 6)
+
+    def test_reconstruir_gera_os_mesmos_resumos(self):
+        criar_viagens(10)
+        antes = list(ResumoDiario.objects.order_by('data', 'dimensao', 'chave').values_list(
+            'data', 'dimensao', 'chave', 'total_viagens', 'total_receita_frete', 'total_custos_gerais'
+        ))
+        ResumoDiario.objects.all().delete()
+        ResumoMensal.objects.all().delete()
+
+        resumos.reconstruir()
+
+        depois = list(ResumoDiario.objects.order_by('data', 'dimensao', 'chave').values_list(
+            'data', 'dimensao', 'chave', 'total_viagens', 'total_receita_frete', 'total_custos_gerais'
+        ))
+        self.assertEqual(antes, depois)
+        self.assertEqual(resumos.totais_mes('2025-01')['total_viagens'], 10)
+
+
+class TotaisRelatorioTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='teste', password='senha-teste')
+        self.client.force_login(self.user)
+        criar_viagens(6)
+        MonthlyCost.objects.create(ano_mes='2025-01', pecas=Decimal('100.00'))
+        CustoFixoMensal.objects.create(
+            descricao='Seguro', tipo_custo='seguro', valor_mensal=Decimal('310.00'),
+            data_inicio=date(2024, 6, 1)
+        )
+        # Ativo só na segunda metade de janeiro: entra proporcionalmente
+        CustoFixoMensal.objects.create(
+            descricao='IPVA', tipo_custo='ipva', valor_mensal=Decimal('62.00'),
+            data_inicio=date(2025, 1, 17), data_fim=date(2025, 3, 1)
+        )
+
+    def test_calcular_totais_do_mes(self):
+        totais = calcular_totais(date(2025, 1, 1), date(2025, 1, 31), ano_mes='2025-01')
+        self.assertEqual(totais['total_viagens'], 6)
+        self.assertEqual(totais['total_receita_frete'], Decimal('12000.00'))
+        self.assertEqual(totais['total_custos_gerais'], Decimal('126.00'))
+        self.assertEqual(totais['total_custos_fixos'], Decimal('100.00'))
+        self.assertEqual(totais['total_custos_fixos_mensais'], Decimal('340.00'))
+        self.assertEqual(
+            totais['lucro_liquido'],
+            totais['total_receita_frete'] - totais['total_despesas']
+        )
+
+    def test_views_mensais_e_de_periodo_concordam(self):
+        mensal = self.client.get(reverse('relatorio_mensal'), {'ano_mes': '2025-01'}).context
+        api_mes = self.client.post(
+            reverse('buscar_relatorios_mes'), json.dumps({'ano_mes': '2025-01'}), content_type='application/json'
+        ).json()['totais']
+        api_periodo = self.client.post(
+            reverse('buscar_relatorios_periodo'),
+            json.dumps({'data_inicio': '2025-01-01', 'data_fim': '2025-01-31'}),
+            content_type='application/json'
+        ).json()['totais']
+
+        self.assertEqual(mensal['lucro_liquido'], api_mes['lucro_liquido'])
+        self.assertEqual(mensal['total_despesas'], api_mes['total_despesas'])
+        for campo in ['total_receita_frete', 'total_gasto_gasolina', 'total_valor_diarias',
+                      'total_custos_gerais', 'total_custos_fixos_mensais']:
+            self.assertEqual(mensal[campo], api_mes[campo])
+            self.assertEqual(api_mes[campo], api_periodo[campo])
+        # O período não inclui os custos fixos do mês (MonthlyCost)
+        self.assertEqual(api_mes['total_despesas'] - api_periodo['total_despesas'], 100.0)
+
+
+class CacheRelatoriosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='teste', password='senha-teste')
+        self.client.force_login(self.user)
+        criar_viagens(4)
+        criar_viagens(2, inicio=date(2025, 2, 1))
+        self.janeiro = (date(2025, 1, 1), date(2025, 1, 31))
+        self.fevereiro = (date(2025, 2, 1), date(2025, 2, 28))
+
+    def assertEmCache(self, data_inicio, data_fim, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            totais = calcular_totais(data_inicio, data_fim, **kwargs)
+        self.assertEqual(len(queries), 0)
+        return totais
+
+    def test_segunda_consulta_vem_do_cache(self):
+        calcular_totais(*self.janeiro, ano_mes='2025-01')
+        totais = self.assertEmCache(*self.janeiro, ano_mes='2025-01')
+        self.assertEqual(totais['total_viagens'], 4)
+
+    def test_reconstruir_resumos_invalida_o_cache(self):
+        calcular_totais(*self.janeiro, ano_mes='2025-01')
+        # Alteração sem signals (como um ajuste direto no banco) corrigida pela reconstrução
+        DailyReport.objects.filter(data_viagem=date(2025, 1, 1)).update(receita_frete=Decimal('3000.00'))
+        resumos.reconstruir()
+        totais = calcular_totais(*self.janeiro, ano_mes='2025-01')
+        self.assertEqual(totais['total_receita_frete'], Decimal('9000.00'))
+
+    def test_alteracao_invalida_apenas_o_mes_afetado(self):
+        calcular_totais(*self.janeiro)
+        calcular_totais(*self.fevereiro)
+
+        CustosGerais.objects.create(
+            data=date(2025, 1, 20), tipo_gasto='outros', descricao='Pedágio', valor=Decimal('50.00')
+        )
+
+        self.assertEmCache(*self.fevereiro)
+        totais = calcular_totais(*self.janeiro)
+        self.assertEqual(totais['total_custos_gerais'], Decimal('134.00'))
+        # Um período que inclui janeiro também é recalculado
+        periodo = calcular_totais(date(2025, 1, 15), date(2025, 2, 15))
+        self.assertEqual(periodo['total_custos_gerais'], Decimal('92.00'))
+
+    def test_custos_mensais_e_fixos_invalidam_o_cache(self):
+        calcular_totais(*self.janeiro, ano_mes='2025-01')
+        calcular_totais(*self.fevereiro, ano_mes='2025-02')
+
+        MonthlyCost.objects.create(ano_mes='2025-01', pecas=Decimal('100.00'))
+        self.assertEqual(calcular_totais(*self.janeiro, ano_mes='2025-01')['total_custos_fixos'], Decimal('100.00'))
+        self.assertEmCache(*self.fevereiro, ano_mes='2025-02')
+
+        custo = CustoFixoMensal.objects.create(
+            descricao='IPVA', tipo_custo='ipva', valor_mensal=Decimal('28.00'),
+            data_inicio=date(2025, 2, 1), data_fim=date(2025, 2, 28)
+        )
+        self.assertEmCache(*self.janeiro, ano_mes='2025-01')
+        self.assertEqual(
+            calcular_totais(*self.fevereiro, ano_mes='2025-02')['total_custos_fixos_mensais'], Decimal('28.00')
+        )
+
+        # Mudar a vigência invalida o mês de origem e o de destino
+        calcular_totais(*self.janeiro, ano_mes='2025-01')
+        custo.data_inicio, custo.data_fim = date(2025, 1, 1), date(2025, 1, 31)
+        custo.save()
+        self.assertEqual(
+            calcular_totais(*self.fevereiro, ano_mes='2025-02')['total_custos_fixos_mensais'], Decimal('0.00')
+        )
+        self.assertEqual(
+            calcular_totais(*self.janeiro, ano_mes='2025-01')['total_custos_fixos_mensais'], Decimal('28.00')
+        )
+
+    def test_api_do_mes_reflete_exclusao_por_sql(self):
+        url = reverse('buscar_relatorios_mes')
+        corpo = json.dumps({'ano_mes': '2025-02'})
+        antes = self.client.post(url, corpo, content_type='application/json').json()
+        self.assertEqual(len(antes['relatorios']), 2)
+
+        self.client.post(reverse('excluir_relatorio', args=[antes['relatorios'][0]['id']]))
+
+        depois = self.client.post(url, corpo, content_type='application/json').json()
+        self.assertEqual(len(depois['relatorios']), 1)
+        self.assertEqual(depois['totais']['total_receita_frete'], 2000.0)
+
+
+class PainelTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        criar_viagens(10, custos_por_viagem=0)
+        self.hoje = date(2025, 1, 8)  # quarta-feira: semana de 06/01 a 08/01
+
+    def assertEmCache(self):
+        with CaptureQueriesContext(connection) as queries:
+            dados = painel.obter_retrato(self.hoje)
+        self.assertEqual(len(queries), 0)
+        return dados
+
+    def test_retrato_do_dia_vem_do_cache_ate_uma_alteracao(self):
+        dados = painel.obter_painel(self.hoje)
+        self.assertEqual((dados['inicio_semana'], dados['total_viagens']), (date(2025, 1, 6), 3))
+        self.assertEqual([v.data_viagem.day for v in dados['ultimas_viagens']], [10, 9, 8, 7, 6])
+        self.assertEqual(self.assertEmCache(), {campo: valor for campo, valor in dados.items() if campo != 'ultimas_viagens'})
+
+        # Com o retrato no cache, restam as queries de sessão e usuário (as últimas viagens
+        # são um queryset preguiçoso que o template não lista)
+        self.client.force_login(User.objects.create_user(username='painel', password='senha123'))
+        with override_settings(TEMPLATES=TEMPLATES_COM_STUBS), mock.patch('login.views.datetime') as relogio:
+            relogio.now.return_value.date.return_value = self.hoje
+            with self.assertNumQueries(2):
+                self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+
+        DailyReport.objects.filter(data_viagem=date(2025, 1, 7)).get().delete()
+        dados = painel.obter_painel(self.hoje)
+        self.assertEqual(dados['total_viagens'], 2)
+        self.assertEqual([v.data_viagem.day for v in dados['ultimas_viagens']], [10, 9, 8, 6, 5])
+
+    def test_alteracoes_em_outros_meses_nao_invalidam_o_retrato(self):
+        painel.obter_retrato(self.hoje)
+        antiga = criar_viagens(1, inicio=date(2024, 6, 3), custos_por_viagem=1)[0]
+        CustoFixoMensal.objects.create(
+            descricao='Seguro antigo', tipo_custo='seguro', valor_mensal=Decimal('99.00'),
+            data_inicio=date(2024, 1, 1), data_fim=date(2024, 6, 30)
+        )
+        self.assertEmCache()
+
+        # Uma viagem futura aparece nas últimas viagens mesmo com o retrato em cache
+        futura = criar_viagens(1, inicio=date(2025, 5, 2), custos_por_viagem=0)[0]
+        self.assertEmCache()
+        self.assertEqual(painel.obter_painel(self.hoje)['ultimas_viagens'][0], futura)
+        self.assertNotIn(antiga, painel.obter_painel(self.hoje)['ultimas_viagens'])
+
+        # Semana que começa no mês anterior: alterações nele invalidam o retrato
+        hoje = date(2025, 2, 1)  # sábado: semana de 27/01 a 01/02
+        self.assertEqual(painel.obter_retrato(hoje)['total_viagens'], 0)
+        criar_viagens(1, inicio=date(2025, 1, 28), custos_por_viagem=0)
+        self.assertEqual(painel.obter_retrato(hoje)['total_viagens'], 1)
+
+    def test_custos_fixos_vigentes(self):
+        painel.obter_painel(self.hoje)
+        custo = CustoFixoMensal.objects.create(
+            descricao='Seguro', tipo_custo='seguro', valor_mensal=Decimal('310.00'), data_inicio=date(2024, 12, 1)
+        )
+        dados = painel.obter_painel(self.hoje)
+        self.assertEqual([c.id for c in dados['custos_fixos_mensais']], [custo.id])
+        self.assertEqual(dados['total_custos_fixos_mensais'], Decimal('310.00'))
+        self.assertEmCache()
+
+        custo.status = 'inativo'
+        custo.save()
+        dados = painel.obter_painel(self.hoje)
+        self.assertEqual((dados['custos_fixos_mensais'], dados['total_custos_fixos_mensais']), ([], Decimal('0.00')))
+
+
+class ExportacaoTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='teste', password='senha-teste')
+        self.client.force_login(self.user)
+        criar_viagens(5)
+        criar_viagens(2, inicio=date(2025, 3, 1))
+
+    def exportar(self, **params):
+        response = self.client.get(reverse('exportar_relatorios'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_de_viagens_tem_o_lucro_da_listagem(self):
+        conteudo = self.exportar(tipo='viagens', data_inicio='2025-01-01', data_fim='2025-01-31')
+        linhas = conteudo.decode('utf-8-sig').splitlines()
+        self.assertEqual(len(linhas), 6)
+        self.assertTrue(linhas[0].startswith('ID;Data;'))
+
+        listados = self.client.get(reverse('listar_relatorios'), {'data_fim': '2025-01-31'}).json()['relatorios']
+        lucro_por_id = {str(r['id']): f"{r['lucroLiquido']:.2f}".replace('.', ',') for r in listados}
+        for linha in linhas[1:]:
+            colunas = linha.split(';')
+            self.assertEqual(colunas[-1], lucro_por_id[colunas[0]])
+
+    def test_xlsx_de_custos(self):
+        conteudo = self.exportar(tipo='custos', formato='xlsx')
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as arquivo:
+            planilha = arquivo.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(planilha.count('<row>'), 1 + CustosGerais.objects.count())
+        self.assertIn('Fornecedor', planilha)
+
+    def test_parametros_invalidos(self):
+        response = self.client.get(reverse('exportar_relatorios'), {'tipo': 'salarios'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('exportar_relatorios'), {'data_inicio': '2025-13-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportacaoTests(TestCase):
+    CSV = (
+        'data_viagem;partida;chegada;diarias;litros_gasolina;gasto_gasolina;receita_frete;motorista;caminhao;'
+        'salario_base;custo_tipo_gasto;custo_descricao;custo_oficina_fornecedor;custo_valor\n'
+        '2025-04-01;Origem;Destino;2;100;550,00;2000;Ana;Caminhão 1;1800;pedagio;Pedágio;Concessionária;12,30\n'
+        '2025-04-02;Origem;Destino;1;80;440;1500;Ana;Caminhão 1;;;;;\n'
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='teste', password='senha-teste')
+        self.client.force_login(self.user)
+
+    def test_importa_csv_com_custos_salarios_e_resumos(self):
+        resultado = importacao.importar_viagens(importacao.ler_csv(self.CSV))
+        self.assertEqual(resultado, {'viagens': 2, 'custos': 1, 'salarios': 1, 'erros': []})
+
+        primeira = DailyReport.objects.get(data_viagem=date(2025, 4, 1))
+        self.assertEqual(primeira.valor_diarias, Decimal('140.00'))
+        self.assertEqual(primeira.custos_gerais.get().valor, Decimal('12.30'))
+        self.assertEqual(MotoristaSalario.objects.get(motorista='Ana', ano_mes='2025-04').salario_base, Decimal('1800.00'))
+
+        totais = calcular_totais(date(2025, 4, 1), date(2025, 4, 30), ano_mes='2025-04')
+        self.assertEqual(totais['total_viagens'], 2)
+        self.assertEqual(totais['total_receita_frete'], Decimal('3500.00'))
+        self.assertEqual(totais['total_custos_gerais'], Decimal('12.30'))
+
+    def test_linha_invalida_cancela_a_importacao(self):
+        linhas = [
+            {'data_viagem': '2025-04-01', 'partida': 'A', 'chegada': 'B', 'diarias': 1,
+             'litros_gasolina': 10, 'gasto_gasolina': 50, 'motorista': 'Ana', 'caminhao': 'C1'},
+            {'data_viagem': '01/04/2025', 'partida': 'A', 'chegada': 'B', 'diarias': 1,
+             'litros_gasolina': 10, 'gasto_gasolina': 50, 'motorista': 'Ana', 'caminhao': 'C1'},
+            {'data_viagem': '2025-04-03', 'partida': 'A'},
+        ]
+        resultado = importacao.importar_viagens(linhas, tamanho_lote=1)
+        self.assertEqual([erro['linha'] for erro in resultado['erros']], [2, 3])
+        self.assertEqual(resultado['viagens'], 0)
+        self.assertFalse(DailyReport.objects.exists())
+        self.assertFalse(ResumoDiario.objects.exists())
+
+    def test_endpoint_importa_json(self):
+        corpo = {'viagens': [{
+            'dataViagem': '2025-04-05', 'localPartida': 'A', 'localChegada': 'B', 'quantidadeDiarias': 3,
+            'litrosGasolina': 10, 'valorGasolina': 50, 'receita': 900, 'nomeMotorista': 'Bia', 'nomeCaminhao': 'C2',
+            'custos': [{'tipo_gasto': 'multas', 'descricao': 'Multa', 'oficina_fornecedor': 'Detran', 'valor': 88}],
+        }]}
+        response = self.client.post(reverse('importar_viagens'), json.dumps(corpo), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['viagens'], 1)
+        self.assertEqual(DailyReport.objects.get().valor_diarias, Decimal('210.00'))
+
+        corpo['viagens'][0]['custos'][0]['tipo_gasto'] = 'invalido'
+        response = self.client.post(reverse('importar_viagens'), json.dumps(corpo), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(DailyReport.objects.count(), 1)
+
+
+class DimensoesTests(TestCase):
+    def _linha(self, motorista, caminhao, **extras):
+        linha = {
+            'data_viagem': '2025-05-02', 'partida': 'A', 'chegada': 'B', 'diarias': '1',
+            'litros_gasolina': '10', 'gasto_gasolina': '50', 'receita_frete': '300',
+            'motorista': motorista, 'caminhao': caminhao,
+            'custos': [{'tipo_gasto': 'pedagio', 'descricao': 'Pedágio', 'oficina_fornecedor': 'X', 'valor': '5'}],
+        }
+        linha.update(extras)
+        return linha
+
+    def test_grafias_diferentes_viram_a_mesma_dimensao(self):
+        resultado = importacao.importar_viagens([
+            self._linha('João  Silva', 'ABC-1234', salario_base='2000'),
+            self._linha(' joão silva', 'abc 1234', salario_base='2100'),
+        ])
+        self.assertEqual(resultado['erros'], [])
+        self.assertEqual(Motorista.objects.count(), 1)
+        self.assertEqual(Caminhao.objects.count(), 1)
+
+        motorista = Motorista.objects.get()
+        caminhao = Caminhao.objects.get()
+        self.assertEqual((motorista.nome, caminhao.chave), ('João Silva', 'ABC1234'))
+        self.assertEqual(motorista.viagens.count(), 2)
+        self.assertEqual(set(DailyReport.objects.values_list('motorista', 'caminhao')), {('João Silva', 'ABC-1234')})
+        self.assertEqual(caminhao.custos_gerais.count(), 2)
+        # Um único salário para o motorista no mês
+        self.assertEqual(resultado['salarios'], 1)
+        self.assertEqual(motorista.salarios.get().salario_base, Decimal('2100.00'))
+
+    def test_save_liga_a_dimensao_e_resumos_agrupam_pelo_id(self):
+        criar_viagens(1)
+        DailyReport.objects.create(
+            data_viagem=date(2025, 1, 1), partida='A', chegada='B', diarias=1, litros_gasolina=Decimal('1'),
+            gasto_gasolina=Decimal('1'), receita_frete=Decimal('1'), motorista='MOTORISTA 0', caminhao='caminhão 0',
+        )
+        viagens = DailyReport.objects.filter(data_viagem=date(2025, 1, 1))
+        self.assertEqual(len({viagem.motorista_ref_id for viagem in viagens}), 1)
+        self.assertEqual(set(viagens.values_list('motorista', flat=True)), {'Motorista 0'})
+
+        resumo = ResumoDiario.objects.get(data=date(2025, 1, 1), dimensao='motorista')
+        self.assertEqual((resumo.chave, resumo.total_viagens), ('Motorista 0', 2))
+        self.assertEqual(ResumoDiario.objects.filter(data=date(2025, 1, 1), dimensao='caminhao').count(), 1)
+
+    def test_paginacao_filtra_pela_chave(self):
+        criar_viagens(3)
+        self.client.force_login(User.objects.create_user(username='dimensoes', password='senha123'))
+        response = self.client.get(reverse('listar_relatorios'), {'motorista': ' motorista  0 '})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['nomeMotorista'] for r in response.json()['relatorios']], ['Motorista 0'])
+
+
+class BuscaCustosTests(TestCase):
+    def _custo(self, oficina, descricao, placa, **extras):
+        dados = {
+            'tipo_gasto': 'manutencao', 'data': date(2025, 3, 1), 'veiculo_placa': placa,
+            'oficina_fornecedor': oficina, 'descricao': descricao, 'valor': Decimal('10.00'),
+            'forma_pagamento': 'pix', 'status_pagamento': 'pago',
+        }
+        dados.update(extras)
+        return CustosGerais.objects.create(**dados)
+
+    def _buscar(self, termo):
+        return set(busca.filtrar_custos(CustosGerais.objects.all(), termo).values_list('id', flat=True))
+
+    def test_busca_por_trecho_sem_acentos_e_sem_cruzar_campos(self):
+        freios = self._custo('Oficina São João', 'Manutenção dos freios', 'ABC-1234')
+        pneus = self._custo('Borracharia', 'Troca de pneus', 'XYZ-9876')
+
+        self.assertEqual(freios.busca_texto, 'oficina sao joao\nmanutencao dos freios\nabc-1234')
+        self.assertEqual(self._buscar('manutencao'), {freios.id})
+        self.assertEqual(self._buscar('  SÃO   joão '), {freios.id})
+        self.assertEqual(self._buscar('987'), {pneus.id})
+        self.assertEqual(self._buscar('de pneu'), {pneus.id})
+        # Termos curtos (sem trigramas) usam o LIKE; o termo não casa entre dois campos
+        self.assertEqual(self._buscar('Xy'), {pneus.id})
+        self.assertEqual(self._buscar('joao manutencao'), set())
+        self.assertEqual(self._buscar('"'), set())
+        self.assertEqual(self._buscar(''), {freios.id, pneus.id})
+
+        # Mesmo resultado do icontains antigo para termos sem acento
+        for termo in ('oficina', 'freios', 'xyz', 'troca de'):
+            antigo = set(CustosGerais.objects.filter(
+                Q(oficina_fornecedor__icontains=termo) | Q(descricao__icontains=termo) |
+                Q(veiculo_placa__icontains=termo)
+            ).values_list('id', flat=True))
+            self.assertEqual(self._buscar(termo), antigo, termo)
+
+    def test_indice_acompanha_alteracoes_exclusoes_e_gravacoes_em_lote(self):
+        custo = self._custo('Auto Peças Central', 'Filtro de óleo', 'AAA-1111')
+        custo.descricao = 'Correia dentada'
+        custo.save()
+        self.assertEqual(self._buscar('filtro'), set())
+        self.assertEqual(self._buscar('correia'), {custo.id})
+
+        custo.delete()
+        self.assertEqual(self._buscar('correia'), set())
+
+        # bulk_create da importação não dispara o pre_save
+        importacao.importar_viagens([{
+            'data_viagem': '2025-03-02', 'partida': 'A', 'chegada': 'B', 'diarias': '1',
+            'litros_gasolina': '10', 'gasto_gasolina': '50', 'motorista': 'Ana', 'caminhao': 'C1',
+            'custos': [{'tipo_gasto': 'pedagio', 'descricao': 'Pedágio Régis', 'oficina_fornecedor': 'Autopista',
+                        'valor': '12'}],
+        }])
+        importado = CustosGerais.objects.get(oficina_fornecedor='Autopista')
+        self.assertEqual(self._buscar('regis'), {importado.id})
+
+        # bulk_update da edição do relatório também atualiza o texto
+        self.client.force_login(User.objects.create_user(username='busca', password='senha123'))
+        relatorio = importado.relatorio
+        response = self.client.post(reverse('atualizar_relatorio', args=[relatorio.id]), {
+            'data_viagem': '2025-03-02', 'partida': 'A', 'chegada': 'B', 'diarias': '1',
+            'litros_gasolina': '10', 'gasto_gasolina': '50', 'receita_frete': '0',
+            'motorista': 'Ana', 'caminhao': 'C1',
+            'custo_0_id': str(importado.id), 'custo_0_tipo_gasto': 'pedagio',
+            'custo_0_oficina_fornecedor': 'Autopista', 'custo_0_descricao': 'Pedágio Itaí',
+            'custo_0_valor': '12', 'custo_0_forma_pagamento': 'pix', 'custo_0_status_pagamento': 'pago',
+        })
+        self.assertIn(response.status_code, (200, 302))
+        self.assertEqual(self._buscar('regis'), set())
+        self.assertEqual(self._buscar('itai'), {importado.id})
+
+    def test_indice_existe_depois_das_migracoes(self):
+        # Migrações que recriam a tabela de custos no SQLite descartam os triggers sem erro
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT 1 FROM pg_indexes WHERE tablename = 'login_custosgerais' "
+                    "AND indexname = 'custosgerais_busca_trgm_idx'"
+                )
+                self.assertIsNotNone(cursor.fetchone())
+                return
+            if connection.vendor != 'sqlite':
+                self.skipTest('Índice de busca só existe no SQLite e no PostgreSQL')
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [busca.TABELA_FTS])
+            self.assertIsNotNone(cursor.fetchone())
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'login_custosgerais'")
+            self.assertEqual({nome for nome, in cursor.fetchall()}, set(busca.TRIGGERS_FTS))
+
+            # O índice acompanha inserção, alteração e exclusão (integrity-check compara com a tabela)
+            custo = self._custo('Oficina', 'Freios', 'ABC-1234')
+            self._custo('Borracharia', 'Pneus', 'XYZ-9876')
+            custo.descricao = 'Embreagem'
+            custo.save()
+            custo.delete()
+            cursor.execute(
+                f"INSERT INTO {busca.TABELA_FTS}({busca.TABELA_FTS}, rank) VALUES ('integrity-check', 1)"
+            )
+
+
+class MotorLucroTests(TestCase):
+    def test_lucro_em_centavos_e_rateio_de_salario(self):
+        criar_viagens(3)
+        # Motorista 0 tem viagens em 01/01 e 04/01 (a segunda fora do período)
+        criar_viagens(1, inicio=date(2025, 1, 4))
+        MotoristaSalario.objects.filter(motorista='Motorista 0').update(salario_base=Decimal('1000.01'))
+
+        periodo = lucro.calcular_periodo(date(2025, 1, 1), date(2025, 1, 3))
+        viagens = periodo['viagens']
+        self.assertEqual(len(viagens), 3)
+        # 2000 - 550 - diárias - 21,00 de custos gerais
+        self.assertEqual(list(periodo['lucro']), [135900, 128900, 135900])
+        # O salário de 1000,01 é dividido entre as 2 viagens do mês; o centavo que sobra vai para a primeira
+        self.assertEqual(viagens.salarios[0], 50001)
+        motorista_0 = Motorista.objects.get(chave='motorista 0')
+        self.assertEqual(periodo['por_motorista'][motorista_0.id]['salarios'], 50001)
+        self.assertEqual(periodo['por_dia'][date(2025, 1, 2)]['viagens'], 1)
+        self.assertEqual(periodo['total']['lucro'], sum(periodo['lucro']))
+
+    def test_rateio_de_custos_fixos(self):
+        custos = [
+            CustoFixoMensal(valor_mensal=Decimal('100.00'), data_inicio=date(2025, 1, 1)),
+            CustoFixoMensal(valor_mensal=Decimal('0.10'), data_inicio=date(2025, 1, 2), data_fim=date(2025, 1, 2)),
+        ]
+        # 100,00 * 3/3 + 0,10 * 1/3 = 100,0333... -> 100,03
+        self.assertEqual(IndiceCustosFixos(custos).total_periodo(date(2025, 1, 1), date(2025, 1, 3)), 10003)
+
+    def test_custos_somados_em_centavos_no_banco(self):
+        viagem = criar_viagens(1, custos_por_viagem=0)[0]
+        for j in range(10):
+            CustosGerais.objects.create(
+                relatorio=viagem, tipo_gasto='pedagio', data=viagem.data_viagem, veiculo_placa=viagem.caminhao,
+                oficina_fornecedor='Fornecedor', descricao=f'Custo {j}', valor=Decimal('0.10'),
+                forma_pagamento='pix', status_pagamento='pago',
+            )
+        colunas = lucro.carregar_periodo(viagem.data_viagem, viagem.data_viagem)
+        # 10 x 0,10 em REAL no SQLite somaria 0,9999...; a soma em centavos é exata
+        self.assertEqual(colunas.custos[0], 100)
+
+    def test_comando_benchmark_lucro(self):
+        criar_viagens(3)
+        saida = io.StringIO()
+        call_command('benchmark_lucro', '2025-01-01', '2025-01-03', repeticoes=1, stdout=saida)
+        self.assertIn('Viagens: 3', saida.getvalue())
+        self.assertIn('Motor de lucro:', saida.getvalue())
+
+
+class CustosFixosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _custo(self, valor, inicio, fim=None):
+        return CustoFixoMensal(valor_mensal=Decimal(valor), data_inicio=inicio, data_fim=fim)
+
+    def _rateio_ingenuo(self, custos, data_inicio, data_fim):
+        numerador = 0
+        for custo in custos:
+            dias = (min(custo.data_fim or data_fim, data_fim) - max(custo.data_inicio, data_inicio)).days + 1
+            numerador += dinheiro.centavos(custo.valor_mensal) * max(dias, 0)
+        return dinheiro.dividir(numerador, (data_fim - data_inicio).days + 1)
+
+    def test_virada_de_mes_e_custo_sem_fim(self):
+        indice = IndiceCustosFixos([
+            # Termina no último dia de janeiro
+            self._custo('310.00', date(2024, 12, 15), date(2025, 1, 31)),
+            # Começa no primeiro dia de fevereiro e não tem fim
+            self._custo('280.00', date(2025, 2, 1)),
+            # Data de fim anterior ao início: nunca ativo
+            self._custo('999.00', date(2025, 3, 1), date(2025, 2, 1)),
+        ])
+        self.assertEqual(indice.total_periodo(date(2025, 1, 1), date(2025, 1, 31)), 31000)
+        self.assertEqual(indice.total_periodo(date(2025, 2, 1), date(2025, 2, 28)), 28000)
+        # 30 e 31/01 com o primeiro custo, 01 e 02/02 com o segundo: (310 * 2 + 280 * 2) / 4
+        self.assertEqual(indice.total_periodo(date(2025, 1, 30), date(2025, 2, 2)), 29500)
+        self.assertEqual(indice.total_periodo(date(2030, 6, 1), date(2030, 6, 30)), 28000)
+        self.assertEqual(indice.total_periodo(date(2024, 1, 1), date(2024, 1, 31)), 0)
+        self.assertEqual(len(indice), 2)
+        self.assertEqual(len(indice.ativos(date(2025, 1, 31), date(2025, 2, 1))), 2)
+        self.assertEqual(len(indice.ativos(date(2025, 2, 1), date(2025, 2, 1))), 1)
+
+    def test_mesmo_resultado_que_o_rateio_por_custo(self):
+        rng = random.Random(7)
+        base = date(2025, 1, 1)
+        custos = []
+        for _ in range(60):
+            inicio = base + timedelta(days=rng.randint(0, 400))
+            fim = None if rng.random() < 0.3 else inicio + timedelta(days=rng.randint(0, 200))
+            custos.append(self._custo(f'{rng.randint(1, 500000) / 100:.2f}', inicio, fim))
+        indice = IndiceCustosFixos(custos)
+        for _ in range(200):
+            inicio = base + timedelta(days=rng.randint(-30, 700))
+            fim = inicio + timedelta(days=rng.randint(0, 120))
+            self.assertEqual(indice.total_periodo(inicio, fim), self._rateio_ingenuo(custos, inicio, fim))
+
+    def test_ativos_igual_a_varredura(self):
+        rng = random.Random(11)
+        base = date(2025, 1, 1)
+        custos = []
+        for _ in range(80):
+            inicio = base + timedelta(days=rng.randint(0, 400))
+            fim = None if rng.random() < 0.3 else inicio + timedelta(days=rng.randint(0, 200))
+            custos.append(self._custo('100.00', inicio, fim))
+        indice = IndiceCustosFixos(custos)
+        for _ in range(200):
+            inicio = base + timedelta(days=rng.randint(-30, 700))
+            fim = inicio + timedelta(days=rng.randint(0, 120))
+            esperado = [
+                c for c in indice.custos if c.data_inicio <= fim and (not c.data_fim or c.data_fim >= inicio)
+            ]
+            self.assertEqual(indice.ativos(inicio, fim), esperado)
+
+    def test_indice_em_cache_e_invalidado_ao_salvar(self):
+        custo = CustoFixoMensal.objects.create(
+            descricao='Seguro', tipo_custo='seguro', valor_mensal=Decimal('300.00'), data_inicio=date(2025, 1, 1)
+        )
+        carregar_indice()
+        with self.assertNumQueries(0):
+            indice = carregar_indice()
+        self.assertEqual(indice.total_periodo(date(2025, 1, 1), date(2025, 1, 31)), 30000)
+
+        custo.data_fim = date(2025, 1, 15)
+        custo.save()
+        self.assertEqual(carregar_indice().total_periodo(date(2025, 1, 1), date(2025, 1, 30)), 15000)
+        # Dashboard e relatórios usam o mesmo índice
+        janeiro = calcular_totais(date(2025, 1, 1), date(2025, 1, 30))
+        self.assertEqual(janeiro['total_custos_fixos_mensais'], Decimal('150.00'))
+
+
+class DinheiroTests(TestCase):
+    def test_conversoes(self):
+        self.assertEqual(dinheiro.centavos('0.005'), 1)
+        self.assertEqual(dinheiro.centavos(Decimal('12.30')), 1230)
+        self.assertEqual(dinheiro.centavos(7), 700)
+        self.assertEqual(dinheiro.centavos(None), 0)
+        self.assertEqual(dinheiro.reais(-150), Decimal('-1.50'))
+        self.assertEqual(str(dinheiro.reais(100)), '1.00')
+        self.assertEqual(json.dumps([dinheiro.para_json(1229), dinheiro.para_json(30)]), '[12.29, 0.3]')
+
+    def test_somas_exatas_no_banco_e_nos_resumos(self):
+        viagem = criar_viagens(1, custos_por_viagem=0)[0]
+        for valor in ['0.10', '0.20', '0.10', '0.20', '0.10', '0.20']:
+            CustosGerais.objects.create(
+                relatorio=viagem, tipo_gasto='pedagio', data=viagem.data_viagem, veiculo_placa=viagem.caminhao,
+                oficina_fornecedor='F', descricao='Pedágio', valor=Decimal(valor),
+            )
+        self.assertEqual(CustosGerais.objects.aggregate(total=dinheiro.SomaCentavos('valor'))['total'], 90)
+        resumo = ResumoDiario.objects.get(data=viagem.data_viagem, dimensao='geral')
+        self.assertEqual(resumo.total_custos_gerais, Decimal('0.90'))
+
+
+class PerfilRequisicoesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='teste', password='senha-teste')
+        self.client.force_login(self.user)
+
+    @override_settings(PERFIL_REQUISICOES=True, PERFIL_LIMITE_REPETICOES=3)
+    def test_server_timing_e_deteccao_de_n_mais_1(self):
+        viagens = criar_viagens(4)
+
+        def view_com_n_mais_1(request):
+            for viagem in viagens:
+                list(CustosGerais.objects.filter(relatorio_id=viagem.id))
+            return HttpResponse('ok')
+
+        middleware = PerfilRequisicoesMiddleware(view_com_n_mais_1)
+        with self.assertLogs('login.middleware', level='WARNING') as logs:
+            response = middleware(RequestFactory().get('/'))
+        self.assertRegex(response['Server-Timing'], r'total;dur=[\d.]+, db;dur=[\d.]+;desc="4 queries"')
+        self.assertIn('Possível N+1', logs.output[0])
+
+        response = self.client.get(reverse('listar_relatorios'))
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(PERFIL_REQUISICOES=True, PERFIL_LIMITE_REPETICOES=3)
+    async def test_modo_assincrono_conta_as_queries_do_orm_assincrono(self):
+        viagens = await sync_to_async(criar_viagens)(4)
+
+        async def view_assincrona(request):
+            for viagem in viagens:
+                [custo async for custo in CustosGerais.objects.filter(relatorio_id=viagem.id)]
+            return HttpResponse('ok')
+
+        middleware = PerfilRequisicoesMiddleware(view_assincrona)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertLogs('login.middleware', level='WARNING') as logs:
+            response = await middleware(RequestFactory().get('/'))
+        self.assertIn('desc="4 queries"', response['Server-Timing'])
+        self.assertIn('Possível N+1', logs.output[0])
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('listar_relatorios'))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    def test_desligado_por_padrao(self):
+        response = self.client.get(reverse('listar_relatorios'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_assinatura_ignora_tamanho_das_listas(self):
+        self.assertEqual(
+            assinatura_sql('SELECT 1 WHERE id IN (%s, %s, %s)'),
+            assinatura_sql('SELECT 1 WHERE id IN (%s, %s)')
+        )
+
+
+class SincronizacaoTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='sync', password='senha123')
+        self.client.force_login(self.user)
+        self.viagens = criar_viagens(3)
+
+    def _alteracoes(self, token=None):
+        response = self.client.get(reverse('alteracoes'), {'desde': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_carga_inicial_e_alteracoes_desde_o_token(self):
+        inicial = self._alteracoes()
+        self.assertTrue(inicial['completo'])
+        self.assertEqual(len(inicial['relatorios']), 3)
+        self.assertEqual(len(inicial['custos_gerais']), 6)
+
+        # Token posterior à carga (sem a janela de segurança) para isolar as alterações seguintes
+        token = sincronizacao.codificar_token(timezone.now())
+        alterada, excluida = self.viagens[0], self.viagens[1]
+        alterada.receita_frete = Decimal('2500.00')
+        alterada.save()
+        excluida_id = excluida.id
+        custos_excluidos = set(excluida.custos_gerais.values_list('id', flat=True))
+        excluida.delete()
+        CustoFixoMensal.objects.create(
+            descricao='Seguro', tipo_custo='seguro', valor_mensal=Decimal('300.00'), data_inicio=date(2025, 1, 1)
+        )
+
+        dados = self._alteracoes(token)
+        self.assertFalse(dados['completo'])
+        self.assertEqual([r['id'] for r in dados['relatorios']], [alterada.id])
+        self.assertEqual(dados['relatorios'][0]['receita'], 2500.0)
+        self.assertEqual(dados['custos_gerais'], [])
+        self.assertEqual(len(dados['custos_fixos']), 1)
+        self.assertEqual(dados['excluidos']['relatorios'], [excluida_id])
+        self.assertEqual(set(dados['excluidos']['custos_gerais']), custos_excluidos)
+
+    def test_exclusao_por_sql_direto_gera_marca(self):
+        token = sincronizacao.codificar_token(timezone.now())
+        viagem = self.viagens[2]
+        self.client.post(reverse('excluir_relatorio', args=[viagem.id]))
+        dados = self._alteracoes(token)
+        self.assertEqual(dados['excluidos']['relatorios'], [viagem.id])
+        self.assertEqual(len(dados['excluidos']['custos_gerais']), 2)
+
+    def test_valores_dos_custos_em_centavos_exatos(self):
+        CustosGerais.objects.filter(id=self.viagens[0].custos_gerais.first().id).update(valor=Decimal('1234567.89'))
+        valores = {custo['valor'] for custo in self._alteracoes()['custos_gerais']}
+        self.assertIn(1234567.89, valores)
+
+    @override_settings(SINCRONIZACAO_RETENCAO_DIAS=10)
+    def test_marcas_antigas_apagadas_e_token_antigo_recebe_carga_completa(self):
+        viagem = self.viagens[2]
+        viagem.delete()
+        RegistroExcluido.objects.update(excluido_em=timezone.now() - timedelta(days=11))
+        recente = RegistroExcluido.objects.create(modelo='custo_fixo', objeto_id=99)
+
+        self.assertEqual(sincronizacao.limpar_exclusoes(), 3)
+        self.assertEqual(list(RegistroExcluido.objects.all()), [recente])
+
+        antigo = self._alteracoes(sincronizacao.codificar_token(timezone.now() - timedelta(days=11)))
+        self.assertTrue(antigo['completo'])
+        self.assertEqual(len(antigo['relatorios']), 2)
+        dentro_da_janela = self._alteracoes(sincronizacao.codificar_token(timezone.now() - timedelta(days=9)))
+        self.assertFalse(dentro_da_janela['completo'])
+        self.assertEqual(dentro_da_janela['excluidos']['custos_fixos'], [99])
+
+        call_command('limpar_exclusoes', stdout=io.StringIO())
+        self.assertTrue(RegistroExcluido.objects.exists())
+
+    def test_token_invalido(self):
+        response = self.client.get(reverse('alteracoes'), {'desde': 'nao-e-um-token'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+
+class EtagTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='etag', password='senha123')
+        self.client.force_login(self.user)
+        self.viagens = criar_viagens(3)
+        cache.clear()
+
+    def test_if_none_match_responde_304_sem_executar_o_relatorio(self):
+        url = reverse('buscar_relatorios_mes')
+        response = self.client.get(url, {'ano_mes': '2025-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        # Sessão, usuário e a query de impressão digital
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'ano_mes': '2025-01'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Outro mês é outro recurso
+        outro = self.client.get(url, {'ano_mes': '2025-02'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(outro.status_code, 200)
+
+    def test_etag_muda_com_alteracao_exclusao_e_salario(self):
+        url = reverse('listar_relatorios')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        viagem = self.viagens[0]
+        viagem.receita_frete = Decimal('3000.00')
+        viagem.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.viagens[1].delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # O upsert de salários da importação também atualiza updated_at
+        salario = MotoristaSalario.objects.get(motorista='Motorista 0', ano_mes='2025-01')
+        importacao.importar_viagens([
+            {'data_viagem': '2025-01-10', 'partida': 'A', 'chegada': 'B', 'diarias': 1, 'litros_gasolina': 10,
+             'gasto_gasolina': 50, 'motorista': 'Motorista 0', 'caminhao': 'C1', 'salario_base': 9999},
+        ])
+        self.assertGreater(MotoristaSalario.objects.get(pk=salario.pk).updated_at, salario.updated_at)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_custos_fixos(self):
+        url = reverse('custos_fixos')
+        etag = self.client.get(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')['ETag']
+        response = self.client.get(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        CustoFixoMensal.objects.create(
+            descricao='Seguro', tipo_custo='seguro', valor_mensal=Decimal('300.00'), data_inicio=date(2025, 1, 1)
+        )
+        response = self.client.get(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['custos_fixos']), 1)
+
+
+class ViewsAssincronasTests(TestCase):
+    VIEWS = ('listar_relatorios', 'buscar_relatorios_periodo', 'buscar_relatorios_mes', 'buscar_detalhes_viagem')
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='asgi', password='senha123')
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        self.viagens = criar_viagens(4)
+
+    def test_views_de_relatorio_sao_assincronas(self):
+        for nome in self.VIEWS:
+            self.assertTrue(iscoroutinefunction(getattr(views, nome)), nome)
+
+    def test_asgi_responde_o_mesmo_que_wsgi(self):
+        periodo = json.dumps({'data_inicio': '2025-01-01', 'data_fim': '2025-01-31'})
+        requisicoes = [
+            ('get', reverse('listar_relatorios'), {'data': {'limite': 2}}),
+            ('post', reverse('buscar_relatorios_periodo'), {'data': periodo, 'content_type': 'application/json'}),
+            ('get', reverse('buscar_relatorios_mes'), {'data': {'ano_mes': '2025-01'}}),
+            ('get', reverse('buscar_detalhes_viagem', args=[self.viagens[1].id]), {}),
+            ('get', reverse('buscar_detalhes_viagem', args=[0]), {}),
+        ]
+        for metodo, url, kwargs in requisicoes:
+            cache.clear()
+            esperado = getattr(self.client, metodo)(url, **kwargs)
+            cache.clear()
+            response = async_to_sync(getattr(self.async_client, metodo))(url, **kwargs)
+            self.assertEqual(response.status_code, esperado.status_code, url)
+            self.assertEqual(response.json(), esperado.json(), url)
+
+        self.assertFalse(response.json()['success'])
+
+        # Detalhes: custos do dia da viagem somados em centavos
+        viagem = self.viagens[1]
+        detalhes = self.client.get(reverse('buscar_detalhes_viagem', args=[viagem.id])).json()['viagem']
+        custos = CustosGerais.objects.filter(data=viagem.data_viagem)
+        total = dinheiro.somar(custos.values_list('valor', flat=True))
+        self.assertEqual(len(detalhes['custos_gerais']), custos.count())
+        self.assertEqual(detalhes['total_custos_gerais'], dinheiro.para_json(total))
+        self.assertEqual(
+            detalhes['lucro_liquido'], dinheiro.para_json(dinheiro.centavos(viagem.get_lucro()) - total)
+        )
+
+        # ETag calculada fora do event loop: 304 também pelo handler ASGI
+        url = reverse('buscar_relatorios_mes')
+        etag = self.client.get(url, {'ano_mes': '2025-01'})['ETag']
+        response = async_to_sync(self.async_client.get)(
+            url, {'ano_mes': '2025-01'}, headers={'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class CadastrarViagemTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cadastro', password='senha123')
+        self.client.force_login(self.user)
+        # Motorista e caminhão já cadastrados: a contagem de queries não inclui a criação deles
+        dimensoes.resolver(Motorista, ['Ana'])
+        dimensoes.resolver(Caminhao, ['Caminhão 1'])
+
+    def _formulario(self, quantidade_custos, **extras):
+        dados = {
+            'dataViagem': '2025-03-10', 'localPartida': 'Origem', 'localChegada': 'Destino',
+            'quantidadeDiarias': '2', 'litrosGasolina': '100', 'valorGasolina': '550.00', 'receita': '2000.00',
+            'nomeMotorista': 'Ana', 'nomeCaminhao': 'Caminhão 1', 'salario_base': '1800.00',
+        }
+        for index in range(quantidade_custos):
+            dados.update({
+                f'custo_{index}_tipo_gasto': 'pedagio', f'custo_{index}_oficina_fornecedor': 'Concessionária',
+                f'custo_{index}_descricao': f'Pedágio {index}', f'custo_{index}_valor': '12.30',
+                f'custo_{index}_forma_pagamento': 'pix',
+            })
+        dados.update(extras)
+        return dados
+
+    def _cadastrar(self, dados):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('cadastrar_viagem'), dados, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return response.json(), len(queries)
+
+    def test_queries_constantes_independente_dos_custos(self):
+        # Sessão e usuário (2), savepoint (2), motorista e caminhão (2) e um INSERT por
+        # tabela: viagem, custos, resumo diário, resumo mensal e salário (5)
+        for quantidade_custos in (1, 8):
+            with self.assertNumQueries(11):
+                resposta, _ = self._cadastrar(self._formulario(quantidade_custos))
+            self.assertTrue(resposta['success'], resposta)
+            self.assertIn('R$ 140.00', resposta['message'])
+
+        self.assertEqual(DailyReport.objects.count(), 2)
+        self.assertEqual(CustosGerais.objects.count(), 9)
+        self.assertEqual(MotoristaSalario.objects.get(motorista='Ana', ano_mes='2025-03').salario_base, Decimal('1800.00'))
+        resumo = ResumoDiario.objects.get(data=date(2025, 3, 10), dimensao='geral')
+        self.assertEqual(resumo.total_viagens, 2)
+        self.assertEqual(resumo.total_custos_gerais, Decimal('12.30') * 9)
+
+    def test_resumos_somados_batem_com_a_reconstrucao(self):
+        self._cadastrar(self._formulario(2))
+        self._cadastrar(self._formulario(1, dataViagem='2025-03-11', custo_0_valor='0.10'))
+        self._cadastrar(self._formulario(1, custo_0_valor='0.20'))
+        somados = {
+            modelo: list(modelo.objects.order_by('id').values(*resumos.CAMPOS_TOTAIS, 'dimensao', 'chave'))
+            for modelo in (ResumoDiario, ResumoMensal)
+        }
+        resumos.reconstruir()
+        for modelo, linhas in somados.items():
+            reconstruidas = list(modelo.objects.values(*resumos.CAMPOS_TOTAIS, 'dimensao', 'chave'))
+            self.assertCountEqual(linhas, reconstruidas)
+        self.assertEqual(
+            ResumoMensal.objects.get(ano_mes='2025-03', dimensao='caminhao').total_custos_gerais, Decimal('24.90')
+        )
+
+    def test_valor_do_custo_no_formato_brasileiro(self):
+        resposta, _ = self._cadastrar(self._formulario(2, custo_0_valor='1.234,56', custo_1_valor='10,5'))
+        self.assertTrue(resposta['success'], resposta)
+        self.assertEqual(
+            sorted(CustosGerais.objects.values_list('valor', flat=True)), [Decimal('10.50'), Decimal('1234.56')]
+        )
+
+    def test_valor_do_custo_invalido_indica_o_campo(self):
+        resposta, _ = self._cadastrar(self._formulario(2, custo_1_valor='doze'))
+        self.assertFalse(resposta['success'])
+        self.assertIn('custo_1_valor', resposta['message'])
+        self.assertFalse(DailyReport.objects.exists())
+
+    def test_custo_invalido_nao_grava_a_viagem(self):
+        resposta, _ = self._cadastrar(self._formulario(2, custo_1_forma_pagamento='boleto'))
+        self.assertFalse(resposta['success'])
+        self.assertFalse(DailyReport.objects.exists())
+        self.assertFalse(CustosGerais.objects.exists())
+        self.assertFalse(MotoristaSalario.objects.exists())
+
+    def test_salario_zerado_nao_sobrescreve_o_existente(self):
+        MotoristaSalario.objects.create(motorista='Ana', ano_mes='2025-03', salario_base=Decimal('2000.00'))
+        resposta, _ = self._cadastrar(self._formulario(0, salario_base='0'))
+        self.assertTrue(resposta['success'], resposta)
+        self.assertEqual(MotoristaSalario.objects.get(motorista='Ana').salario_base, Decimal('2000.00'))
+
+
+class AtualizarRelatorioTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='edicao', password='senha123')
+        self.client.force_login(self.user)
+        self.viagem = criar_viagens(1, custos_por_viagem=3)[0]
+        self.custos = list(self.viagem.custos_gerais.order_by('id'))
+
+    def _formulario(self, custos):
+        dados = {
+            'data_viagem': '2025-01-01', 'partida': 'Origem', 'chegada': 'Destino', 'diarias': '1',
+            'litros_gasolina': '100.00', 'gasto_gasolina': '550.00', 'receita_frete': '2000.00',
+            'motorista': 'Motorista 0', 'caminhao': 'Caminhão 0', 'salario_base': '1500.00',
+        }
+        for index, custo in custos:
+            for campo, valor in custo.items():
+                dados[f'custo_{index}_{campo}'] = valor
+        return dados
+
+    def _custo(self, custo, **alteracoes):
+        dados = {
+            'id': str(custo.id), 'tipo_gasto': custo.tipo_gasto, 'oficina_fornecedor': custo.oficina_fornecedor,
+            'descricao': custo.descricao, 'valor': str(custo.valor), 'forma_pagamento': custo.forma_pagamento,
+            'status_pagamento': custo.status_pagamento,
+        }
+        dados.update(alteracoes)
+        return dados
+
+    def test_edicao_altera_cria_e_remove_so_o_necessario(self):
+        primeiro, segundo, terceiro = self.custos
+        # O índice 1 foi removido na tela: a lacuna não pode interromper a leitura
+        dados = self._formulario([
+            (0, self._custo(primeiro)),
+            (2, self._custo(terceiro, valor='99.90')),
+            (3, {'tipo_gasto': 'multas', 'oficina_fornecedor': 'Detran', 'descricao': 'Multa', 'valor': '130.16'}),
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('atualizar_relatorio', args=[self.viagem.id]), dados, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+        self.assertTrue(response.json()['success'])
+
+        custos = {custo.id: custo for custo in self.viagem.custos_gerais.all()}
+        self.assertEqual(len(custos), 3)
+        self.assertEqual(custos[primeiro.id].updated_at, primeiro.updated_at)
+        self.assertEqual(custos[terceiro.id].valor, Decimal('99.90'))
+        self.assertNotIn(segundo.id, custos)
+        self.assertEqual(RegistroExcluido.objects.filter(modelo='custo_geral').count(), 1)
+
+        # Nenhum custo existente é recriado
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(sum(1 for q in sql if q.startswith('DELETE FROM "login_custosgerais"')), 1)
+        self.assertEqual(sum(1 for q in sql if q.startswith('INSERT INTO "login_custosgerais"')), 1)
+
+        resumo = ResumoDiario.objects.get(data=date(2025, 1, 1), dimensao='geral')
+        self.assertEqual(resumo.total_custos_gerais, Decimal('10.50') + Decimal('99.90') + Decimal('130.16'))
+
+    def test_erro_de_valor_nao_grava_nada(self):
+        dados = self._formulario([(0, self._custo(self.custos[0], valor='abc'))])
+        dados['receita_frete'] = '5000.00'
+        response = self.client.post(
+            reverse('atualizar_relatorio', args=[self.viagem.id]), dados, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertFalse(response.json()['success'])
+        self.viagem.refresh_from_db()
+        self.assertEqual(self.viagem.receita_frete, Decimal('2000.00'))
+        self.assertEqual(self.viagem.custos_gerais.count(), 3)
+
+
+class FrotaSinteticaTests(TestCase):
+    def test_gera_frota_reprodutivel_com_resumos(self):
+        criados = frota.gerar_frota(viagens=300, caminhoes=3, motoristas=4, anos=0.5, fim=date(2025, 6, 30))
+        self.assertEqual(criados['viagens'], 300)
+        self.assertEqual(DailyReport.objects.count(), 300)
+        self.assertEqual(CustosGerais.objects.count(), criados['custos_gerais'])
+        self.assertEqual(
+            ResumoMensal.objects.filter(dimensao='geral').aggregate(total=Sum('total_viagens'))['total'], 300
+        )
+        self.assertFalse(DailyReport.objects.filter(data_viagem__gt=date(2025, 6, 30)).exists())
+        primeira = DailyReport.objects.order_by('data_viagem', 'id').values_list('partida', 'receita_frete').first()
+
+        DailyReport.objects.all().delete()
+        frota.gerar_frota(viagens=300, caminhoes=3, motoristas=4, anos=0.5, fim=date(2025, 6, 30))
+        self.assertEqual(
+            DailyReport.objects.order_by('data_viagem', 'id').values_list('partida', 'receita_frete').first(), primeira
+        )
+
+
+# Páginas sem template no repositório: stubs que percorrem os mesmos dados que a página
+# real, para que relações carregadas de forma preguiçosa também apareçam na contagem
+TEMPLATES_STUB = {
+    'login/listar_viagens.html': (
+        '{% for viagem in viagens %}{{ viagem.id }}{{ viagem.total_custos_gerais }}'
+        '{% for custo in viagem.custos_gerais_dia %}{{ custo.valor }}{% endfor %}{% endfor %}'
+    ),
+    'login/custos_gerais.html': (
+        '{% for custo in page_obj %}{{ custo.valor }}{{ custo.relatorio_id }}'
+        "{% include 'login/comprovante_custo.html' with custo=custo %}{% endfor %}"
+    ),
+    'login/editar_custo_geral.html': "{% include 'login/comprovante_custo.html' with custo=custo exibicao=True %}",
+    'login/teste_abas.html': '',
+    'login/adicionar_custo_geral.html': '',
+}
+
+
+def _ano_mes(data):
+    return data.strftime('%Y-%m')
+
+
+# Máximo de queries por nome de URL (login/urls.py) em uma requisição com o cache vazio.
+# Cada entrada: (orçamento, função que faz a requisição com (client, hoje, viagem_id)).
+ORCAMENTO_QUERIES = {
+    # Com o retrato do dia no cache: só sessão e usuário (PainelTests)
+    'dashboard': (5, lambda c, hoje, vid: c.get(reverse('dashboard'))),
+    'listar_viagens': (5, lambda c, hoje, vid: c.get(reverse('listar_viagens'))),
+    'listar_relatorios': (6, lambda c, hoje, vid: c.get(reverse('listar_relatorios'))),
+    'buscar_detalhes_viagem': (4, lambda c, hoje, vid: c.get(reverse('buscar_detalhes_viagem', args=[vid]))),
+    'relatorio_diario': (4, lambda c, hoje, vid: c.get(reverse('relatorio_diario'), {'data_viagem': hoje.isoformat()})),
+    'relatorio_semanal': (11, lambda c, hoje, vid: c.get(
+        reverse('relatorio_semanal'),
+        {'data_inicio': (hoje - timedelta(days=6)).isoformat(), 'data_fim': hoje.isoformat()}
+    )),
+    'relatorio_mensal': (8, lambda c, hoje, vid: c.get(reverse('relatorio_mensal'), {'ano_mes': _ano_mes(hoje)})),
+    'custos_gerais': (4, lambda c, hoje, vid: c.get(reverse('custos_gerais'))),
+    'buscar_custos_por_data': (3, lambda c, hoje, vid: c.get(reverse('buscar_custos_por_data'), {'data': hoje.isoformat()})),
+    'custos_fixos': (4, lambda c, hoje, vid: c.get(reverse('custos_fixos'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')),
+    'buscar_relatorios_periodo': (11, lambda c, hoje, vid: c.post(
+        reverse('buscar_relatorios_periodo'),
+        json.dumps({'data_inicio': (hoje - timedelta(days=29)).isoformat(), 'data_fim': hoje.isoformat()}),
+        content_type='application/json'
+    )),
+    'buscar_relatorios_mes': (7, lambda c, hoje, vid: c.post(
+        reverse('buscar_relatorios_mes'), json.dumps({'ano_mes': _ano_mes(hoje)}), content_type='application/json'
+    )),
+    'exportar_relatorios': (5, lambda c, hoje, vid: c.get(
+        reverse('exportar_relatorios'),
+        {'tipo': 'viagens', 'formato': 'csv', 'data_inicio': (hoje - timedelta(days=29)).isoformat(),
+         'data_fim': hoje.isoformat()}
+    )),
+    'teste_abas': (0, lambda c, hoje, vid: c.get(reverse('teste_abas'))),
+    'alteracoes': (8, lambda c, hoje, vid: c.get(
+        reverse('alteracoes'), {'desde': sincronizacao.codificar_token(timezone.now() - timedelta(hours=1))}
+    )),
+}
+
+# Views que alteram dados (ou de autenticação), fora da medição de leitura
+SEM_ORCAMENTO = {
+    'login', 'logout', 'cadastrar_viagem', 'importar_viagens', 'excluir_viagem', 'salvar_custos_mensais',
+    'apagar_relatorio_mensal', 'adicionar_custo_geral', 'editar_custo_geral', 'excluir_custo_geral',
+    'excluir_relatorio', 'atualizar_relatorio', 'editar_custo_fixo', 'excluir_custo_fixo', 'apagar_custo_fixo',
+    # Dependem de uma tarefa da fila já criada (queries medidas em JobsTests)
+    'status_job', 'baixar_job',
+}
+
+
+# Configuração de templates com os stubs acima
+TEMPLATES_COM_STUBS = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'DIRS': [],
+    'OPTIONS': {
+        'context_processors': [
+            'django.template.context_processors.request',
+            'django.contrib.auth.context_processors.auth',
+            'django.contrib.messages.context_processors.messages',
+        ],
+        'loaders': [
+            ('django.template.loaders.locmem.Loader', TEMPLATES_STUB),
+            'django.template.loaders.app_directories.Loader',
+        ],
+    },
+}]
+
+
+@override_settings(TEMPLATES=TEMPLATES_COM_STUBS)
+class OrcamentoQueriesTests(TestCase):
+    """Cada view tem um máximo de queries que não pode crescer com o volume de dados"""
+
+    TAMANHOS = (15, 90)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='orcamento', password='senha123')
+        self.client.force_login(self.user)
+        self.hoje = date.today()
+
+    def _contar_queries(self, tamanho):
+        DailyReport.objects.all().delete()
+        CustoFixoMensal.objects.all().delete()
+        MotoristaSalario.objects.all().delete()
+        MonthlyCost.objects.all().delete()
+        frota.gerar_frota(viagens=tamanho, caminhoes=3, motoristas=4, anos=0.08, fim=self.hoje)
+        # Garante dados em todas as telas: custos fixos do mês e uma viagem hoje com custos
+        MonthlyCost.objects.create(ano_mes=_ano_mes(self.hoje))
+        viagem = DailyReport.objects.filter(data_viagem=self.hoje).first() or DailyReport.objects.create(
+            data_viagem=self.hoje, partida='A', chegada='B', diarias=1, litros_gasolina=Decimal('50.00'),
+            gasto_gasolina=Decimal('300.00'), receita_frete=Decimal('1000.00'),
+            motorista='Motorista', caminhao='Caminhão'
+        )
+
+        contagens = {}
+        for nome, (_, requisicao) in ORCAMENTO_QUERIES.items():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = requisicao(self.client, self.hoje, viagem.id)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, 200, nome)
+            contagens[nome] = len(queries)
+        return contagens
+
+    def test_orcamento_de_queries_por_view(self):
+        pequeno, grande = (self._contar_queries(tamanho) for tamanho in self.TAMANHOS)
+        for nome, (orcamento, _) in ORCAMENTO_QUERIES.items():
+            with self.subTest(view=nome):
+                self.assertLessEqual(grande[nome], orcamento)
+                self.assertEqual(pequeno[nome], grande[nome], 'a quantidade de queries cresce com os dados')
+
+    def test_todas_as_urls_tem_orcamento(self):
+        nomes = {padrao.name for padrao in urls.urlpatterns if padrao.name}
+        self.assertEqual(nomes - SEM_ORCAMENTO - set(ORCAMENTO_QUERIES), set())
+
+
+@override_settings(TEMPLATES=TEMPLATES_COM_STUBS)
+class EstatisticasCustosGeraisTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='estatisticas', password='senha123'))
+        criar_viagens(3)
+        for valor, status in ((Decimal('250.10'), 'pago'), (Decimal('99.99'), 'nao_pago'), (Decimal('5.00'), 'parcial')):
+            CustosGerais.objects.create(
+                tipo_gasto='manutencao', data=date(2025, 1, 2), veiculo_placa='ABC-1234',
+                oficina_fornecedor='Oficina Central', descricao='Custo da revisão', valor=valor,
+                forma_pagamento='pix', status_pagamento=status,
+            )
+        CustosGerais.objects.create(
+            tipo_gasto='seguro', data=date(2025, 1, 2), veiculo_placa='ABC-1234', oficina_fornecedor='Seguradora',
+            descricao='Apólice', valor=Decimal('800.00'), forma_pagamento='pix', status_pagamento='pago',
+        )
+        cache.clear()
+
+    def test_contagem_e_totais_em_uma_query_e_no_cache(self):
+        url = reverse('custos_gerais')
+        # Sessão, usuário, estatísticas (contagem e somas) e a página
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'busca': 'custo'})
+        custos = CustosGerais.objects.filter(descricao__icontains='custo')
+        self.assertEqual(response.context['page_obj'].paginator.count, custos.count())
+        self.assertEqual(response.context['total_custos'], custos.aggregate(Sum('valor'))['valor__sum'])
+        self.assertEqual(
+            response.context['custos_pendentes'],
+            custos.filter(status_pagamento='nao_pago').aggregate(Sum('valor'))['valor__sum']
+        )
+        por_tipo = {linha['tipo_gasto']: linha['total'] for linha in response.context['totais_por_tipo']}
+        esperado = {
+            linha['tipo_gasto']: linha['total']
+            for linha in custos.values('tipo_gasto').annotate(total=Sum('valor'))
+        }
+        self.assertEqual(por_tipo, esperado)
+
+        # Mesmo filtro: contagem e totais vêm do cache
+        with self.assertNumQueries(3):
+            self.client.get(url, {'busca': 'custo', 'page': 2})
+
+        # Qualquer alteração de custo invalida as estatísticas
+        custo = custos.first()
+        custo.valor += Decimal('1.00')
+        custo.save()
+        response = self.client.get(url, {'busca': 'custo'})
+        self.assertEqual(response.context['total_custos'], custos.aggregate(Sum('valor'))['valor__sum'])
+
+
+@override_settings(TEMPLATES=TEMPLATES_COM_STUBS)
+class ComprovantesTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media, COMPROVANTES_EM_SEGUNDO_PLANO=False)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.client.force_login(User.objects.create_user(username='comprovante', password='senha123'))
+
+    def _foto(self, largura=3000, altura=2000, cor=(200, 30, 30)):
+        buffer = io.BytesIO()
+        Image.new('RGB', (largura, altura), cor).save(buffer, 'JPEG', quality=95)
+        return buffer.getvalue()
+
+    def _enviar(self, conteudo, nome='recibo.JPG'):
+        return self.client.post(reverse('adicionar_custo_geral'), {
+            'tipo_gasto': 'manutencao', 'data': '2025-04-01', 'veiculo_placa': 'ABC-1234',
+            'oficina_fornecedor': 'Oficina', 'descricao': 'Revisão', 'valor': '100.00',
+            'forma_pagamento': 'pix', 'status_pagamento': 'pago',
+            'comprovante': SimpleUploadedFile(nome, conteudo, content_type='image/jpeg'),
+        })
+
+    def test_upload_deduplicado_com_versoes_reduzidas(self):
+        foto = self._foto()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self._enviar(foto).status_code, 302)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._enviar(foto, nome='outro_nome.jpg')
+
+        primeiro, segundo = CustosGerais.objects.order_by('id')
+        self.assertEqual(primeiro.comprovante.name, segundo.comprovante.name)
+        self.assertRegex(primeiro.comprovante.name, r'^comprovantes/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(os.listdir(os.path.join(self.media, 'comprovantes', 'miniaturas')), [
+            os.path.basename(comprovantes.nome_versao(primeiro.comprovante.name, 'miniatura'))
+        ])
+        self.assertEqual(len([n for n in os.listdir(os.path.join(self.media, 'comprovantes')) if n.endswith('.jpg')]), 1)
+
+        for versao, lado in (('exibicao', 1600), ('miniatura', 320)):
+            with default_storage.open(comprovantes.nome_versao(primeiro.comprovante.name, versao)) as arquivo:
+                with Image.open(arquivo) as imagem:
+                    self.assertEqual(max(imagem.size), lado)
+        self.assertTrue(primeiro.comprovante_versoes and segundo.comprovante_versoes)
+        self.assertIn('/exibicao/', primeiro.get_comprovante_exibicao_url())
+        self.assertIn('/miniaturas/', primeiro.get_comprovante_miniatura_url())
+
+    def test_paginas_e_api_usam_as_versoes_sem_consultar_o_storage(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._enviar(self._foto())
+        custo = CustosGerais.objects.get()
+        miniatura = default_storage.url(comprovantes.nome_versao(custo.comprovante.name, 'miniatura'))
+        exibicao = default_storage.url(comprovantes.nome_versao(custo.comprovante.name, 'exibicao'))
+
+        with override_settings(TEMPLATES=TEMPLATES_COM_STUBS), \
+                mock.patch.object(default_storage, 'exists', side_effect=AssertionError('exists() por linha')):
+            self.assertContains(self.client.get(reverse('custos_gerais')), miniatura)
+            self.assertContains(self.client.get(reverse('editar_custo_geral', args=[custo.id])), exibicao)
+            resposta = self.client.get(reverse('buscar_custos_por_data'), {'data': '2025-04-01'}).json()
+        self.assertEqual(resposta['custos'][0]['comprovante_miniatura_url'], miniatura)
+        self.assertEqual(resposta['custos'][0]['comprovante_url'], exibicao)
+
+        # Enquanto as versões não foram geradas, o link aponta para o original
+        CustosGerais.objects.update(comprovante_versoes=False)
+        resposta = self.client.get(reverse('buscar_custos_por_data'), {'data': '2025-04-01'}).json()
+        self.assertEqual(resposta['custos'][0]['comprovante_miniatura_url'], custo.comprovante.url)
+
+    def test_sem_versoes_usa_o_original_e_tamanho_maximo(self):
+        nome = comprovantes.salvar_comprovante(SimpleUploadedFile('nota.pdf', b'%PDF-1.4 nota'))
+        custo = CustosGerais(comprovante=nome)
+        self.assertEqual(comprovantes.gerar_versoes(nome), [])
+        self.assertEqual(custo.get_comprovante_miniatura_url(), custo.comprovante.url)
+
+        with override_settings(COMPROVANTE_TAMANHO_MAXIMO_MB=1):
+            with self.assertRaises(comprovantes.ComprovanteInvalido):
+                comprovantes.salvar_comprovante(SimpleUploadedFile('grande.jpg', b'0' * (1024 * 1024 + 1)))
+            self._enviar(b'0' * (1024 * 1024 + 1))
+        self.assertFalse(CustosGerais.objects.exists())
+
+
+class JobsTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.user = User.objects.create_user(username='fila', password='senha123')
+        self.client.force_login(self.user)
+        criar_viagens(5)
+        cache.clear()
+
+    def _status(self, job_id):
+        response = self.client.get(reverse('status_job', args=[job_id]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['job']
+
+    def test_exportacao_em_segundo_plano_gera_o_mesmo_arquivo(self):
+        parametros = {'tipo': 'viagens', 'formato': 'csv', 'data_inicio': '2025-01-01', 'data_fim': '2025-01-31'}
+        response = self.client.get(reverse('exportar_relatorios'), {**parametros, 'em_segundo_plano': '1'})
+        self.assertEqual(response.status_code, 202)
+        job = response.json()['job']
+        self.assertEqual((job['status'], job['download_url']), ('pendente', None))
+
+        self.assertEqual(tarefas.processar_proxima().status, 'concluido')
+        self.assertIsNone(tarefas.processar_proxima())
+
+        with self.assertNumQueries(3):
+            job = self._status(job['id'])
+        self.assertEqual(job['resultado']['nome_arquivo'], 'viagens_2025-01-01_2025-01-31.csv')
+        download = self.client.get(job['download_url'])
+        self.assertIn('viagens_2025-01-01_2025-01-31.csv', download['Content-Disposition'])
+        sincrono = self.client.get(reverse('exportar_relatorios'), parametros)
+        self.assertEqual(b''.join(download.streaming_content), b''.join(sincrono.streaming_content))
+
+        # Outro usuário não vê a tarefa
+        self.client.force_login(User.objects.create_user(username='outro', password='senha123'))
+        self.assertEqual(self.client.get(reverse('status_job', args=[job['id']])).status_code, 404)
+
+    def test_relatorio_mensal_em_segundo_plano_igual_a_api(self):
+        response = self.client.post(reverse('relatorio_mensal'), {'ano_mes': '2025-01', 'em_segundo_plano': '1'})
+        self.assertEqual(response.status_code, 202)
+        with mock.patch('login.management.commands.run_worker.close_old_connections'):
+            call_command('run_worker', uma_vez=True, stdout=io.StringIO())
+
+        job = self._status(response.json()['job']['id'])
+        self.assertEqual(job['status'], 'concluido')
+        self.assertIsNone(job['download_url'])
+        api = self.client.get(reverse('buscar_relatorios_mes'), {'ano_mes': '2025-01'}).json()
+        self.assertEqual(job['resultado'], api)
+        self.assertEqual(len(job['resultado']['relatorios']), 5)
+
+        invalido = self.client.post(reverse('relatorio_mensal'), {'ano_mes': '2025/1', 'em_segundo_plano': '1'})
+        self.assertEqual(invalido.status_code, 400)
+
+    def test_relatorio_mensal_nao_usa_o_cache_do_processo(self):
+        # Cache preenchido e dados alterados sem signals, como num processo que não vê a invalidação
+        self.client.get(reverse('buscar_relatorios_mes'), {'ano_mes': '2025-01'})
+        DailyReport.objects.filter(data_viagem=date(2025, 1, 1)).update(partida='Alterada')
+
+        tarefas.enfileirar('relatorio_mensal', {'ano_mes': '2025-01'}, usuario=self.user)
+        job = tarefas.processar_proxima()
+        self.assertEqual(job.resultado['relatorios'][0]['partida'], 'Alterada')
+
+    def test_falha_volta_para_a_fila_ate_o_limite_de_tentativas(self):
+        job = tarefas.enfileirar('relatorio_mensal', {'ano_mes': 'inválido'}, usuario=self.user)
+        for tentativa in range(1, 4):
+            processado = tarefas.processar_proxima()
+            self.assertEqual(processado.tentativas, tentativa)
+        self.assertEqual(processado.status, 'erro')
+        self.assertIn('ValueError', processado.erro)
+        self.assertIsNone(tarefas.processar_proxima())
+        self.assertEqual(self._status(job.id)['status'], 'erro')
+
+        with self.assertRaises(tarefas.TarefaDesconhecida):
+            tarefas.enfileirar('inexistente')
+
+    def test_reserva_nao_repete_tarefa_e_libera_as_travadas(self):
+        primeiro = tarefas.enfileirar('reconstruir_resumos')
+        segundo = tarefas.enfileirar('reconstruir_resumos')
+        self.assertEqual(tarefas.reservar().id, primeiro.id)
+        self.assertEqual(tarefas.reservar().id, segundo.id)
+        self.assertIsNone(tarefas.reservar())
+
+        Job.objects.filter(id=primeiro.id).update(iniciado_em=timezone.now() - timedelta(hours=1))
+        self.assertEqual(tarefas.liberar_travadas(tempo_maximo=60), (1, 0))
+        job = tarefas.processar_proxima()
+        self.assertEqual((job.id, job.status, job.tentativas), (primeiro.id, 'concluido', 2))
+        self.assertEqual(job.resultado['linhas_diarias'], ResumoDiario.objects.count())
+
+
+class SalarioUnicoTests(TestCase):
+    def test_um_salario_por_motorista_cadastrado_e_mes(self):
+        MotoristaSalario.objects.create(motorista='Ana  Souza', ano_mes='2025-01', salario_base=Decimal('1000.00'))
+        resultado = importacao.importar_viagens([{
+            'data_viagem': '2025-01-05', 'partida': 'A', 'chegada': 'B', 'diarias': '1', 'litros_gasolina': '10',
+            'gasto_gasolina': '50', 'motorista': 'ana souza', 'caminhao': 'ABC-1234', 'salario_base': '1800',
+        }])
+        self.assertEqual(resultado['erros'], [])
+        salario = MotoristaSalario.objects.get()
+        self.assertEqual((salario.motorista, salario.salario_base), ('Ana Souza', Decimal('1800.00')))
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MotoristaSalario.objects.bulk_create([
+                MotoristaSalario(motorista='Outra grafia', motorista_ref=salario.motorista_ref, ano_mes='2025-01')
+            ])
+
+
+class IndicesTests(TestCase):
+    """Verifica via EXPLAIN que as consultas dos relatórios usam os índices (SQLite e PostgreSQL)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        criar_viagens(30)
+        CustoFixoMensal.objects.create(
+            descricao='Seguro', tipo_custo='seguro', valor_mensal=Decimal('300.00'), data_inicio=date(2024, 1, 1)
+        )
+
+    def _plano(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Em tabelas pequenas o PostgreSQL prefere seq scan; desabilitá-lo mostra se o índice é utilizável
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsaIndice(self, queryset, nome_indice):
+        plano = self._plano(queryset)
+        self.assertIn(nome_indice, plano, plano)
+
+    def test_periodo_de_viagens(self):
+        self.assertUsaIndice(
+            DailyReport.objects.filter(data_viagem__range=[date(2025, 1, 1), date(2025, 1, 31)]),
+            'dailyreport_data_idx'
+        )
+
+    def test_viagens_por_motorista(self):
+        self.assertUsaIndice(
+            DailyReport.objects.filter(
+                motorista_ref__chave=dimensoes.chave_motorista('Motorista 1'), data_viagem__gte=date(2025, 1, 1)
+            ),
+            'dailyreport_motorista_ref_idx'
+        )
+
+    def test_soma_de_custos_por_periodo_usa_indice_de_cobertura(self):
+        consulta = CustosGerais.objects.filter(
+            data__range=[date(2025, 1, 1), date(2025, 1, 31)]
+        ).order_by().values('status_pagamento').annotate(total=Sum('valor'))
+        plano = self._plano(consulta)
+        self.assertIn('custosgerais_valor_idx', plano, plano)
+        if connection.vendor == 'sqlite':
+            self.assertIn('COVERING INDEX', plano, plano)
+
+    def test_custos_fixos_vigentes(self):
+        self.assertUsaIndice(
+            CustoFixoMensal.objects.filter(status='ativo', data_inicio__lte=date(2025, 1, 31)).filter(
+                Q(data_fim__isnull=True) | Q(data_fim__gte=date(2025, 1, 1))
+            ),
+            'custofixo_vigencia_idx'
+        )
+
+    def test_salario_por_motorista_e_mes(self):
+        motorista = Motorista.objects.get(nome='Motorista 1')
+        plano = self._plano(MotoristaSalario.objects.filter(motorista_ref=motorista, ano_mes='2025-01'))
+        self.assertRegex(plano, r'(?i)index', plano)
@@ -0,0 +1,50 @@
+"""Totais consolidados dos relatórios, calculados com uma query por tabela.
+
+Todas as views de relatório (semanal, mensal e as APIs de período/mês) usam
+este serviço para que os números exibidos sejam sempre os mesmos.
+"""
+from decimal import Decimal
+
+from . import cache_relatorios, custos_fixos, dinheiro, resumos
+from .models import MonthlyCost
+
+
+def calcular_totais(data_inicio, data_fim, ano_mes=None):
+    """Calcula todos os totais de um período.
+
+    Quando ano_mes ('YYYY-MM') é informado, os totais de viagens vêm da linha
+    de ResumoMensal e os custos fixos do mês (MonthlyCost) são incluídos.
+    O resultado fica no cache de relatórios até algum mês do período mudar.
+    """
+    return cache_relatorios.obter_ou_calcular(
+        'totais-mes' if ano_mes else 'totais', data_inicio, data_fim,
+        lambda: _calcular_totais(data_inicio, data_fim, ano_mes)
+    )
+
+
+def _calcular_totais(data_inicio, data_fim, ano_mes):
+    if ano_mes:
+        totais = resumos.totais_mes(ano_mes)
+        custos_mes = MonthlyCost.objects.filter(ano_mes=ano_mes).first()
+    else:
+        totais = resumos.totais_periodo(data_inicio, data_fim)
+        custos_mes = None
+
+    # Custos fixos mensais: lista e rateio vêm do mesmo índice de intervalos
+    indice = custos_fixos.carregar_indice()
+
+    totais.update({
+        'custos_fixos': custos_mes,
+        'total_custos_fixos': custos_mes.get_total_custos_fixos() if custos_mes else Decimal('0'),
+        'custos_fixos_mensais': indice.ativos(data_inicio, data_fim),
+        'total_custos_fixos_mensais': dinheiro.reais(indice.total_periodo(data_inicio, data_fim)),
+    })
+    totais['total_gastos_viagem'] = totais['total_gasto_gasolina'] + totais['total_valor_diarias']
+    totais['total_despesas'] = (
+        totais['total_gastos_viagem']
+        + totais['total_custos_gerais']
+        + totais['total_custos_fixos']
+        + totais['total_custos_fixos_mensais']
+    )
+    totais['lucro_liquido'] = totais['total_receita_frete'] - totais['total_despesas']
+    return totais
@@ -9,6 +9,7 @@ urlpatterns = [
     # Rotas para viagens
     path('cadastrar-viagem/', views.cadastrar_viagem, name='cadastrar_viagem'),
     path('listar-viagens/', views.listar_viagens, name='listar_viagens'),
+    path('importar-viagens/', views.importar_viagens, name='importar_viagens'),
     path('excluir-viagem/<int:viagem_id>/', views.excluir_viagem, name='excluir_viagem'),
     path('buscar-detalhes-viagem/<int:viagem_id>/', views.buscar_detalhes_viagem, name='buscar_detalhes_viagem'),
     
@@ -33,6 +34,10 @@ urlpatterns = [
     path('buscar-relatorios-periodo/', views.buscar_relatorios_periodo, name='buscar_relatorios_periodo'),
     path('buscar-relatorios-mes/', views.buscar_relatorios_mes, name='buscar_relatorios_mes'),
     path('listar-relatorios/', views.listar_relatorios, name='listar_relatorios'),
+    path('exportar-relatorios/', views.exportar_relatorios, name='exportar_relatorios'),
+    path('alteracoes/', views.alteracoes, name='alteracoes'),
+    path('jobs/<int:job_id>/', views.status_job, name='status_job'),
+    path('jobs/<int:job_id>/download/', views.baixar_job, name='baixar_job'),
     path('excluir-relatorio/<int:relatorio_id>/', views.excluir_relatorio, name='excluir_relatorio'),
     path('atualizar-relatorio/<int:relatorio_id>/', views.atualizar_relatorio, name='atualizar_relatorio'),
     
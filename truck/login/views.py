@@ -1,20 +1,35 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth import authenticate, login as auth_login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_protect
-from django.views.decorators.cache import never_cache
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.http import condition
 from django.utils.decorators import method_decorator
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
-from django.db import IntegrityError
-from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
 import json
+import re
 from django.core.paginator import Paginator
-from django.db.models import Sum, Count, Q
+from django.db.models import Count, Q
 from datetime import datetime, timedelta
 from decimal import Decimal, InvalidOperation
 import logging
-from .models import DailyReport, MonthlyCost, MotoristaSalario, CustosGerais, CustoFixoMensal
+from .models import DailyReport, MonthlyCost, MotoristaSalario, CustosGerais, CustoFixoMensal, Job, VALOR_DIARIA
+from . import cache_relatorios, dinheiro, etags, exportacao, importacao, lucro, painel, resumos, sincronizacao, tarefas
+from .busca import filtrar_custos, preencher_texto
+from .comprovantes import ComprovanteInvalido, agendar_versoes, salvar_comprovante
+from .totais import calcular_totais
+from .signals import datas_alteradas
+from .relatorios import (
+    CAMPOS_RELATORIO, CursorInvalido, LIMITE_PADRAO, apaginar_relatorios, aserializar_relatorios,
+    carregar_custos, dados_relatorios_mes, serializar_parcela,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -59,61 +74,18 @@ def login(request):
 def dashboard(request):
     """Dashboard principal com resumo da semana atual"""
     try:
-        from datetime import datetime, timedelta
-        
         logger.info(f'Dashboard acessado por usuário: {request.user.username}')
         
-        # Calcular início da semana atual
+        # Retrato do dia do cache (recalculado só depois de alterações na semana ou no mês atual)
+        # e as últimas viagens (queryset preguiçoso, avaliado só se o template as listar)
         hoje = datetime.now().date()
-        inicio_semana = hoje - timedelta(days=hoje.weekday())
-        
-        logger.info(f'Buscando viagens de {inicio_semana} até {hoje}')
+        context = painel.obter_painel(hoje)
         
-        # Buscar viagens da semana atual com timeout implícito
-        viagens_semana = DailyReport.objects.filter(
-            data_viagem__range=[inicio_semana, hoje]
-        ).order_by('-data_viagem')
-        
-        # Calcular totais - otimizado em uma única query
-        totais = viagens_semana.aggregate(
-            total_viagens=Count('id'),
-            total_diarias=Sum('diarias'),
-            total_valor_diarias=Sum('valor_diarias'),
-            total_gasto_gasolina=Sum('gasto_gasolina')
+        logger.info(
+            f'Dashboard - semana desde {context["inicio_semana"]}: {context["total_viagens"]} viagens, '
+            f'{len(context["custos_fixos_mensais"])} custos fixos'
         )
         
-        total_viagens = totais['total_viagens'] or 0
-        total_diarias = totais['total_diarias'] or 0
-        total_valor_diarias = totais['total_valor_diarias'] or Decimal('0')
-        total_gasto_gasolina = totais['total_gasto_gasolina'] or Decimal('0')
-        
-        logger.info(f'Totais calculados: {total_viagens} viagens')
-        
-        # Buscar custos fixos mensais ativos - otimizado
-        custos_fixos_mensais = CustoFixoMensal.objects.filter(
-            status='ativo'
-        ).filter(
-            Q(data_fim__isnull=True) | Q(data_fim__gte=hoje)
-        )[:20]  # Limitar a 20 registros
-        
-        # Calcular total de custos fixos mensais
-        total_custos_fixos_mensais = sum(float(custo.valor_mensal) for custo in custos_fixos_mensais)
-        
-        logger.info(f'Dashboard - Custos fixos encontrados: {custos_fixos_mensais.count()}')
-        
-        # Buscar últimas 5 viagens - otimizado
-        ultimas_viagens = DailyReport.objects.all().order_by('-data_viagem', '-created_at')[:5]
-        
-        context = {
-            'total_viagens': total_viagens,
-            'total_diarias': total_diarias,
-            'total_valor_diarias': total_valor_diarias,
-            'total_gasto_gasolina': total_gasto_gasolina,
-            'custos_fixos_mensais': custos_fixos_mensais,
-            'total_custos_fixos_mensais': total_custos_fixos_mensais,
-            'ultimas_viagens': ultimas_viagens,
-        }
-        
         logger.info('Dashboard renderizado com sucesso')
         return render(request, 'login/dashboard.html', context)
         
@@ -156,156 +128,47 @@ def create_default_user():
 
 @login_required
 def cadastrar_viagem(request):
-    """View para cadastrar nova viagem"""
+    """View para cadastrar nova viagem.
+
+    A viagem, o salário do motorista e os custos gerais (custo_<n>_*) são
+    gravados pelo mesmo caminho da importação: uma transação, um INSERT por
+    tabela e os totais somados aos resumos do dia e do mês, com a mesma
+    quantidade de queries independente da quantidade de custos. Qualquer valor
+    inválido cancela o cadastro inteiro.
+    """
     if request.method == 'POST':
+        ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
         try:
-            # Debug: Log dos dados recebidos
-            print("Dados POST recebidos:", dict(request.POST))
-            print("Headers:", dict(request.headers))
-            
-            # Validar campos obrigatórios
-            # Aceitar tanto data_viagem quanto dataViagem
-            data_viagem = request.POST.get('data_viagem', '').strip() or request.POST.get('dataViagem', '').strip()
-            partida = request.POST.get('partida', '').strip() or request.POST.get('localPartida', '').strip()
-            chegada = request.POST.get('chegada', '').strip() or request.POST.get('localChegada', '').strip()
-            diarias = request.POST.get('diarias', '').strip() or request.POST.get('quantidadeDiarias', '').strip()
-            litros_gasolina = request.POST.get('litros_gasolina', '').strip() or request.POST.get('litrosGasolina', '').strip()
-            gasto_gasolina = request.POST.get('gasto_gasolina', '').strip() or request.POST.get('valorGasolina', '').strip()
-            receita_frete = request.POST.get('receita_frete', '0').strip() or request.POST.get('receita', '0').strip()
-            motorista = request.POST.get('motorista', '').strip() or request.POST.get('nomeMotorista', '').strip()
-            caminhao = request.POST.get('caminhao', '').strip() or request.POST.get('nomeCaminhao', '').strip()
-            
-            # Dados do salário do motorista
-            salario_base = request.POST.get('salario_base', '0').strip()
-            bonus_viagens = request.POST.get('bonus_viagens', '0').strip()
-            desconto_faltas = request.POST.get('desconto_faltas', '0').strip()
+            linha = {
+                campo: next((request.POST[nome].strip() for nome in nomes if request.POST.get(nome, '').strip()), '')
+                for campo, nomes in importacao.CAMPOS_VIAGEM.items()
+            }
             
-            # Validações
-            if not all([data_viagem, partida, chegada, diarias, litros_gasolina, gasto_gasolina, motorista, caminhao]):
-                error_msg = 'Todos os campos são obrigatórios.'
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return JsonResponse({'success': False, 'message': error_msg})
-                else:
-                    messages.error(request, error_msg)
-                    return render(request, 'login/cadastrar_viagem.html')
+            # Salário do motorista só é gravado se algum valor foi informado
+            salario = {campo: request.POST.get(campo, '0').strip() for campo in importacao.CAMPOS_SALARIO}
+            if any(valor not in ('', '0') for valor in salario.values()):
+                linha.update(salario)
             
-            # Validar formato da data
             try:
-                from datetime import datetime
-                data_obj = datetime.strptime(data_viagem, '%Y-%m-%d')
-            except ValueError as e:
-                error_msg = f'Formato de data inválido. Use YYYY-MM-DD. Data recebida: "{data_viagem}"'
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                linha['custos'] = _custos_do_formulario(request.POST)
+                resultado = importacao.importar_viagens([linha])
+            except importacao.ErroImportacao as e:
+                resultado = {'erros': [{'linha': 1, 'erro': str(e)}]}
+            
+            if resultado['erros']:
+                error_msg = resultado['erros'][0]['erro']
+                if ajax:
                     return JsonResponse({'success': False, 'message': error_msg})
-                else:
-                    messages.error(request, error_msg)
-                    return render(request, 'login/cadastrar_viagem.html')
-            print("=========================")
+                messages.error(request, error_msg)
+                return render(request, 'login/cadastrar_viagem.html')
             
-            # Validar campos numéricos
-            try:
-                diarias_int = int(diarias)
-                litros_float = float(litros_gasolina)
-                gasto_float = float(gasto_gasolina)
-                receita_float = float(receita_frete)
-            except ValueError:
-                error_msg = 'Valores numéricos inválidos.'
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return JsonResponse({'success': False, 'message': error_msg})
-                else:
-                    messages.error(request, error_msg)
-                    return render(request, 'login/cadastrar_viagem.html')
-            
-            # Criar relatório diário
-            relatorio = DailyReport.objects.create(
-                data_viagem=data_viagem,
-                partida=partida,
-                chegada=chegada,
-                diarias=diarias_int,
-                litros_gasolina=Decimal(str(litros_float)),
-                gasto_gasolina=Decimal(str(gasto_float)),
-                receita_frete=Decimal(str(receita_float)),
-                motorista=motorista,
-                caminhao=caminhao
-            )
-            
-            # Salvar salário do motorista se fornecido
-            if motorista and (salario_base != '0' or bonus_viagens != '0' or desconto_faltas != '0'):
-                # Obter ano-mês da data da viagem
-                ano_mes = data_obj.strftime('%Y-%m')
-                
-                # Validar valores do salário
-                try:
-                    salario_base_float = float(salario_base)
-                    bonus_viagens_float = float(bonus_viagens)
-                    desconto_faltas_float = float(desconto_faltas)
-                except ValueError:
-                    salario_base_float = 0.0
-                    bonus_viagens_float = 0.0
-                    desconto_faltas_float = 0.0
-                
-                # Criar ou atualizar salário do motorista
-                salario, created = MotoristaSalario.objects.get_or_create(
-                    motorista=motorista,
-                    ano_mes=ano_mes,
-                    defaults={
-                        'salario_base': Decimal(str(salario_base_float)),
-                        'bonus_viagens': Decimal(str(bonus_viagens_float)),
-                        'desconto_faltas': Decimal(str(desconto_faltas_float))
-                    }
-                )
-                
-                if not created:
-                    salario.salario_base = Decimal(str(salario_base_float))
-                    salario.bonus_viagens = Decimal(str(bonus_viagens_float))
-                    salario.desconto_faltas = Decimal(str(desconto_faltas_float))
-                    salario.save()
-            
-            # Processar custos gerais
-            
-            custos_salvos = 0
-            index = 0
-            while True:
-                tipo_gasto = request.POST.get(f'custo_{index}_tipo_gasto')
-                
-                if not tipo_gasto:
-                    break
-                
-                oficina_fornecedor = request.POST.get(f'custo_{index}_oficina_fornecedor', '').strip()
-                descricao = request.POST.get(f'custo_{index}_descricao', '').strip()
-                valor = request.POST.get(f'custo_{index}_valor', '0')
-                forma_pagamento = request.POST.get(f'custo_{index}_forma_pagamento', 'vista')
-                status_pagamento = request.POST.get(f'custo_{index}_status_pagamento', 'pago')
-                
-                
-                if oficina_fornecedor and descricao and valor:
-                    try:
-                        custo = CustosGerais.objects.create(
-                            relatorio=relatorio,
-                            tipo_gasto=tipo_gasto,
-                            data=data_obj.date(),  # Converter para objeto date
-                            veiculo_placa=caminhao,  # Usar o nome do caminhão como placa
-                            oficina_fornecedor=oficina_fornecedor,
-                            descricao=descricao,
-                            valor=Decimal(valor),
-                            forma_pagamento=forma_pagamento,
-                            status_pagamento=status_pagamento
-                        )
-                        custos_salvos += 1
-                    except Exception as e:
-                        pass
-                else:
-                    pass
-                
-                index += 1
-            
-            
-            mensagem = f'Viagem cadastrada com sucesso! Valor das diárias: R$ {relatorio.valor_diarias:.2f}'
-            if custos_salvos > 0:
-                mensagem += f' | {custos_salvos} custo(s) geral(is) adicionado(s)'
+            valor_diarias = int(linha['diarias']) * VALOR_DIARIA
+            mensagem = f'Viagem cadastrada com sucesso! Valor das diárias: R$ {valor_diarias:.2f}'
+            if resultado['custos'] > 0:
+                mensagem += f' | {resultado["custos"]} custo(s) geral(is) adicionado(s)'
             
             # Verificar se é uma requisição AJAX
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            if ajax:
                 return JsonResponse({'success': True, 'message': mensagem})
             else:
                 messages.success(request, mensagem)
@@ -313,7 +176,7 @@ def cadastrar_viagem(request):
             
         except Exception as e:
             logger.error(f'Erro ao cadastrar viagem: {e}')
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            if ajax:
                 return JsonResponse({'success': False, 'message': f'Erro ao cadastrar viagem: {str(e)}'})
             else:
                 messages.error(request, 'Erro ao cadastrar viagem. Tente novamente.')
@@ -321,172 +184,161 @@ def cadastrar_viagem(request):
     return render(request, 'login/cadastrar_viagem.html')
 
 @login_required
-def listar_relatorios(request):
-    """View para listar todos os relatórios"""
+def importar_viagens(request):
+    """API para importar viagens em massa.
+
+    Aceita um arquivo CSV/JSON no campo 'arquivo' (multipart) ou o JSON no corpo.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método não permitido'}, status=405)
+
     try:
-        # Usar raw SQL para evitar problemas de conversão Decimal
-        from django.db import connection
-        
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT id, data_viagem, partida, chegada, diarias, 
-                       litros_gasolina, gasto_gasolina, receita_frete, 
-                       motorista, caminhao, valor_diarias
-                FROM login_dailyreport 
-                ORDER BY data_viagem DESC, created_at DESC
-            """)
-            
-            columns = [col[0] for col in cursor.description]
-            relatorios_raw = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        arquivo = request.FILES.get('arquivo')
+        if arquivo:
+            if arquivo.name.lower().endswith('.json'):
+                linhas = importacao.ler_json(arquivo.read())
+            else:
+                linhas = importacao.ler_csv(arquivo.read())
+        else:
+            linhas = importacao.ler_json(request.body)
+        resultado = importacao.importar_viagens(linhas)
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'success': False, 'error': f'Arquivo inválido: {e}'}, status=400)
+    except Exception as e:
+        logger.error(f'Erro ao importar viagens: {e}', exc_info=True)
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+    if resultado['erros']:
+        return JsonResponse({'success': False, 'error': 'Linhas inválidas; nada foi importado', **resultado}, status=400)
+
+    logger.info(f'Importadas {resultado["viagens"]} viagens via API')
+    return JsonResponse({'success': True, **resultado})
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@etags.condicao_assincrona(etags.etag_listar_relatorios)
+async def listar_relatorios(request):
+    """API paginada (por chave) para listar relatórios, com filtros no servidor (view assíncrona).
+
+    Parâmetros GET: cursor, limite, motorista, caminhao, data_inicio, data_fim.
+    """
+    try:
+        data_inicio = request.GET.get('data_inicio')
+        data_fim = request.GET.get('data_fim')
+        pagina, next_cursor = await apaginar_relatorios(
+            cursor=request.GET.get('cursor') or None,
+            limite=request.GET.get('limite') or LIMITE_PADRAO,
+            motorista=request.GET.get('motorista', '').strip() or None,
+            caminhao=request.GET.get('caminhao', '').strip() or None,
+            data_inicio=datetime.strptime(data_inicio, '%Y-%m-%d').date() if data_inicio else None,
+            data_fim=datetime.strptime(data_fim, '%Y-%m-%d').date() if data_fim else None,
+        )
+    except (CursorInvalido, ValueError) as e:
+        return JsonResponse({'relatorios': [], 'next_cursor': None, 'error': str(e)}, status=400)
     except Exception as e:
         logger.error(f'Erro ao buscar relatórios: {e}', exc_info=True)
-        return JsonResponse({'relatorios': []})
-    
+        return JsonResponse({'relatorios': [], 'next_cursor': None})
     
-    # Converter para formato JSON
-    relatorios_data = []
+    # Converter para formato JSON (salários e custos carregados em lote)
     try:
-        for relatorio in relatorios_raw:
-            # Buscar salário do motorista para o mês da viagem
-            from datetime import datetime
-            data_obj = datetime.strptime(str(relatorio['data_viagem']), '%Y-%m-%d')
-            ano_mes = data_obj.strftime('%Y-%m')
-        
-            try:
-                salario = MotoristaSalario.objects.get(
-                    motorista=relatorio['motorista'],
-                    ano_mes=ano_mes
-                )
-                salario_liquido = salario.get_salario_liquido()
-            except MotoristaSalario.DoesNotExist:
-                salario = None
-                salario_liquido = 0
-            
-            # Buscar custos gerais da viagem usando o relacionamento
-            custos_gerais = CustosGerais.objects.filter(relatorio_id=relatorio['id'])
-            total_custos_gerais = custos_gerais.aggregate(Sum('valor'))['valor__sum'] or Decimal('0')
-            
-            # Buscar TODAS as parcelas de custos gerais da viagem
-            todas_parcelas = []
-            print(f"=== RELATÓRIO {relatorio['id']} - COLETANDO PARCELAS ===")
-            print(f"Total de custos gerais: {len(custos_gerais)}")
-            
-            for custo in custos_gerais:
-                print(f"Custo {custo.id}: {custo.descricao} - Forma: {custo.forma_pagamento}")
-                # Sempre adicionar o custo como uma "parcela"
-                todas_parcelas.append({
-                    'id': f"custo_{custo.id}",
-                    'custo_id': custo.id,
-                    'tipo_gasto': custo.get_tipo_gasto_display(),
-                    'descricao': custo.descricao,
-                    'oficina_fornecedor': custo.oficina_fornecedor or 'N/A',
-                    'veiculo_placa': custo.veiculo_placa or 'N/A',
-                    'numero_parcela': 1,
-                    'valor_parcela': float(custo.valor),
-                    'data_vencimento': custo.data.strftime('%d/%m/%Y'),
-                    'status_pagamento': custo.get_status_pagamento_display(),
-                    'paga': custo.status_pagamento == 'pago',
-                    'forma_pagamento': custo.get_forma_pagamento_display(),
-                    'observacoes': custo.observacoes or ''
-                })
-            
-                # REMOVIDO: Sistema simplificado sem parcelas
-                # O modelo CustosGerais não tem atributo 'parcelas'
-            
-            # NÃO incluir custos fixos mensais aqui (mostrados apenas no relatório mensal)
-        
-            # Ordenar todas as parcelas por data de vencimento
-            todas_parcelas.sort(key=lambda x: datetime.strptime(x['data_vencimento'], '%d/%m/%Y'))
-            
-            print(f"Total de parcelas coletadas: {len(todas_parcelas)}")
-            print(f"Primeiras 3 parcelas: {todas_parcelas[:3] if todas_parcelas else 'Nenhuma'}")
-            
-            # Preparar lista de custos gerais para o frontend (sem parcelas individuais)
-            custos_gerais_list = []
-            for custo in custos_gerais:
-                custos_gerais_list.append({
-                    'id': custo.id,
-                    'tipo_gasto': custo.get_tipo_gasto_display(),
-                    'oficina_fornecedor': custo.oficina_fornecedor,
-                    'descricao': custo.descricao,
-                    'valor': float(custo.valor),
-                    'forma_pagamento': custo.get_forma_pagamento_display(),
-                    'status_pagamento': custo.get_status_pagamento_display(),
-                    'veiculo_placa': custo.veiculo_placa,
-                    'data_vencimento': custo.data_vencimento.strftime('%d/%m/%Y') if custo.data_vencimento else None,
-                    'observacoes': custo.observacoes
-                })
-        
-            # Calcular totais com conversões seguras
-            try:
-                total_diarias = float(relatorio['valor_diarias']) if relatorio['valor_diarias'] else 0.0
-            except (TypeError, ValueError, InvalidOperation):
-                total_diarias = 0.0
-                
-            try:
-                gasto_gasolina = float(relatorio['gasto_gasolina']) if relatorio['gasto_gasolina'] else 0.0
-            except (TypeError, ValueError, InvalidOperation):
-                gasto_gasolina = 0.0
-                
-            try:
-                receita_frete = float(relatorio['receita_frete']) if relatorio['receita_frete'] else 0.0
-            except (TypeError, ValueError, InvalidOperation):
-                receita_frete = 0.0
-                
-            try:
-                custos_gerais_float = float(total_custos_gerais) if total_custos_gerais else 0.0
-            except (TypeError, ValueError, InvalidOperation):
-                custos_gerais_float = 0.0
-                
-            total_despesas = gasto_gasolina + total_diarias + float(salario_liquido) + custos_gerais_float
-            lucro_liquido = receita_frete - total_despesas
-            
-            relatorio_data = {
-                'id': relatorio['id'],
-                'date': str(relatorio['data_viagem']),
-                'localPartida': relatorio['partida'],
-                'localChegada': relatorio['chegada'],
-                'quantidadeDiarias': relatorio['diarias'],
-                'totalDiarias': total_diarias,
-                'litrosGasolina': float(relatorio['litros_gasolina']) if relatorio['litros_gasolina'] else 0.0,
-                'valorGasolina': gasto_gasolina,
-                'nomeMotorista': relatorio['motorista'],
-                'nomeCaminhao': relatorio['caminhao'],
-                'receita': receita_frete,
-                'totalGastosViagem': gasto_gasolina + total_diarias,
-                'totalCustosGerais': custos_gerais_float,
-                'totalDespesas': total_despesas,
-                'lucroLiquido': lucro_liquido,
-                'salarioBase': float(salario.salario_base) if salario and salario.salario_base else 0,
-                'bonusViagens': float(salario.bonus_viagens) if salario and salario.bonus_viagens else 0,
-                'descontoFaltas': float(salario.desconto_faltas) if salario and salario.desconto_faltas else 0,
-                'salarioLiquido': float(salario_liquido),
-                'custosGerais': custos_gerais_list,
-                'todasParcelas': todas_parcelas,
-                'totalParcelas': len(todas_parcelas),
-                'parcelasPagas': len([p for p in todas_parcelas if p['paga']]),
-                'parcelasPendentes': len([p for p in todas_parcelas if not p['paga']])
-            }
-
-            # Campos de compatibilidade esperados pelo frontend da tabela
-            relatorio_data.update({
-                'data_viagem': str(relatorio['data_viagem']) if relatorio.get('data_viagem') else '',
-                'partida': relatorio.get('partida') or '',
-                'chegada': relatorio.get('chegada') or '',
-                'motorista': relatorio.get('motorista') or '',
-                'receita_frete': receita_frete or 0.0,
-                'gasto_gasolina': gasto_gasolina or 0.0,
-                'valor_diarias': total_diarias or 0.0,
-                # Usado no resumo da busca
-                'totalGastos': (gasto_gasolina + total_diarias)
-            })
-            
-            relatorios_data.append(relatorio_data)
-        
-        return JsonResponse({'relatorios': relatorios_data})
+        relatorios_data = await aserializar_relatorios(pagina)
+        return JsonResponse({'relatorios': relatorios_data, 'next_cursor': next_cursor})
     except Exception as e:
         logger.error(f'Erro ao processar relatórios: {e}', exc_info=True)
-        return JsonResponse({'relatorios': []})
+        return JsonResponse({'relatorios': [], 'next_cursor': None})
+
+@login_required
+def exportar_relatorios(request):
+    """Exporta viagens ou custos gerais de um período em CSV/XLSX (streaming).
+
+    Parâmetros GET: tipo (viagens|custos), formato (csv|xlsx), data_inicio, data_fim.
+    Com em_segundo_plano=1 a exportação vai para a fila de tarefas (resposta 202 com o job).
+    """
+    tipo = request.GET.get('tipo', 'viagens')
+    formato = request.GET.get('formato', 'csv')
+    if tipo not in ('viagens', 'custos') or formato not in exportacao.FORMATOS:
+        return JsonResponse({'success': False, 'error': 'Tipo ou formato de exportação inválido'}, status=400)
+
+    try:
+        data_inicio = request.GET.get('data_inicio')
+        data_fim = request.GET.get('data_fim')
+        data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date() if data_inicio else None
+        data_fim = datetime.strptime(data_fim, '%Y-%m-%d').date() if data_fim else None
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    if _em_segundo_plano(request):
+        return _resposta_enfileirada(request, 'exportacao', {
+            'tipo': tipo, 'formato': formato,
+            'data_inicio': data_inicio.isoformat() if data_inicio else None,
+            'data_fim': data_fim.isoformat() if data_fim else None,
+        })
+
+    periodo = f"{data_inicio or 'inicio'}_{data_fim or 'hoje'}"
+    response = StreamingHttpResponse(
+        exportacao.exportar(tipo, formato, data_inicio, data_fim),
+        content_type=exportacao.FORMATOS[formato]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{tipo}_{periodo}.{formato}"'
+    return response
+
+def _em_segundo_plano(request):
+    """A requisição pediu para executar na fila de tarefas (?em_segundo_plano=1)"""
+    return (request.GET.get('em_segundo_plano') or request.POST.get('em_segundo_plano')) in ('1', 'true')
+
+def _dados_job(job):
+    """Representação JSON de uma tarefa da fila, com as URLs de status e de download"""
+    dados = {
+        'id': job.id,
+        'tipo': job.tipo,
+        'status': job.status,
+        'tentativas': job.tentativas,
+        'erro': job.erro,
+        'created_at': job.created_at.isoformat(),
+        'concluido_em': job.concluido_em.isoformat() if job.concluido_em else None,
+        'status_url': reverse('status_job', args=[job.id]),
+        'resultado': job.resultado if job.status == 'concluido' else None,
+        'download_url': None,
+    }
+    if job.status == 'concluido' and job.arquivo:
+        dados['download_url'] = reverse('baixar_job', args=[job.id])
+    return dados
+
+def _resposta_enfileirada(request, tipo, parametros):
+    """Enfileira a tarefa e responde na hora (202), com a URL para acompanhar o status"""
+    job = tarefas.enfileirar(tipo, parametros, usuario=request.user)
+    return JsonResponse({'success': True, 'job': _dados_job(job)}, status=202)
+
+@login_required
+@never_cache
+def status_job(request, job_id):
+    """Status de uma tarefa da fila (o cliente consulta até 'concluido' ou 'erro')"""
+    job = get_object_or_404(Job, id=job_id, usuario=request.user)
+    return JsonResponse({'success': True, 'job': _dados_job(job)})
+
+@login_required
+def baixar_job(request, job_id):
+    """Download do arquivo gerado por uma tarefa concluída (exportações)"""
+    job = get_object_or_404(Job, id=job_id, usuario=request.user, status='concluido')
+    if not job.arquivo:
+        raise Http404('Tarefa sem arquivo')
+    return FileResponse(
+        job.arquivo.open('rb'), as_attachment=True, filename=job.resultado.get('nome_arquivo'),
+        content_type=job.resultado.get('content_type')
+    )
+
+@login_required
+def alteracoes(request):
+    """API de sincronização incremental para a cópia local do frontend.
+
+    Parâmetro GET: desde (token devolvido pela chamada anterior; sem ele, carga completa).
+    O cliente aplica as linhas recebidas por id e depois remove os ids em 'excluidos'.
+    """
+    try:
+        dados = sincronizacao.alteracoes(request.GET.get('desde') or None)
+    except sincronizacao.TokenInvalido as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'success': True, **dados})
 
 @login_required
 def excluir_relatorio(request, relatorio_id):
@@ -503,6 +355,11 @@ def excluir_relatorio(request, relatorio_id):
                 logger.warning(f'Relatório {relatorio_id} não encontrado')
                 return JsonResponse({'success': False, 'message': 'Relatório não encontrado!'})
         
+        # Datas afetadas, para recalcular os resumos e o cache (o SQL direto não dispara signals)
+        datas_afetadas = set(DailyReport.objects.filter(id=relatorio_id).values_list('data_viagem', flat=True))
+        custos_relatorio = list(CustosGerais.objects.filter(relatorio_id=relatorio_id).values_list('id', 'data'))
+        datas_afetadas.update(data for _, data in custos_relatorio)
+        
         # Excluir custos gerais relacionados primeiro via SQL
         try:
             with connection.cursor() as cursor:
@@ -526,6 +383,10 @@ def excluir_relatorio(request, relatorio_id):
             logger.error(f'Erro ao excluir relatório via SQL: {e}', exc_info=True)
             return JsonResponse({'success': False, 'message': f'Erro ao excluir relatório: {str(e)}'})
         
+        datas_alteradas(datas_afetadas)
+        sincronizacao.registrar_exclusoes('custo_geral', [custo_id for custo_id, _ in custos_relatorio])
+        sincronizacao.registrar_exclusoes('relatorio', [relatorio_id])
+        
         return JsonResponse({'success': True, 'message': 'Relatório excluído com sucesso!'})
         
     except Exception as e:
@@ -550,198 +411,64 @@ def relatorio_semanal(request):
                 data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date()
                 data_fim = datetime.strptime(data_fim, '%Y-%m-%d').date()
                 
-                # Buscar relatórios do período usando SQL raw para evitar problemas de conversão Decimal
-                from django.db import connection
-                
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT id, data_viagem, partida, chegada, diarias, 
-                               litros_gasolina, gasto_gasolina, receita_frete, 
-                               motorista, caminhao, valor_diarias
-                        FROM login_dailyreport 
-                        WHERE data_viagem BETWEEN %s AND %s 
-                        ORDER BY data_viagem
-                    """, [data_inicio, data_fim])
-                    
-                    columns = [col[0] for col in cursor.description]
-                    relatorios = [dict(zip(columns, row)) for row in cursor.fetchall()]
-                
-                # Calcular totais usando agregação direta no banco
-                try:
-                    total_litros = DailyReport.objects.filter(
-                        data_viagem__range=[data_inicio, data_fim]
-                    ).aggregate(Sum('litros_gasolina'))['litros_gasolina__sum'] or Decimal('0')
-                except Exception:
-                    total_litros = Decimal('0')
-                
-                try:
-                    total_gasto_gasolina = DailyReport.objects.filter(
-                        data_viagem__range=[data_inicio, data_fim]
-                    ).aggregate(Sum('gasto_gasolina'))['gasto_gasolina__sum'] or Decimal('0')
-                except Exception:
-                    total_gasto_gasolina = Decimal('0')
-                
-                try:
-                    total_diarias = DailyReport.objects.filter(
-                        data_viagem__range=[data_inicio, data_fim]
-                    ).aggregate(Sum('diarias'))['diarias__sum'] or 0
-                except Exception:
-                    total_diarias = 0
-                
-                try:
-                    total_valor_diarias = DailyReport.objects.filter(
-                        data_viagem__range=[data_inicio, data_fim]
-                    ).aggregate(Sum('valor_diarias'))['valor_diarias__sum'] or Decimal('0')
-                except Exception:
-                    total_valor_diarias = Decimal('0')
-                
-                try:
-                    total_receita_frete = DailyReport.objects.filter(
-                        data_viagem__range=[data_inicio, data_fim]
-                    ).aggregate(Sum('receita_frete'))['receita_frete__sum'] or Decimal('0')
-                except Exception:
-                    total_receita_frete = Decimal('0')
-                
-                # Converter para float para evitar problemas com Decimal
-                total_gasto_gasolina_float = float(total_gasto_gasolina)
-                total_valor_diarias_float = float(total_valor_diarias)
-                total_receita_frete_float = float(total_receita_frete)
+                # Buscar relatórios do período
+                relatorios = list(DailyReport.objects.filter(
+                    data_viagem__range=[data_inicio, data_fim]
+                ).order_by('data_viagem', 'id').values(*CAMPOS_RELATORIO))
                 
-                total_gastos = total_gasto_gasolina_float + total_valor_diarias_float
-                lucro = total_receita_frete_float - total_gasto_gasolina_float - total_valor_diarias_float
+                # Todos os totais do período (uma query por tabela)
+                totais = calcular_totais(data_inicio, data_fim)
                 
-                # Resumo por motorista usando agregação direta
-                try:
-                    resumo_motorista = DailyReport.objects.filter(
-                        data_viagem__range=[data_inicio, data_fim]
-                    ).values('motorista').annotate(
-                        total_viagens=Count('id'),
-                        total_diarias=Sum('diarias'),
-                        total_valor_diarias=Sum('valor_diarias'),
-                        total_gasto_gasolina=Sum('gasto_gasolina'),
-                        total_receita_frete=Sum('receita_frete')
-                    ).order_by('motorista')
-                except Exception:
-                    resumo_motorista = []
+                resumo_motorista = resumos.resumo_por('motorista', data_inicio, data_fim)
+                resumo_caminhao = resumos.resumo_por('caminhao', data_inicio, data_fim)
                 
-                # Resumo por caminhão usando agregação direta
-                try:
-                    resumo_caminhao = DailyReport.objects.filter(
-                        data_viagem__range=[data_inicio, data_fim]
-                    ).values('caminhao').annotate(
-                        total_viagens=Count('id'),
-                        total_diarias=Sum('diarias'),
-                        total_valor_diarias=Sum('valor_diarias'),
-                        total_gasto_gasolina=Sum('gasto_gasolina'),
-                        total_receita_frete=Sum('receita_frete')
-                    ).order_by('caminhao')
-                except Exception:
-                    resumo_caminhao = []
+                # Lucro de cada viagem pelo motor de lucro (o template usa relatorio.get_lucro)
+                periodo = lucro.calcular_periodo(data_inicio, data_fim, relatorios)
+                for relatorio, lucro_bruto in zip(relatorios, periodo['lucro_bruto']):
+                    relatorio['get_lucro'] = dinheiro.reais(lucro_bruto)
                 
-                # Buscar custos fixos mensais ativos no período
-                custos_fixos_mensais = CustoFixoMensal.objects.filter(
-                    status='ativo',
-                    data_inicio__lte=data_fim
-                ).filter(
-                    Q(data_fim__isnull=True) | Q(data_fim__gte=data_inicio)
-                )
+                # Custos fixos mensais ativos no período (proporcionais ao período)
+                custos_fixos_mensais = totais['custos_fixos_mensais']
                 
                 # Sistema simplificado - sem parcelas
                 parcelas_periodo = []
-                
-                # Calcular total de custos fixos mensais (proporcional ao período)
-                total_custos_fixos_mensais = 0
-                for custo in custos_fixos_mensais:
-                    # Calcular quantos dias do período o custo está ativo
-                    inicio_ativo = max(custo.data_inicio, data_inicio)
-                    fim_ativo = min(custo.data_fim or data_fim, data_fim)
-                    dias_ativo = (fim_ativo - inicio_ativo).days + 1
-                    dias_periodo = (data_fim - data_inicio).days + 1
-                    proporcao = dias_ativo / dias_periodo
-                    total_custos_fixos_mensais += float(custo.valor_mensal) * proporcao
-                
-                # Calcular total de parcelas vencidas no período
-                total_parcelas_periodo = sum(float(parcela.valor_parcela) for parcela in parcelas_periodo)
+                total_parcelas_periodo = 0
                 
                 # Buscar custos gerais do período para incluir parcelas individuais
                 custos_gerais_periodo = CustosGerais.objects.filter(
                     data__range=[data_inicio, data_fim]
                 )
                 
-                # Criar lista de custos gerais incluindo parcelas individuais
-                custos_gerais_detalhados = []
-                
-                for custo in custos_gerais_periodo:
-                    # Sistema simplificado - sem parcelas
-                    if False:  # Desabilitado
-                        # Para custos parcelados, mostrar cada parcela como um custo separado
-                        # for parcela in custo.parcelas.all():  # COMENTADO: modelo não tem parcelas
-
-                        if False:  # Bloco desabilitado
-                            # Criar um objeto similar ao custo original mas com dados da parcela
-                            class ParcelaCustoWrapper:
-                                def __init__(self, custo_original, parcela):
-                                    self.id = f"{custo_original.id}_{parcela.id}"
-                                    self.data = custo_original.data
-                                    self.tipo_gasto = custo_original.tipo_gasto
-                                    self.veiculo_placa = custo_original.veiculo_placa
-                                    self.oficina_fornecedor = custo_original.oficina_fornecedor
-                                    self.descricao = f"{custo_original.descricao} - Parcela {parcela.numero_parcela}"
-                                    self.valor = parcela.valor_parcela
-                                    self.forma_pagamento = custo_original.forma_pagamento
-                                    self.status_pagamento = parcela.status_pagamento
-                                    self.data_vencimento = parcela.data_vencimento
-                                    self.observacoes = custo_original.observacoes
-                                    self.comprovante = custo_original.comprovante
-                                    self.created_at = custo_original.created_at
-                                    self.updated_at = custo_original.updated_at
-                                    self.get_tipo_gasto_display = custo_original.get_tipo_gasto_display
-                                    self.get_forma_pagamento_display = custo_original.get_forma_pagamento_display
-                                    self.get_status_pagamento_display = parcela.get_status_pagamento_display
-                                    self.is_parcela = True
-                                    self.parcela_numero = parcela.numero_parcela
-                                    self.total_parcelas = custo_original.parcelas.count()
-                                    self.parcelas_pagas = custo_original.parcelas.filter(status_pagamento='pago').count()
-                                    self.parcelas_pendentes = custo_original.parcelas.filter(status_pagamento='pendente').count()
-                                    self.valor_parcela = parcela.valor_parcela
-                            
-                            parcela_custo = ParcelaCustoWrapper(custo, parcela)
-                            custos_gerais_detalhados.append(parcela_custo)
-                    else:
-                        # Para custos não parcelados, adicionar normalmente
-                        custo.is_parcela = False
-                        custo.total_parcelas = 0
-                        # # custo.parcelas_pagas = 0  # REMOVIDO: atributo não existe  # REMOVIDO: atributo não existe
-                        # # custo.parcelas_pendentes = 0  # REMOVIDO: atributo não existe  # REMOVIDO: atributo não existe
-                        custo.valor_parcela = 0
-                        custos_gerais_detalhados.append(custo)
+                # Custos gerais detalhados (sem parcelas)
+                custos_gerais_detalhados = list(custos_gerais_periodo)
+                for custo in custos_gerais_detalhados:
+                    custo.is_parcela = False
+                    custo.total_parcelas = 0
+                    custo.valor_parcela = 0
                 
                 # Ordenar por data e descrição
                 custos_gerais_detalhados.sort(key=lambda x: (x.data, x.descricao))
                 
-                # Recalcular total de custos gerais com as parcelas individuais
-                total_custos_gerais_detalhados = sum(float(custo.valor) for custo in custos_gerais_detalhados)
-                
-                # Atualizar total de gastos para incluir custos gerais
-                total_gastos = total_gasto_gasolina_float + total_valor_diarias_float + total_custos_gerais_detalhados
-                lucro = total_receita_frete_float - total_gastos
+                # Total de gastos com os custos gerais (Decimal exato, sem passar por float)
+                total_gastos = totais['total_gastos_viagem'] + totais['total_custos_gerais']
+                lucro_periodo = totais['total_receita_frete'] - total_gastos
                 
                 context = {
                     'relatorios': relatorios,
                     'data_inicio': data_inicio,
                     'data_fim': data_fim,
-                    'total_litros': float(total_litros),
-                    'total_gasto_gasolina': total_gasto_gasolina_float,
-                    'total_diarias': total_diarias,
-                    'total_valor_diarias': total_valor_diarias_float,
-                    'total_receita_frete': total_receita_frete_float,
+                    'total_litros': totais['total_litros'],
+                    'total_gasto_gasolina': totais['total_gasto_gasolina'],
+                    'total_diarias': totais['total_diarias'],
+                    'total_valor_diarias': totais['total_valor_diarias'],
+                    'total_receita_frete': totais['total_receita_frete'],
                     'total_gastos': total_gastos,
-                    'lucro': lucro,
+                    'lucro': lucro_periodo,
                     'custos_fixos_mensais': custos_fixos_mensais,
-                    'total_custos_fixos_mensais': total_custos_fixos_mensais,
+                    'total_custos_fixos_mensais': totais['total_custos_fixos_mensais'],
                     'parcelas_periodo': parcelas_periodo,
                     'custos_gerais_detalhados': custos_gerais_detalhados,
-                    'total_custos_gerais': total_custos_gerais_detalhados,
+                    'total_custos_gerais': totais['total_custos_gerais'],
                     'total_parcelas_periodo': total_parcelas_periodo,
                     'resumo_motorista': resumo_motorista,
                     'resumo_caminhao': resumo_caminhao,
@@ -765,6 +492,16 @@ def relatorio_mensal(request):
     
     logger.info(f'Relatório mensal - Método: {request.method}, ano_mes: {ano_mes}')
     
+    # Na fila de tarefas: o resultado são os dados da API de relatórios por mês
+    if ano_mes and _em_segundo_plano(request):
+        try:
+            if len(ano_mes) != 7 or ano_mes[4] != '-':
+                raise ValueError(f'Formato de data inválido: {ano_mes}')
+            resumos.limites_mes(ano_mes)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        return _resposta_enfileirada(request, 'relatorio_mensal', {'ano_mes': ano_mes})
+    
     if ano_mes:
         try:
             logger.info(f'Processando relatório para: {ano_mes}')
@@ -772,21 +509,14 @@ def relatorio_mensal(request):
             # Validar formato do ano_mes
             if len(ano_mes) != 7 or ano_mes[4] != '-':
                 raise ValueError(f'Formato de data inválido: {ano_mes}')
+            data_inicio_mes, data_fim_mes = resumos.limites_mes(ano_mes)
             
-            # Buscar relatórios do mês usando ORM do Django
-            relatorios = DailyReport.objects.filter(
-                data_viagem__year=ano_mes[:4],
-                data_viagem__month=ano_mes[5:7]
-            ).order_by('data_viagem')
-            
-            # Debug: verificar dados dos relatórios
-            for relatorio in relatorios:
-                logger.info(f'Relatório {relatorio.id}: motorista={relatorio.motorista}, caminhao={relatorio.caminhao}, partida={relatorio.partida}, chegada={relatorio.chegada}')
-            
-            logger.info(f'Encontrados {relatorios.count()} relatórios para {ano_mes}')
+            # Todos os totais do mês (uma query por tabela)
+            totais = calcular_totais(data_inicio_mes, data_fim_mes, ano_mes=ano_mes)
+            logger.info(f'Encontrados {totais["total_viagens"]} relatórios para {ano_mes}')
             
             # Se não há relatórios, mostrar mensagem
-            if relatorios.count() == 0:
+            if totais['total_viagens'] == 0:
                 messages.info(request, f'Nenhum relatório encontrado para {ano_mes}')
                 return render(request, 'login/relatorio_mensal.html', {
                     'ano_mes': ano_mes,
@@ -802,322 +532,54 @@ def relatorio_mensal(request):
                     'preencher_custos': False
                 })
             
-            # Calcular totais usando agregação direta no banco
-            try:
-                total_diarias = relatorios.aggregate(Sum('diarias'))['diarias__sum'] or 0
-                logger.info(f'Total diárias: {total_diarias}')
-            except Exception as e:
-                logger.error(f'Erro ao calcular diárias: {e}')
-                total_diarias = 0
-            
-            try:
-                total_valor_diarias = relatorios.aggregate(Sum('valor_diarias'))['valor_diarias__sum'] or Decimal('0')
-                logger.info(f'Total valor diárias: {total_valor_diarias}')
-            except Exception as e:
-                logger.error(f'Erro ao calcular valor diárias: {e}')
-                total_valor_diarias = Decimal('0')
-            
-            try:
-                total_litros = relatorios.aggregate(Sum('litros_gasolina'))['litros_gasolina__sum'] or Decimal('0')
-                logger.info(f'Total litros: {total_litros}')
-            except Exception as e:
-                logger.error(f'Erro ao calcular litros: {e}')
-                total_litros = Decimal('0')
-            
-            try:
-                total_gasto_gasolina = relatorios.aggregate(Sum('gasto_gasolina'))['gasto_gasolina__sum'] or Decimal('0')
-                logger.info(f'Total gasto gasolina: {total_gasto_gasolina}')
-            except Exception as e:
-                logger.error(f'Erro ao calcular gasto gasolina: {e}')
-                total_gasto_gasolina = Decimal('0')
-            
-            try:
-                total_receita_frete = relatorios.aggregate(Sum('receita_frete'))['receita_frete__sum'] or Decimal('0')
-                logger.info(f'Total receita frete: {total_receita_frete}')
-            except Exception as e:
-                logger.error(f'Erro ao calcular receita frete: {e}')
-                total_receita_frete = Decimal('0')
-            
-            # Buscar ou criar custos fixos do mês
-            try:
-                custos_fixos, created = MonthlyCost.objects.get_or_create(
-                    ano_mes=ano_mes,
-                    defaults={
-                        'pecas': Decimal('0'),
-                        'seguro': Decimal('0'),
-                        'manutencao': Decimal('0')
-                    }
-                )
-                logger.info(f'Custos fixos: {custos_fixos}, Criado: {created}')
-            except Exception as e:
-                logger.error(f'Erro ao buscar/criar custos fixos: {e}')
-                custos_fixos = None
-                created = False
-            
-            
-            # Buscar custos gerais do mês
-            try:
-                custos_gerais_mes = CustosGerais.objects.filter(
-                    data__year=ano_mes[:4],
-                    data__month=ano_mes[5:7]
-                )
-                total_custos_gerais = custos_gerais_mes.aggregate(Sum('valor'))['valor__sum'] or Decimal('0')
-                logger.info(f'Total custos gerais: {total_custos_gerais}')
-            except Exception as e:
-                logger.error(f'Erro ao calcular custos gerais: {e}')
-                custos_gerais_mes = CustosGerais.objects.none()
-                total_custos_gerais = Decimal('0')
-            
-            # Buscar custos fixos mensais ativos no período
-            try:
-                from datetime import datetime
-                from dateutil.relativedelta import relativedelta
-                
-                # Buscar custos fixos mensais do modelo CustoFixoMensal
-                ano = int(ano_mes[:4])
-                mes = int(ano_mes[5:7])
-                
-                # Buscar custos fixos que estão ativos no mês específico
-                from django.db import models
-                from datetime import datetime
-                import calendar
-                
-                # Obter o último dia do mês
-                ultimo_dia_mes = calendar.monthrange(ano, mes)[1]
-                
-                custos_fixos_mensais = CustoFixoMensal.objects.filter(
-                    status='ativo',
-                    data_inicio__lte=f'{ano}-{mes:02d}-{ultimo_dia_mes}',  # Início antes ou no mês
-                ).filter(
-                    models.Q(data_fim__isnull=True) | models.Q(data_fim__gte=f'{ano}-{mes:02d}-01')  # Fim nulo ou depois do mês
-                )
-                
-                total_custos_fixos_mensais = custos_fixos_mensais.aggregate(Sum('valor_mensal'))['valor_mensal__sum'] or Decimal('0')
-                
-                # Calcular período para parcelas
-                data_inicio_mes = datetime.strptime(f"{ano_mes}-01", '%Y-%m-%d').date()
-                data_fim_mes = (data_inicio_mes + relativedelta(months=1) - timedelta(days=1))
-                logger.info(f'Período: {data_inicio_mes} a {data_fim_mes}')
-                
-                # Sistema simplificado - sem parcelas
-                parcelas_mes = []
-                total_parcelas_mes = 0
-                
-                # Se é um novo registro, pedir para preencher os custos
-                if created:
-                    messages.info(request, f'Preencha os custos fixos para {ano_mes}')
-                    return render(request, 'login/relatorio_mensal.html', {
-                        'ano_mes': ano_mes,
-                        'custos_fixos': custos_fixos,
-                        'relatorios': relatorios,
-                        'total_diarias': total_diarias,
-                        'total_valor_diarias': total_valor_diarias,
-                        'total_litros': total_litros,
-                        'total_gasto_gasolina': total_gasto_gasolina,
-                        'total_receita_frete': total_receita_frete,
-                        'preencher_custos': True
-                    })
-                
-                # Calcular lucro líquido
-                try:
-                    total_custos_fixos = custos_fixos.get_total_custos_fixos() if custos_fixos else Decimal('0')
-                except:
-                    total_custos_fixos = Decimal('0')
-                
-                # Converter para float para evitar problemas com Decimal
-            except Exception as e:
-                logger.error(f'Erro ao calcular datas: {e}')
-                data_inicio_mes = datetime.now().date().replace(day=1)
-                data_fim_mes = datetime.now().date()
-            
-            try:
-                custos_fixos_mensais = CustoFixoMensal.objects.filter(
-                    status='ativo',
-                    data_inicio__lte=data_fim_mes
-                ).filter(
-                    Q(data_fim__isnull=True) | Q(data_fim__gte=data_inicio_mes)
-                )
-                total_custos_fixos_mensais = sum(float(custo.valor_mensal) for custo in custos_fixos_mensais)
-                logger.info(f'Total custos fixos mensais: {total_custos_fixos_mensais}')
-            except Exception as e:
-                logger.error(f'Erro ao calcular custos fixos mensais: {e}')
-                custos_fixos_mensais = CustoFixoMensal.objects.none()
-                total_custos_fixos_mensais = 0
+            # Buscar relatórios do mês com os custos gerais de cada viagem
+            relatorios = DailyReport.objects.filter(
+                data_viagem__range=[data_inicio_mes, data_fim_mes]
+            ).order_by('data_viagem').prefetch_related('custos_gerais')
             
-            try:
-                # Não usar parcelas - simplificado
-                total_parcelas_mes = 0
-                logger.info('Sistema simplificado - sem parcelas')
-            except Exception as e:
-                logger.error(f'Erro ao calcular parcelas: {e}')
-                parcelas_mes = []
-                total_parcelas_mes = 0
+            context = {
+                'ano_mes': ano_mes,
+                'custos_fixos': totais['custos_fixos'],
+                'custos_fixos_mensais': totais['custos_fixos_mensais'],
+                'total_custos_fixos_mensais': totais['total_custos_fixos_mensais'],
+                'relatorios': relatorios,
+                'total_diarias': totais['total_diarias'],
+                'total_valor_diarias': totais['total_valor_diarias'],
+                'total_litros': totais['total_litros'],
+                'total_gasto_gasolina': totais['total_gasto_gasolina'],
+                'total_receita_frete': totais['total_receita_frete'],
+            }
             
-            # Se é um novo registro, pedir para preencher os custos
-            if created:
+            # Se ainda não existem custos fixos do mês, criar e pedir para preenchê-los
+            if totais['custos_fixos'] is None:
+                context['custos_fixos'] = MonthlyCost.objects.create(ano_mes=ano_mes)
+                context['preencher_custos'] = True
                 logger.info(f'Novo registro de custos criado para {ano_mes}')
                 messages.info(request, f'Preencha os custos fixos para {ano_mes}')
-                return render(request, 'login/relatorio_mensal.html', {
-                    'ano_mes': ano_mes,
-                    'custos_fixos': custos_fixos,
-                    'custos_fixos_mensais': custos_fixos_mensais if 'custos_fixos_mensais' in locals() else [],
-                    'total_custos_fixos_mensais': total_custos_fixos_mensais if 'total_custos_fixos_mensais' in locals() else 0,
-                    'relatorios': relatorios,
-                    'total_diarias': total_diarias,
-                    'total_valor_diarias': total_valor_diarias,
-                    'total_litros': total_litros,
-                    'total_gasto_gasolina': total_gasto_gasolina,
-                    'total_receita_frete': total_receita_frete,
-                    'preencher_custos': True
-                })
-            
-            # Calcular lucro líquido
-            try:
-                if custos_fixos:
-                    total_custos_fixos = custos_fixos.get_total_custos_fixos()
-                    logger.info(f'Total custos fixos: {total_custos_fixos}')
-                else:
-                    total_custos_fixos = Decimal('0')
-                    logger.info('Custos fixos não encontrados, usando 0')
-            except Exception as e:
-                logger.error(f'Erro ao calcular custos fixos: {e}')
-                total_custos_fixos = Decimal('0')
-            
-            # Converter para float para evitar problemas com Decimal
-            try:
-                # Converter valores com tratamento de erro
-                total_gasto_gasolina_float = float(total_gasto_gasolina) if total_gasto_gasolina else 0.0
-                total_valor_diarias_float = float(total_valor_diarias) if total_valor_diarias else 0.0
-                total_custos_gerais_float = float(total_custos_gerais) if total_custos_gerais else 0.0
-                total_receita_frete_float = float(total_receita_frete) if total_receita_frete else 0.0
-                total_custos_fixos_float = float(total_custos_fixos) if total_custos_fixos else 0.0
-                total_custos_fixos_mensais_float = float(total_custos_fixos_mensais) if total_custos_fixos_mensais else 0.0
-                total_parcelas_mes_float = 0.0
-                
-                logger.info(f'Valores convertidos - Gasolina: {total_gasto_gasolina_float}, Diárias: {total_valor_diarias_float}, Receita: {total_receita_frete_float}')
-                
-                # Incluir custos fixos mensais e parcelas no cálculo
-                total_despesas = total_gasto_gasolina_float + total_valor_diarias_float + total_custos_fixos_float + total_custos_gerais_float + total_custos_fixos_mensais_float + total_parcelas_mes_float
-                lucro_liquido = total_receita_frete_float - total_despesas
-                
-                # Garantir que os valores não sejam negativos ou NaN
-                if total_despesas < 0:
-                    total_despesas = 0.0
-                if lucro_liquido != lucro_liquido:  # Check for NaN
-                    lucro_liquido = 0.0
-                
-                logger.info(f'Total despesas: {total_despesas}, Lucro: {lucro_liquido}')
-                logger.info(f'Receita: {total_receita_frete_float}, Gasolina: {total_gasto_gasolina_float}, Diárias: {total_valor_diarias_float}')
-                logger.info(f'Custos fixos: {total_custos_fixos_float}, Custos gerais: {total_custos_gerais_float}, Custos fixos mensais: {total_custos_fixos_mensais_float}, Parcelas: {total_parcelas_mes_float}')
-                
-                context = {
-                    'ano_mes': ano_mes,
-                    'custos_fixos': custos_fixos,
-                    'custos_fixos_mensais': custos_fixos_mensais,
-                    'total_custos_fixos_mensais': total_custos_fixos_mensais_float,
-                    'custos_gerais_mes': custos_gerais_mes,
-                    'total_custos_gerais': total_custos_gerais_float,
-                    'relatorios': relatorios,
-                    'total_diarias': total_diarias,
-                    'total_valor_diarias': total_valor_diarias_float,
-                    'total_litros': float(total_litros),
-                    'total_gasto_gasolina': total_gasto_gasolina_float,
-                    'total_receita_frete': total_receita_frete_float,
-                    'total_custos_fixos': total_custos_fixos_float,
-                    'total_despesas': total_despesas,
-                    'lucro_liquido': lucro_liquido,
-                    'preencher_custos': False
-                }
-                
-                logger.info(f'Contexto criado - Total despesas: {total_despesas}, Lucro: {lucro_liquido}')
-                logger.info(f'Valores finais - Receita: {total_receita_frete_float}, Gasolina: {total_gasto_gasolina_float}, Diárias: {total_valor_diarias_float}')
-                logger.info(f'Custos - Fixos: {total_custos_fixos_float}, Gerais: {total_custos_gerais_float}, Fixos Mensais: {total_custos_fixos_mensais_float}')
-                
                 return render(request, 'login/relatorio_mensal.html', context)
-                
-            except ValueError:
-                messages.error(request, 'Formato de data inválido.')
-            except Exception as e:
-                logger.error(f'Erro ao calcular lucro: {e}')
-                total_despesas = 0
-                lucro_liquido = 0
-            
-            # Criar lista de custos gerais incluindo parcelas individuais
-            custos_gerais_detalhados = []
             
+            # Custos gerais do mês (sistema simplificado - sem parcelas)
+            custos_gerais_mes = list(CustosGerais.objects.filter(
+                data__range=[data_inicio_mes, data_fim_mes]
+            ))
             for custo in custos_gerais_mes:
-                # Sistema simplificado - sem parcelas
-                if False:  # Desabilitado
-                    # Para custos parcelados, mostrar cada parcela como um custo separado
-                    # for parcela in custo.parcelas.all():  # COMENTADO: modelo não tem parcelas
-
-                    if False:  # Bloco desabilitado
-                        # Criar um objeto similar ao custo original mas com dados da parcela
-                        class ParcelaCustoWrapper:
-                            def __init__(self, custo_original, parcela):
-                                self.id = f"{custo_original.id}_{parcela.id}"
-                                self.data = custo_original.data
-                                self.tipo_gasto = custo_original.tipo_gasto
-                                self.veiculo_placa = custo_original.veiculo_placa
-                                self.oficina_fornecedor = custo_original.oficina_fornecedor
-                                self.descricao = f"{custo_original.descricao} - Parcela {parcela.numero_parcela}"
-                                self.valor = parcela.valor_parcela
-                                self.forma_pagamento = custo_original.forma_pagamento
-                                self.status_pagamento = parcela.status_pagamento
-                                self.data_vencimento = parcela.data_vencimento
-                                self.observacoes = custo_original.observacoes
-                                self.comprovante = custo_original.comprovante
-                                self.created_at = custo_original.created_at
-                                self.updated_at = custo_original.updated_at
-                                self.get_tipo_gasto_display = custo_original.get_tipo_gasto_display
-                                self.get_forma_pagamento_display = custo_original.get_forma_pagamento_display
-                                self.get_status_pagamento_display = parcela.get_status_pagamento_display
-                                self.is_parcela = True
-                                self.parcela_numero = parcela.numero_parcela
-                                self.total_parcelas = custo_original.parcelas.count()
-                                self.parcelas_pagas = custo_original.parcelas.filter(status_pagamento='pago').count()
-                                self.parcelas_pendentes = custo_original.parcelas.filter(status_pagamento='pendente').count()
-                                self.valor_parcela = parcela.valor_parcela
-                        
-                        parcela_custo = ParcelaCustoWrapper(custo, parcela)
-                        custos_gerais_detalhados.append(parcela_custo)
-                else:
-                    # Para custos não parcelados, adicionar normalmente
-                    custo.is_parcela = False
-                    custo.total_parcelas = 0
-                    # custo.parcelas_pagas = 0  # REMOVIDO: atributo não existe
-                    # custo.parcelas_pendentes = 0  # REMOVIDO: atributo não existe
-                    custo.valor_parcela = 0
-                    custos_gerais_detalhados.append(custo)
-            
-            # Ordenar por data e descrição
-            custos_gerais_detalhados.sort(key=lambda x: (x.data, x.descricao))
-
-            # Recalcular total de custos gerais com as parcelas individuais
-            total_custos_gerais_detalhados = sum(float(custo.valor) for custo in custos_gerais_detalhados)
+                custo.is_parcela = False
+                custo.total_parcelas = 0
+                custo.valor_parcela = 0
+            custos_gerais_mes.sort(key=lambda x: (x.data, x.descricao))
             
-            context = {
-                'ano_mes': ano_mes,
-                'custos_fixos': custos_fixos,
-                'custos_fixos_mensais': custos_fixos_mensais,
-                'total_custos_fixos_mensais': total_custos_fixos_mensais,
-                'parcelas_mes': parcelas_mes,
+            context.update({
+                'parcelas_mes': [],
                 'total_parcelas_mes': 0,
-                'custos_gerais_mes': custos_gerais_detalhados,
-                'total_custos_gerais': total_custos_gerais_detalhados,
-                'relatorios': relatorios,
-                'total_diarias': total_diarias,
-                'total_valor_diarias': total_valor_diarias_float,
-                'total_litros': float(total_litros),
-                'total_gasto_gasolina': total_gasto_gasolina_float,
-                'total_receita_frete': total_receita_frete_float,
-                'total_custos_fixos': total_custos_fixos,
-                'total_despesas': total_despesas,
-                'lucro_liquido': lucro_liquido,
+                'custos_gerais_mes': custos_gerais_mes,
+                'total_custos_gerais': totais['total_custos_gerais'],
+                'total_custos_fixos': totais['total_custos_fixos'],
+                'total_despesas': totais['total_despesas'],
+                'lucro_liquido': totais['lucro_liquido'],
                 'preencher_custos': False
-            }
+            })
             
-            logger.info(f'Renderizando relatório com {len(relatorios)} relatórios')
+            logger.info(f'Total despesas: {totais["total_despesas"]}, Lucro: {totais["lucro_liquido"]}')
             return render(request, 'login/relatorio_mensal.html', context)
             
         except Exception as e:
@@ -1125,7 +587,7 @@ def relatorio_mensal(request):
             messages.error(request, f'Erro ao gerar relatório: {str(e)}')
             # Retornar template com dados vazios em caso de erro
             return render(request, 'login/relatorio_mensal.html', {
-                'ano_mes': ano_mes if 'ano_mes' in locals() else None,
+                'ano_mes': ano_mes,
                 'relatorios': [],
                 'total_diarias': 0,
                 'total_valor_diarias': 0,
@@ -1279,20 +741,21 @@ def relatorio_diario(request):
             # Ordenar por descrição
             custos_gerais_detalhados.sort(key=lambda x: x.descricao)
             
-            # Calcular total de custos gerais
-            total_custos_gerais = sum(float(custo.valor) for custo in custos_gerais_detalhados)
-            
-            # Calcular lucro líquido incluindo custos gerais
-            total_gastos = float(relatorio.gasto_gasolina) + float(relatorio.valor_diarias) + total_custos_gerais
-            lucro_liquido = float(relatorio.receita_frete) - total_gastos
+            # Totais em centavos (somas exatas), convertidos para reais só no contexto
+            total_custos_gerais = dinheiro.somar(custo.valor for custo in custos_gerais_detalhados)
+            total_gastos = (
+                dinheiro.centavos(relatorio.gasto_gasolina) + dinheiro.centavos(relatorio.valor_diarias)
+                + total_custos_gerais
+            )
+            lucro_liquido = dinheiro.centavos(relatorio.receita_frete) - total_gastos
             
             context = {
                 'data_viagem': data_viagem,
                 'relatorio': relatorio,
                 'custos_gerais_detalhados': custos_gerais_detalhados,
-                'total_custos_gerais': total_custos_gerais,
-                'total_gastos': total_gastos,
-                'lucro_liquido': lucro_liquido
+                'total_custos_gerais': dinheiro.reais(total_custos_gerais),
+                'total_gastos': dinheiro.reais(total_gastos),
+                'lucro_liquido': dinheiro.reais(lucro_liquido)
             }
             
             return render(request, 'login/relatorio_diario.html', context)
@@ -1315,11 +778,16 @@ def listar_viagens(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Buscar custos gerais para cada viagem
+    # Custos gerais das datas da página em uma única query, agrupados por data
+    custos_por_data = {}
+    datas = {viagem.data_viagem for viagem in page_obj}
+    for custo in CustosGerais.objects.filter(data__in=datas).order_by('data', 'id'):
+        custos_por_data.setdefault(custo.data, []).append(custo)
+
     for viagem in page_obj:
-        custos = CustosGerais.objects.filter(data=viagem.data_viagem)
-        viagem.custos_gerais = custos
-        viagem.total_custos_gerais = custos.aggregate(Sum('valor'))['valor__sum'] or Decimal('0')
+        custos = custos_por_data.get(viagem.data_viagem, [])
+        viagem.custos_gerais_dia = custos
+        viagem.total_custos_gerais = sum((custo.valor for custo in custos), Decimal('0'))
     
     context = {
         'page_obj': page_obj,
@@ -1342,6 +810,28 @@ def excluir_viagem(request, viagem_id):
     
     return redirect('listar_viagens')
 
+class PaginatorContado(Paginator):
+    """Paginator com a contagem já calculada (sem o COUNT separado)"""
+
+    def __init__(self, object_list, per_page, contagem, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._contagem = contagem
+
+    @cached_property
+    def count(self):
+        return self._contagem
+
+def _estatisticas_custos(custos):
+    """Contagem, totais por status e por tipo de gasto dos custos filtrados, em uma única query (centavos)"""
+    somas = {
+        'total': dinheiro.SomaCentavos('valor'),
+        'pagos': dinheiro.SomaCentavos('valor', filter=Q(status_pagamento='pago')),
+        'pendentes': dinheiro.SomaCentavos('valor', filter=Q(status_pagamento='nao_pago')),
+    }
+    for codigo, _ in CustosGerais.TIPO_GASTO_CHOICES:
+        somas[f'tipo_{codigo}'] = dinheiro.SomaCentavos('valor', filter=Q(tipo_gasto=codigo))
+    return custos.order_by().aggregate(contagem=Count('id'), **somas)
+
 @login_required
 def custos_gerais(request):
     """View para listar custos gerais com busca e filtros"""
@@ -1354,13 +844,9 @@ def custos_gerais(request):
     # Query base
     custos = CustosGerais.objects.all()
     
-    # Aplicar filtros
+    # Aplicar filtros (busca indexada por trigramas, sem diferenciar acentos)
     if busca:
-        custos = custos.filter(
-            Q(oficina_fornecedor__icontains=busca) |
-            Q(descricao__icontains=busca) |
-            Q(veiculo_placa__icontains=busca)
-        )
+        custos = filtrar_custos(custos, busca)
     
     if tipo_gasto:
         custos = custos.filter(tipo_gasto=tipo_gasto)
@@ -1371,19 +857,29 @@ def custos_gerais(request):
     if placa:
         custos = custos.filter(veiculo_placa__icontains=placa)
     
+    # Estatísticas e contagem do paginador em uma query, no cache enquanto os custos não mudarem
+    estatisticas = cache_relatorios.obter_ou_calcular_geral(
+        'custos-gerais', (busca, tipo_gasto, status_pagamento, placa),
+        lambda: _estatisticas_custos(custos)
+    )
+    total_custos = dinheiro.reais(estatisticas['total'])
+    custos_pagos = dinheiro.reais(estatisticas['pagos'])
+    custos_pendentes = dinheiro.reais(estatisticas['pendentes'])
+    # Totais por tipo de gasto (só os tipos com valor no filtro)
+    totais_por_tipo = [
+        {'tipo_gasto': codigo, 'nome': nome, 'total': dinheiro.reais(estatisticas[f'tipo_{codigo}'])}
+        for codigo, nome in CustosGerais.TIPO_GASTO_CHOICES
+        if estatisticas[f'tipo_{codigo}']
+    ]
+    
     # Ordenação
     custos = custos.order_by('-data', '-created_at')
     
     # Paginação
-    paginator = Paginator(custos, 20)
+    paginator = PaginatorContado(custos, 20, estatisticas['contagem'])
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Estatísticas
-    total_custos = custos.aggregate(Sum('valor'))['valor__sum'] or Decimal('0')
-    custos_pagos = custos.filter(status_pagamento='pago').aggregate(Sum('valor'))['valor__sum'] or Decimal('0')
-    custos_pendentes = custos.filter(status_pagamento='nao_pago').aggregate(Sum('valor'))['valor__sum'] or Decimal('0')
-    
     context = {
         'page_obj': page_obj,
         'busca': busca,
@@ -1393,6 +889,7 @@ def custos_gerais(request):
         'total_custos': total_custos,
         'custos_pagos': custos_pagos,
         'custos_pendentes': custos_pendentes,
+        'totais_por_tipo': totais_por_tipo,
         'tipo_gasto_choices': CustosGerais.TIPO_GASTO_CHOICES,
         'status_pagamento_choices': CustosGerais.STATUS_PAGAMENTO_CHOICES,
     }
@@ -1426,6 +923,17 @@ def adicionar_custo_geral(request):
                     'status_pagamento_choices': CustosGerais.STATUS_PAGAMENTO_CHOICES,
                 })
             
+            # Comprovante gravado em blocos e deduplicado pelo conteúdo (antes de criar o custo)
+            try:
+                comprovante = salvar_comprovante(request.FILES['comprovante']) if 'comprovante' in request.FILES else None
+            except ComprovanteInvalido as e:
+                messages.error(request, str(e))
+                return render(request, 'login/adicionar_custo_geral.html', {
+                    'tipo_gasto_choices': CustosGerais.TIPO_GASTO_CHOICES,
+                    'forma_pagamento_choices': CustosGerais.FORMA_PAGAMENTO_CHOICES,
+                    'status_pagamento_choices': CustosGerais.STATUS_PAGAMENTO_CHOICES,
+                })
+            
             # Criar custo geral
             # Converter data string para objeto date
             data_obj = datetime.strptime(data, '%Y-%m-%d')
@@ -1441,7 +949,11 @@ def adicionar_custo_geral(request):
                 status_pagamento=status_pagamento,
                 data_vencimento=data_vencimento,
                 observacoes=observacoes,
+                comprovante=comprovante,
             )
+            if comprovante:
+                # Versões reduzidas para exibição geradas fora da requisição
+                agendar_versoes(comprovante)
             
             # Se for parcelado, criar as parcelas automaticamente
             if forma_pagamento == 'parcelado':
@@ -1476,11 +988,6 @@ def adicionar_custo_geral(request):
                 except (ValueError, TypeError) as e:
                     messages.warning(request, f'Custo criado, mas houve erro ao criar parcelas: {str(e)}')
             
-            # Upload do comprovante se fornecido
-            if 'comprovante' in request.FILES:
-                custo.comprovante = request.FILES['comprovante']
-                custo.save()
-            
             messages.success(request, f'Custo geral adicionado com sucesso! Valor: R$ {custo.valor:.2f}')
             return redirect('custos_gerais')
             
@@ -1520,15 +1027,19 @@ def editar_custo_geral(request, custo_id):
             custo.data_vencimento = request.POST.get('data_vencimento') or None
             custo.observacoes = request.POST.get('observacoes', '').strip()
             
-            # Upload do comprovante se fornecido
+            # Upload do comprovante se fornecido (deduplicado; versões reduzidas geradas depois)
             if 'comprovante' in request.FILES:
-                custo.comprovante = request.FILES['comprovante']
+                custo.comprovante = salvar_comprovante(request.FILES['comprovante'])
+                custo.comprovante_versoes = False
+                agendar_versoes(custo.comprovante.name)
             
             custo.save()
             
             messages.success(request, 'Custo geral atualizado com sucesso!')
             return redirect('custos_gerais')
             
+        except ComprovanteInvalido as e:
+            messages.error(request, str(e))
         except Exception as e:
             logger.error(f'Erro ao editar custo geral: {e}')
             messages.error(request, 'Erro ao editar custo geral. Tente novamente.')
@@ -1572,9 +1083,11 @@ def buscar_custos_por_data(request):
                         'tipo_gasto': custo.get_tipo_gasto_display(),
                         'oficina_fornecedor': custo.oficina_fornecedor,
                         'descricao': custo.descricao,
-                        'valor': float(custo.valor),
+                        'valor': dinheiro.para_json(dinheiro.centavos(custo.valor)),
                         'forma_pagamento': custo.get_forma_pagamento_display(),
                         'status_pagamento': custo.get_status_pagamento_display(),
+                        'comprovante_url': custo.get_comprovante_exibicao_url(),
+                        'comprovante_miniatura_url': custo.get_comprovante_miniatura_url(),
                     })
                 
                 return JsonResponse({
@@ -1593,17 +1106,20 @@ def buscar_custos_por_data(request):
     })
 
 @login_required
-def buscar_detalhes_viagem(request, viagem_id):
-    """View para buscar detalhes da viagem via AJAX"""
+async def buscar_detalhes_viagem(request, viagem_id):
+    """View assíncrona para buscar detalhes da viagem via AJAX"""
     try:
-        viagem = get_object_or_404(DailyReport, id=viagem_id)
-        
-        # Buscar custos gerais da viagem
-        custos = CustosGerais.objects.filter(data=viagem.data_viagem)
-        total_custos_gerais = custos.aggregate(Sum('valor'))['valor__sum'] or Decimal('0')
+        viagem = await aget_object_or_404(DailyReport, id=viagem_id)
+        # Custos gerais do dia da viagem
+        custos = [
+            custo async for custo in CustosGerais.objects.filter(
+                data=viagem.data_viagem
+            ).annotate(valor_centavos=dinheiro.Centavos('valor'))
+        ]
         
-        # Calcular lucro líquido incluindo custos gerais
-        lucro_liquido = viagem.get_lucro() - total_custos_gerais
+        # Calcular lucro líquido incluindo custos gerais (em centavos)
+        total_custos_gerais = sum(custo.valor_centavos for custo in custos)
+        lucro_liquido = dinheiro.centavos(viagem.get_lucro()) - total_custos_gerais
         
         # Preparar dados da viagem
         viagem_data = {
@@ -1614,11 +1130,11 @@ def buscar_detalhes_viagem(request, viagem_id):
             'motorista': viagem.motorista,
             'caminhao': viagem.caminhao,
             'diarias': viagem.diarias,
-            'valor_diarias': float(viagem.valor_diarias),
-            'gasto_gasolina': float(viagem.gasto_gasolina),
-            'receita_frete': float(viagem.receita_frete),
-            'total_custos_gerais': float(total_custos_gerais),
-            'lucro_liquido': float(lucro_liquido),
+            'valor_diarias': dinheiro.para_json(dinheiro.centavos(viagem.valor_diarias)),
+            'gasto_gasolina': dinheiro.para_json(dinheiro.centavos(viagem.gasto_gasolina)),
+            'receita_frete': dinheiro.para_json(dinheiro.centavos(viagem.receita_frete)),
+            'total_custos_gerais': dinheiro.para_json(total_custos_gerais),
+            'lucro_liquido': dinheiro.para_json(lucro_liquido),
             'custos_gerais': []
         }
         
@@ -1629,9 +1145,12 @@ def buscar_detalhes_viagem(request, viagem_id):
                 'tipo_gasto': custo.get_tipo_gasto_display(),
                 'oficina_fornecedor': custo.oficina_fornecedor,
                 'descricao': custo.descricao,
-                'valor': float(custo.valor),
+                'valor': dinheiro.para_json(custo.valor_centavos),
                 'forma_pagamento': custo.get_forma_pagamento_display(),
                 'status_pagamento': custo.get_status_pagamento_display(),
+                # Versões reduzidas (o original enquanto não forem geradas)
+                'comprovante_url': custo.get_comprovante_exibicao_url(),
+                'comprovante_miniatura_url': custo.get_comprovante_miniatura_url(),
             })
         
         return JsonResponse({
@@ -1646,16 +1165,103 @@ def buscar_detalhes_viagem(request, viagem_id):
             'error': str(e)
         })
 
+def _dados_relatorios_periodo(data_inicio, data_fim):
+    """Dados da API de relatórios por período (armazenados no cache de relatórios).
+
+    Síncrona, executada inteira em um único sync_to_async pela view: o ORM faz
+    as consultas na mesma thread e conexão, uma de cada vez, então separá-las
+    em um asyncio.gather não adiantava nada.
+    """
+    # Relatórios do período, totais (serviço compartilhado com os demais
+    # relatórios) e resumo por motorista e por caminhão
+    relatorios = list(DailyReport.objects.filter(
+        data_viagem__range=[data_inicio, data_fim]
+    ).order_by('data_viagem', 'id').values(*CAMPOS_RELATORIO))
+    totais = calcular_totais(data_inicio, data_fim)
+    resumo_motorista = resumos.resumo_por('motorista', data_inicio, data_fim)
+    resumo_caminhao = resumos.resumo_por('caminhao', data_inicio, data_fim)
+    total_litros = totais['total_litros']
+    total_gasto_gasolina = totais['total_gasto_gasolina']
+    total_diarias = totais['total_diarias']
+    total_valor_diarias = totais['total_valor_diarias']
+    total_receita_frete = totais['total_receita_frete']
+    
+    # Lucro = (valor total recebido pelas diárias) - (gastos com gasolina)
+    lucro_diarias = total_valor_diarias - total_gasto_gasolina
+    
+    # Lucro por viagem (motor de lucro, em centavos) e custos gerais carregados em lote;
+    # as colunas do motor seguem a ordem de relatorios
+    periodo = lucro.calcular_periodo(data_inicio, data_fim, relatorios)
+    custos_por_relatorio = carregar_custos([relatorio['id'] for relatorio in relatorios])
+    viagens = periodo['viagens']
+    
+    relatorios_data = []
+    for i, relatorio in enumerate(relatorios):
+        todas_parcelas = [serializar_parcela(custo) for custo in custos_por_relatorio.get(relatorio['id'], [])]
+        # Valores monetários direto das colunas em centavos do motor de lucro
+        gastos_viagem = viagens.gasolina[i] + viagens.diarias[i]
+        
+        relatorio_data = {
+            'id': relatorio['id'],
+            'date': relatorio['data_viagem'].isoformat(),
+            'localPartida': relatorio['partida'],
+            'localChegada': relatorio['chegada'],
+            'nomeMotorista': relatorio['motorista'],
+            'nomeCaminhao': relatorio['caminhao'],
+            'quantidadeDiarias': relatorio['diarias'],
+            'totalDiarias': dinheiro.para_json(viagens.diarias[i]),
+            'litrosGasolina': float(relatorio['litros_gasolina']),
+            'valorGasolina': dinheiro.para_json(viagens.gasolina[i]),
+            'receita': dinheiro.para_json(viagens.receita[i]),
+            'totalGastosViagem': dinheiro.para_json(gastos_viagem),
+            'totalCustosGerais': dinheiro.para_json(viagens.custos[i]),
+            'totalDespesas': dinheiro.para_json(gastos_viagem + viagens.custos[i]),
+            'lucroLiquido': dinheiro.para_json(periodo['lucro'][i]),
+            # Parte do salário mensal do motorista atribuída à viagem
+            'salarioLiquido': dinheiro.para_json(viagens.salarios[i]),
+            'todasParcelas': todas_parcelas,
+            'totalParcelas': len(todas_parcelas),
+            'parcelasPagas': len([p for p in todas_parcelas if p['paga']]),
+            'parcelasPendentes': len([p for p in todas_parcelas if not p['paga']])
+        }
+
+        # Campos de compatibilidade esperados pelo frontend (tabela de busca)
+        relatorio_data.update({
+            'data_viagem': relatorio['data_viagem'].isoformat(),
+            'partida': relatorio['partida'] or '',
+            'chegada': relatorio['chegada'] or '',
+            'motorista': relatorio['motorista'] or '',
+            'receita_frete': dinheiro.para_json(viagens.receita[i]),
+            'gasto_gasolina': dinheiro.para_json(viagens.gasolina[i]),
+            'valor_diarias': dinheiro.para_json(viagens.diarias[i]),
+            'totalGastos': dinheiro.para_json(gastos_viagem)
+        })
+        
+        relatorios_data.append(relatorio_data)
+    
+    return {
+        'success': True,
+        'relatorios': relatorios_data,
+        'totais': {
+            'total_litros': float(total_litros),
+            'total_gasto_gasolina': dinheiro.para_json(dinheiro.centavos(total_gasto_gasolina)),
+            'total_diarias': total_diarias,
+            'total_valor_diarias': dinheiro.para_json(dinheiro.centavos(total_valor_diarias)),
+            'total_receita_frete': dinheiro.para_json(dinheiro.centavos(total_receita_frete)),
+            'total_custos_gerais': dinheiro.para_json(dinheiro.centavos(totais['total_custos_gerais'])),
+            'total_custos_fixos_mensais': dinheiro.para_json(dinheiro.centavos(totais['total_custos_fixos_mensais'])),
+            'total_despesas': dinheiro.para_json(dinheiro.centavos(totais['total_despesas'])),
+            'lucro_liquido': dinheiro.para_json(dinheiro.centavos(totais['lucro_liquido'])),
+            'lucro': dinheiro.para_json(dinheiro.centavos(lucro_diarias))
+        },
+        'resumo_motorista': list(resumo_motorista),
+        'resumo_caminhao': list(resumo_caminhao)
+    }
+
 @login_required
-def buscar_relatorios_periodo(request):
-    """API para buscar relatórios por período"""
+async def buscar_relatorios_periodo(request):
+    """API assíncrona para buscar relatórios por período"""
     if request.method == 'POST':
-        # Verificar se o usuário está autenticado
-        if not request.user.is_authenticated:
-            return JsonResponse({
-                'success': False,
-                'error': 'Usuário não autenticado'
-            })
         try:
             data = json.loads(request.body)
             data_inicio = data.get('data_inicio')
@@ -1671,124 +1277,11 @@ def buscar_relatorios_periodo(request):
             data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date()
             data_fim = datetime.strptime(data_fim, '%Y-%m-%d').date()
             
-            # Buscar relatórios do período
-            relatorios = DailyReport.objects.filter(
-                data_viagem__range=[data_inicio, data_fim]
-            ).order_by('data_viagem')
-            
-            # Calcular totais
-            total_litros = relatorios.aggregate(Sum('litros_gasolina'))['litros_gasolina__sum'] or Decimal('0')
-            total_gasto_gasolina = relatorios.aggregate(Sum('gasto_gasolina'))['gasto_gasolina__sum'] or Decimal('0')
-            total_diarias = relatorios.aggregate(Sum('diarias'))['diarias__sum'] or 0
-            total_valor_diarias = relatorios.aggregate(Sum('valor_diarias'))['valor_diarias__sum'] or Decimal('0')
-            total_receita_frete = relatorios.aggregate(Sum('receita_frete'))['receita_frete__sum'] or Decimal('0')
-            
-            # Lucro = (valor total recebido pelas diárias) - (gastos com gasolina)
-            lucro = total_valor_diarias - total_gasto_gasolina
-            
-            # Resumo por motorista
-            resumo_motorista = relatorios.values('motorista').annotate(
-                total_viagens=Count('id'),
-                total_diarias=Sum('diarias'),
-                total_valor_diarias=Sum('valor_diarias'),
-                total_gasto_gasolina=Sum('gasto_gasolina'),
-                total_receita_frete=Sum('receita_frete')
-            ).order_by('motorista')
-            
-            # Resumo por caminhão
-            resumo_caminhao = relatorios.values('caminhao').annotate(
-                total_viagens=Count('id'),
-                total_diarias=Sum('diarias'),
-                total_valor_diarias=Sum('valor_diarias'),
-                total_gasto_gasolina=Sum('gasto_gasolina'),
-                total_receita_frete=Sum('receita_frete')
-            ).order_by('caminhao')
-            
-            # Converter QuerySet para lista de dicionários
-            relatorios_data = []
-            for relatorio in relatorios:
-                # Buscar custos gerais da viagem
-                custos_gerais = CustosGerais.objects.filter(relatorio_id=relatorio.id)
-                total_custos_gerais = custos_gerais.aggregate(Sum('valor'))['valor__sum'] or Decimal('0')
-                
-                # Buscar parcelas de custos gerais
-                todas_parcelas = []
-                
-                for custo in custos_gerais:
-                    
-                    # Sempre adicionar o custo como uma "parcela"
-                    todas_parcelas.append({
-                        'id': f"custo_{custo.id}",
-                        'custo_id': custo.id,
-                        'tipo_gasto': custo.get_tipo_gasto_display(),
-                        'descricao': custo.descricao,
-                        'oficina_fornecedor': custo.oficina_fornecedor or 'N/A',
-                        'veiculo_placa': custo.veiculo_placa or 'N/A',
-                        'numero_parcela': 1,
-                        'valor_parcela': float(custo.valor),
-                        'data_vencimento': custo.data.strftime('%d/%m/%Y'),
-                        'status_pagamento': custo.get_status_pagamento_display(),
-                        'paga': custo.status_pagamento == 'pago',
-                        'forma_pagamento': custo.get_forma_pagamento_display(),
-                        'observacoes': custo.observacoes or ''
-                    })
-                    
-                    # REMOVIDO: Sistema simplificado sem parcelas
-                    # parcelas = custo.parcelas.all().order_by('numero_parcela')
-                    # for parcela in parcelas: ...
-                
-                relatorio_data = {
-                    'id': relatorio.id,
-                    'date': relatorio.data_viagem.isoformat(),
-                    'localPartida': relatorio.partida,
-                    'localChegada': relatorio.chegada,
-                    'nomeMotorista': relatorio.motorista,
-                    'nomeCaminhao': relatorio.caminhao,
-                    'quantidadeDiarias': relatorio.diarias,
-                    'totalDiarias': float(relatorio.valor_diarias),
-                    'litrosGasolina': float(relatorio.litros_gasolina),
-                    'valorGasolina': float(relatorio.gasto_gasolina),
-                    'receita': float(relatorio.receita_frete),
-                    'totalGastosViagem': float(relatorio.valor_diarias) + float(relatorio.gasto_gasolina),
-                    'totalCustosGerais': float(total_custos_gerais),
-                    'totalDespesas': float(relatorio.valor_diarias) + float(relatorio.gasto_gasolina) + float(total_custos_gerais),
-                    'lucroLiquido': float(relatorio.receita_frete) - float(relatorio.valor_diarias) - float(relatorio.gasto_gasolina) - float(total_custos_gerais),
-                    'salarioLiquido': 0.0,
-                    'todasParcelas': todas_parcelas,
-                    'totalParcelas': len(todas_parcelas),
-                    'parcelasPagas': len([p for p in todas_parcelas if p['paga']]),
-                    'parcelasPendentes': len([p for p in todas_parcelas if not p['paga']])
-                }
-
-                # Campos de compatibilidade esperados pelo frontend (tabela de busca)
-                relatorio_data.update({
-                    'data_viagem': relatorio.data_viagem.isoformat(),
-                    'partida': relatorio.partida or '',
-                    'chegada': relatorio.chegada or '',
-                    'motorista': relatorio.motorista or '',
-                    'receita_frete': float(relatorio.receita_frete) if relatorio.receita_frete is not None else 0.0,
-                    'gasto_gasolina': float(relatorio.gasto_gasolina) if relatorio.gasto_gasolina is not None else 0.0,
-                    'valor_diarias': float(relatorio.valor_diarias) if relatorio.valor_diarias is not None else 0.0,
-                    'totalGastos': float(relatorio.valor_diarias) + float(relatorio.gasto_gasolina)
-                })
-                
-                
-                relatorios_data.append(relatorio_data)
-            
-            return JsonResponse({
-                'success': True,
-                'relatorios': relatorios_data,
-                'totais': {
-                    'total_litros': float(total_litros),
-                    'total_gasto_gasolina': float(total_gasto_gasolina),
-                    'total_diarias': total_diarias,
-                    'total_valor_diarias': float(total_valor_diarias),
-                    'total_receita_frete': float(total_receita_frete),
-                    'lucro': float(lucro)
-                },
-                'resumo_motorista': list(resumo_motorista),
-                'resumo_caminhao': list(resumo_caminhao)
-            })
+            dados = await cache_relatorios.aobter_ou_calcular(
+                'periodo', data_inicio, data_fim,
+                lambda: sync_to_async(_dados_relatorios_periodo)(data_inicio, data_fim)
+            )
+            return JsonResponse(dados)
             
         except Exception as e:
             logger.error(f'Erro ao buscar relatórios por período: {e}')
@@ -1803,18 +1296,17 @@ def buscar_relatorios_periodo(request):
     })
 
 @login_required
-def buscar_relatorios_mes(request):
-    """API para buscar relatórios por mês"""
-    if request.method == 'POST':
-        # Verificar se o usuário está autenticado
-        if not request.user.is_authenticated:
-            return JsonResponse({
-                'success': False,
-                'error': 'Usuário não autenticado'
-            })
+@cache_control(private=True, no_cache=True)
+@etags.condicao_assincrona(etags.etag_relatorios_mes)
+async def buscar_relatorios_mes(request):
+    """API assíncrona para buscar relatórios por mês (POST com JSON ou GET com ?ano_mes=, que aceita If-None-Match)"""
+    if request.method in ('GET', 'POST'):
         try:
-            data = json.loads(request.body)
-            ano_mes = data.get('ano_mes')
+            if request.method == 'GET':
+                ano_mes = request.GET.get('ano_mes')
+            else:
+                data = json.loads(request.body)
+                ano_mes = data.get('ano_mes')
             
             if not ano_mes:
                 return JsonResponse({
@@ -1822,122 +1314,12 @@ def buscar_relatorios_mes(request):
                     'error': 'Ano e mês são obrigatórios'
                 })
             
-            # Buscar relatórios do mês
-            relatorios = DailyReport.objects.filter(
-                data_viagem__year=ano_mes[:4],
-                data_viagem__month=ano_mes[5:7]
-            ).order_by('data_viagem')
-            
-            # Calcular totais
-            total_diarias = relatorios.aggregate(Sum('diarias'))['diarias__sum'] or 0
-            total_valor_diarias = relatorios.aggregate(Sum('valor_diarias'))['valor_diarias__sum'] or Decimal('0')
-            total_litros = relatorios.aggregate(Sum('litros_gasolina'))['litros_gasolina__sum'] or Decimal('0')
-            total_gasto_gasolina = relatorios.aggregate(Sum('gasto_gasolina'))['gasto_gasolina__sum'] or Decimal('0')
-            total_receita_frete = relatorios.aggregate(Sum('receita_frete'))['receita_frete__sum'] or Decimal('0')
-            
-            # Buscar custos fixos do mês
-            try:
-                custos_fixos = MonthlyCost.objects.get(ano_mes=ano_mes)
-                custos_fixos_data = {
-                    'pecas': float(custos_fixos.pecas),
-                    'seguro': float(custos_fixos.seguro),
-                    'manutencao': float(custos_fixos.manutencao)
-                }
-            except MonthlyCost.DoesNotExist:
-                custos_fixos_data = {
-                    'pecas': 0.0,
-                    'seguro': 0.0,
-                    'manutencao': 0.0
-                }
-            
-            # Buscar custos gerais do mês
-            custos_gerais_mes = CustosGerais.objects.filter(
-                data__year=ano_mes[:4],
-                data__month=ano_mes[5:7]
+            data_inicio_mes, data_fim_mes = resumos.limites_mes(ano_mes)
+            dados = await cache_relatorios.aobter_ou_calcular(
+                'mes', data_inicio_mes, data_fim_mes,
+                lambda: sync_to_async(dados_relatorios_mes)(ano_mes)
             )
-            total_custos_gerais = custos_gerais_mes.aggregate(Sum('valor'))['valor__sum'] or Decimal('0')
-            
-            # Calcular lucro líquido
-            total_custos_fixos = custos_fixos_data['pecas'] + custos_fixos_data['seguro'] + custos_fixos_data['manutencao']
-            total_despesas = float(total_gasto_gasolina) + float(total_valor_diarias) + total_custos_fixos + float(total_custos_gerais)
-            lucro_liquido = float(total_receita_frete) - total_despesas
-            
-            # Converter QuerySet para lista de dicionários
-            relatorios_data = []
-            for relatorio in relatorios:
-                relatorios_data.append({
-                    'id': relatorio.id,
-                    'data_viagem': relatorio.data_viagem.isoformat(),
-                    'motorista': relatorio.motorista,
-                    'caminhao': relatorio.caminhao,
-                    'partida': relatorio.partida,
-                    'chegada': relatorio.chegada,
-                    'diarias': relatorio.diarias,
-                    'valor_diarias': float(relatorio.valor_diarias),
-                    'litros_gasolina': float(relatorio.litros_gasolina),
-                    'gasto_gasolina': float(relatorio.gasto_gasolina),
-                    'receita_frete': float(relatorio.receita_frete)
-                })
-            
-            # Converter custos gerais para lista de dicionários
-            custos_gerais_data = []
-            todas_parcelas_mes = []
-            
-            for custo in custos_gerais_mes:
-                custos_gerais_data.append({
-                    'id': custo.id,
-                    'data': custo.data.isoformat(),
-                    'tipo_gasto': custo.tipo_gasto,
-                    'tipo_gasto_display': custo.get_tipo_gasto_display(),
-                    'veiculo_placa': custo.veiculo_placa,
-                    'descricao': custo.descricao,
-                    'valor': float(custo.valor),
-                    'status_pagamento': custo.status_pagamento,
-                    'status_pagamento_display': custo.get_status_pagamento_display()
-                })
-                
-                # Adicionar custo como parcela
-                todas_parcelas_mes.append({
-                    'id': f"custo_{custo.id}",
-                    'custo_id': custo.id,
-                    'tipo_gasto': custo.get_tipo_gasto_display(),
-                    'descricao': custo.descricao,
-                    'oficina_fornecedor': custo.oficina_fornecedor or 'N/A',
-                    'veiculo_placa': custo.veiculo_placa or 'N/A',
-                    'numero_parcela': 1,
-                    'valor_parcela': float(custo.valor),
-                    'data_vencimento': custo.data.strftime('%d/%m/%Y'),
-                    'status_pagamento': custo.get_status_pagamento_display(),
-                    'paga': custo.status_pagamento == 'pago',
-                    'forma_pagamento': custo.get_forma_pagamento_display(),
-                    'observacoes': custo.observacoes or ''
-                })
-                
-                # REMOVIDO: Sistema simplificado sem parcelas
-                # parcelas = custo.parcelas.all().order_by('numero_parcela')
-                # for parcela in parcelas: ...
-            
-            return JsonResponse({
-                'success': True,
-                'relatorios': relatorios_data,
-                'totais': {
-                    'total_diarias': total_diarias,
-                    'total_valor_diarias': float(total_valor_diarias),
-                    'total_litros': float(total_litros),
-                    'total_gasto_gasolina': float(total_gasto_gasolina),
-                    'total_receita_frete': float(total_receita_frete),
-                    'total_custos_fixos': total_custos_fixos,
-                    'total_custos_gerais': float(total_custos_gerais),
-                    'total_despesas': total_despesas,
-                    'lucro_liquido': lucro_liquido
-                },
-                'custos_fixos': custos_fixos_data,
-                'custos_gerais_mes': custos_gerais_data,
-                'todasParcelas': todas_parcelas_mes,
-                'totalParcelas': len(todas_parcelas_mes),
-                'parcelasPagas': len([p for p in todas_parcelas_mes if p['paga']]),
-                'parcelasPendentes': len([p for p in todas_parcelas_mes if not p['paga']])
-            })
+            return JsonResponse(dados)
             
         except Exception as e:
             logger.error(f'Erro ao buscar relatórios por mês: {e}')
@@ -1951,6 +1333,90 @@ def buscar_relatorios_mes(request):
         'error': 'Método não permitido'
     })
 
+# Campos dos custos gerais editáveis no formulário do relatório
+CAMPOS_CUSTO_FORMULARIO = ['tipo_gasto', 'oficina_fornecedor', 'descricao', 'valor', 'forma_pagamento', 'status_pagamento']
+
+def _custos_do_formulario(post):
+    """Lê os custos custo_<n>_* do formulário de edição, na ordem dos índices.
+
+    Percorre todos os índices enviados (o formulário pode ter lacunas quando um
+    custo é removido na tela) e ignora custos sem fornecedor, descrição ou valor.
+    O valor aceita o formato brasileiro ("1.234,56"); um valor inválido gera
+    ErroImportacao com o nome do campo.
+    """
+    indices = sorted({
+        int(match.group(1)) for chave in post.keys()
+        if (match := re.fullmatch(r'custo_(\d+)_tipo_gasto', chave))
+    })
+    custos = []
+    for index in indices:
+        tipo_gasto = post.get(f'custo_{index}_tipo_gasto')
+        oficina_fornecedor = post.get(f'custo_{index}_oficina_fornecedor', '').strip()
+        descricao = post.get(f'custo_{index}_descricao', '').strip()
+        valor = post.get(f'custo_{index}_valor', '0')
+        if not (tipo_gasto and oficina_fornecedor and descricao and valor):
+            continue
+        custo_id = post.get(f'custo_{index}_id', '').strip()
+        custos.append({
+            'id': int(custo_id) if custo_id.isdigit() else None,
+            'tipo_gasto': tipo_gasto,
+            'oficina_fornecedor': oficina_fornecedor,
+            'descricao': descricao,
+            'valor': importacao.ler_decimal(valor, f'custo_{index}_valor'),
+            'forma_pagamento': post.get(f'custo_{index}_forma_pagamento', 'vista'),
+            'status_pagamento': post.get(f'custo_{index}_status_pagamento', 'pago'),
+        })
+    return custos
+
+def _atualizar_custos_relatorio(relatorio, custos_enviados, data, veiculo_placa):
+    """Aplica os custos do formulário comparando com os existentes por id.
+
+    Custos alterados vão em um bulk_update, novos em um bulk_create e só os que
+    saíram do formulário são excluídos. Como bulk_* não disparam signals, os
+    resumos e o cache das datas afetadas são atualizados aqui. Retorna a
+    quantidade de custos do relatório após a edição.
+    """
+    existentes = {custo.id: custo for custo in CustosGerais.objects.filter(relatorio=relatorio)}
+    datas = {data} | {custo.data for custo in existentes.values()}
+    agora = timezone.now()
+    alterados, novos, mantidos = [], [], set()
+
+    for dados in custos_enviados:
+        valores = {campo: dados[campo] for campo in CAMPOS_CUSTO_FORMULARIO}
+        # A viagem já foi gravada: o texto é o canônico e a referência ao caminhão é a dela
+        valores.update(data=data, veiculo_placa=veiculo_placa[:20], caminhao_ref_id=relatorio.caminhao_ref_id)
+        custo = existentes.get(dados['id'])
+        if custo is None or custo.id in mantidos:
+            novos.append(CustosGerais(relatorio=relatorio, **valores))
+            continue
+        mantidos.add(custo.id)
+        if any(getattr(custo, campo) != valor for campo, valor in valores.items()):
+            for campo, valor in valores.items():
+                setattr(custo, campo, valor)
+            custo.updated_at = agora
+            alterados.append(custo)
+
+    # bulk_* não disparam o pre_save que atualiza o texto da busca
+    preencher_texto(alterados + novos)
+    if alterados:
+        CustosGerais.objects.bulk_update(
+            alterados, CAMPOS_CUSTO_FORMULARIO + ['data', 'veiculo_placa', 'caminhao_ref', 'busca_texto', 'updated_at']
+        )
+    if novos:
+        CustosGerais.objects.bulk_create(novos)
+    removidos = set(existentes) - mantidos
+    if removidos:
+        # delete() do queryset dispara os signals (resumos, cache e marcas de exclusão)
+        CustosGerais.objects.filter(id__in=removidos).delete()
+
+    if alterados or novos:
+        datas_alteradas(datas)
+    logger.info(
+        f'Custos do relatório {relatorio.id}: {len(alterados)} alterado(s), '
+        f'{len(novos)} novo(s), {len(removidos)} removido(s)'
+    )
+    return len(mantidos) + len(novos)
+
 @login_required
 def atualizar_relatorio(request, relatorio_id):
     """View para atualizar um relatório existente"""
@@ -1974,11 +1440,11 @@ def atualizar_relatorio(request, relatorio_id):
             
             # Buscar salário do motorista se existir
             salario_motorista = None
-            if relatorio.motorista:
+            if relatorio.motorista_ref_id:
                 ano_mes = relatorio.data_viagem.strftime('%Y-%m')
                 try:
                     salario_motorista = MotoristaSalario.objects.get(
-                        motorista=relatorio.motorista,
+                        motorista_ref_id=relatorio.motorista_ref_id,
                         ano_mes=ano_mes
                     )
                 except MotoristaSalario.DoesNotExist:
@@ -2016,70 +1482,43 @@ def atualizar_relatorio(request, relatorio_id):
             bonus_viagens = request.POST.get('bonus_viagens', '0').strip()
             desconto_faltas = request.POST.get('desconto_faltas', '0').strip()
             
-            # Atualizar dados do relatório
-            relatorio.data_viagem = data_viagem
-            relatorio.partida = partida
-            relatorio.chegada = chegada
-            relatorio.diarias = int(diarias)
-            relatorio.litros_gasolina = Decimal(litros_gasolina)
-            relatorio.gasto_gasolina = Decimal(gasto_gasolina)
-            relatorio.receita_frete = Decimal(receita_frete)
-            relatorio.motorista = motorista
-            relatorio.caminhao = caminhao
-            relatorio.save()
-            
-            # Atualizar ou criar salário do motorista
-            if motorista and salario_base:
-                ano_mes = datetime.strptime(data_viagem, '%Y-%m-%d').strftime('%Y-%m')
-                salario, created = MotoristaSalario.objects.get_or_create(
-                    motorista=motorista,
-                    ano_mes=ano_mes,
-                    defaults={
-                        'salario_base': Decimal(salario_base),
-                        'bonus_viagens': Decimal(bonus_viagens),
-                        'desconto_faltas': Decimal(desconto_faltas)
-                    }
-                )
-                if not created:
-                    salario.salario_base = Decimal(salario_base)
-                    salario.bonus_viagens = Decimal(bonus_viagens)
-                    salario.desconto_faltas = Decimal(desconto_faltas)
-                    salario.save()
-            
-            # Remover custos gerais existentes
-            CustosGerais.objects.filter(relatorio=relatorio).delete()
-            
-            # Processar novos custos gerais
-            custos_salvos = 0
-            index = 0
-            while True:
-                tipo_gasto = request.POST.get(f'custo_{index}_tipo_gasto')
-                if not tipo_gasto:
-                    break
-                
-                oficina_fornecedor = request.POST.get(f'custo_{index}_oficina_fornecedor', '').strip()
-                descricao = request.POST.get(f'custo_{index}_descricao', '').strip()
-                valor = request.POST.get(f'custo_{index}_valor', '0')
-                forma_pagamento = request.POST.get(f'custo_{index}_forma_pagamento', 'vista')
-                status_pagamento = request.POST.get(f'custo_{index}_status_pagamento', 'pago')
-                
-                if oficina_fornecedor and descricao and valor:
-                    # Converter data_viagem para objeto date
-                    data_obj = datetime.strptime(data_viagem, '%Y-%m-%d')
-                    CustosGerais.objects.create(
-                        relatorio=relatorio,
-                        tipo_gasto=tipo_gasto,
-                        data=data_obj.date(),  # Converter para objeto date
-                        veiculo_placa=caminhao,
-                        oficina_fornecedor=oficina_fornecedor,
-                        descricao=descricao,
-                        valor=Decimal(valor),
-                        forma_pagamento=forma_pagamento,
-                        status_pagamento=status_pagamento
+            custos_enviados = _custos_do_formulario(request.POST)
+
+            with transaction.atomic():
+                # Atualizar dados do relatório
+                relatorio.data_viagem = data_viagem
+                relatorio.partida = partida
+                relatorio.chegada = chegada
+                relatorio.diarias = int(diarias)
+                relatorio.litros_gasolina = Decimal(litros_gasolina)
+                relatorio.gasto_gasolina = Decimal(gasto_gasolina)
+                relatorio.receita_frete = Decimal(receita_frete)
+                relatorio.motorista = motorista
+                relatorio.caminhao = caminhao
+                relatorio.save()
+                
+                # Atualizar ou criar salário do motorista
+                if motorista and salario_base:
+                    ano_mes = datetime.strptime(data_viagem, '%Y-%m-%d').strftime('%Y-%m')
+                    salario, created = MotoristaSalario.objects.get_or_create(
+                        motorista_ref=relatorio.motorista_ref,
+                        ano_mes=ano_mes,
+                        defaults={
+                            'motorista': relatorio.motorista,
+                            'salario_base': Decimal(salario_base),
+                            'bonus_viagens': Decimal(bonus_viagens),
+                            'desconto_faltas': Decimal(desconto_faltas)
+                        }
                     )
-                    custos_salvos += 1
+                    if not created:
+                        salario.salario_base = Decimal(salario_base)
+                        salario.bonus_viagens = Decimal(bonus_viagens)
+                        salario.desconto_faltas = Decimal(desconto_faltas)
+                        salario.save()
                 
-                index += 1
+                # Custos gerais: altera, cria e remove só o que mudou (por id)
+                data_obj = datetime.strptime(data_viagem, '%Y-%m-%d').date()
+                custos_salvos = _atualizar_custos_relatorio(relatorio, custos_enviados, data_obj, relatorio.caminhao)
             
             mensagem = f'Relatório atualizado com sucesso! {custos_salvos} custo(s) geral(is) atualizado(s)'
             
@@ -2088,7 +1527,12 @@ def atualizar_relatorio(request, relatorio_id):
             else:
                 messages.success(request, mensagem)
                 return redirect('dashboard')
-                
+        
+        except importacao.ErroImportacao as e:
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({'success': False, 'message': str(e)})
+            messages.error(request, str(e))
+            return redirect('dashboard')
         except Exception as e:
             logger.error(f'Erro ao atualizar relatório: {e}')
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -2104,6 +1548,8 @@ def teste_abas(request):
     return render(request, 'login/teste_abas.html')
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=etags.etag_custos_fixos)
 def custos_fixos(request):
     """View para gerenciar custos fixos mensais"""
     # Garantir que sempre retorne JSON para requisições AJAX
@@ -2154,21 +1600,7 @@ def custos_fixos(request):
             # Listar custos fixos
             custos_fixos = CustoFixoMensal.objects.all().order_by('-data_inicio')
             
-            custos_data = []
-            for custo in custos_fixos:
-                custos_data.append({
-                    'id': custo.id,
-                    'descricao': custo.descricao,
-                    'tipo_custo': custo.tipo_custo,
-                    'tipo_custo_display': custo.get_tipo_custo_display(),
-                    'valor_mensal': float(custo.valor_mensal),
-                    'data_inicio': custo.data_inicio.strftime('%Y-%m-%d'),
-                    'data_fim': custo.data_fim.strftime('%Y-%m-%d') if custo.data_fim else None,
-                    'status': custo.status,
-                    'status_display': custo.get_status_display(),
-                    'observacoes': custo.observacoes,
-                    'created_at': custo.created_at.strftime('%Y-%m-%d %H:%M')
-                })
+            custos_data = [sincronizacao.serializar_custo_fixo(custo) for custo in custos_fixos]
             
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({'custos_fixos': custos_data})
@@ -2232,7 +1664,7 @@ def editar_custo_fixo(request, custo_id):
                 'id': custo.id,
                 'descricao': custo.descricao,
                 'tipo_custo': custo.tipo_custo,
-                'valor_mensal': float(custo.valor_mensal),
+                'valor_mensal': dinheiro.para_json(dinheiro.centavos(custo.valor_mensal)),
                 'data_inicio': custo.data_inicio.strftime('%Y-%m-%d'),
                 'data_fim': custo.data_fim.strftime('%Y-%m-%d') if custo.data_fim else None,
                 'status': custo.status,
@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente do arquivo .env
@@ -93,6 +96,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Perfil das requisições (só atua com PERFIL_REQUISICOES=True)
+    'login.middleware.PerfilRequisicoesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -101,6 +106,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Perfil das requisições: Server-Timing, queries por view, detecção de N+1 e resumo periódico no log
+PERFIL_REQUISICOES = os.environ.get('PERFIL_REQUISICOES', 'False').lower() == 'true'
+PERFIL_LIMITE_REPETICOES = int(os.environ.get('PERFIL_LIMITE_REPETICOES', '5'))
+PERFIL_INTERVALO_RESUMO = int(os.environ.get('PERFIL_INTERVALO_RESUMO', '60'))
+
+# Servidor ASGI (gunicorn com workers do uvicorn, ver gunicorn.conf.py)
+SERVIDOR_ASGI = os.environ.get('SERVIDOR_ASGI', 'False').lower() == 'true'
+
 ROOT_URLCONF = 'truck.urls'
 
 TEMPLATES = [
@@ -152,7 +165,9 @@ if DATABASE_URL and DATABASE_URL.startswith('postgresql'):
     DATABASES = {
         'default': dj_database_url.parse(
             DATABASE_URL,
-            conn_max_age=600,
+            # No ASGI cada requisição usa sua própria conexão: conexões persistentes
+            # não seriam reaproveitadas (o pooler do Supabase faz esse papel)
+            conn_max_age=0 if SERVIDOR_ASGI else 600,
             ssl_require=True
         )
     }
@@ -224,6 +239,61 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache (relatórios, índice de custos fixos e dashboard). A invalidação por versão só
+# alcança quem usa o mesmo cache: os workers do gunicorn, o worker da fila e os comandos
+# (importação, reconstrução dos resumos) precisam compartilhá-lo. Por padrão é uma tabela
+# no próprio banco (criada pela migração 0013 e pelo `createcachetable` do build.sh).
+# CACHE_DIR usa um cache em arquivo (processos na mesma máquina) e CACHE_LOCAL=True o
+# LocMem, que é por processo e só serve com um único worker. Os testes usam o LocMem:
+# cada teste limpa o cache e os orçamentos de queries não contam as leituras do cache.
+CACHE_DIR = os.environ.get('CACHE_DIR', '').strip()
+CACHE_LOCAL = os.environ.get('CACHE_LOCAL', 'False').lower() == 'true'
+EXECUTANDO_TESTES = len(sys.argv) > 1 and sys.argv[1] == 'test'
+if CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+        }
+    }
+elif CACHE_LOCAL or EXECUTANDO_TESTES:
+    if not EXECUTANDO_TESTES and int(os.environ.get('WEB_CONCURRENCY', '1')) > 1:
+        raise ImproperlyConfigured(
+            'CACHE_LOCAL=True (LocMem, um cache por processo) com WEB_CONCURRENCY > 1: as invalidações '
+            'dos relatórios não chegariam aos outros workers. Use o cache no banco (padrão) ou CACHE_DIR.'
+        )
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'truckplan',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'truckplan_cache',
+        }
+    }
+
+# Tempo máximo (segundos) de um relatório no cache; a invalidação normal é pelos signals
+RELATORIOS_CACHE_TIMEOUT = int(os.environ.get('RELATORIOS_CACHE_TIMEOUT', '3600'))
+
+# Comprovantes dos custos: tamanho máximo do upload e geração das versões reduzidas
+# (exibição e miniatura) em uma thread em segundo plano, fora da requisição
+COMPROVANTE_TAMANHO_MAXIMO_MB = int(os.environ.get('COMPROVANTE_TAMANHO_MAXIMO_MB', '20'))
+COMPROVANTES_EM_SEGUNDO_PLANO = True
+
+# Fila de tarefas (manage.py run_worker): tentativas por tarefa, tempo (segundos) após o qual uma
+# tarefa em execução é considerada travada e dias que as tarefas terminadas (e seus arquivos) são mantidas
+JOBS_MAX_TENTATIVAS = int(os.environ.get('JOBS_MAX_TENTATIVAS', '3'))
+JOBS_TEMPO_MAXIMO = int(os.environ.get('JOBS_TEMPO_MAXIMO', '900'))
+JOBS_RETENCAO_DIAS = int(os.environ.get('JOBS_RETENCAO_DIAS', '7'))
+
+# Sincronização incremental: dias que as marcas de exclusão são mantidas; clientes com
+# token mais antigo que isso recebem uma carga completa
+SINCRONIZACAO_RETENCAO_DIAS = int(os.environ.get('SINCRONIZACAO_RETENCAO_DIAS', '30'))
+
 # Login URLs
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/login/dashboard/'